@@ -0,0 +1,244 @@
+"""圖片倉庫、幻燈片服務與播放列表網格的基準測試
+
+在專案根目錄執行：
+
+    python -m benchmarks.suite                                # 100、1k、10k 張圖片
+    python -m benchmarks.suite --sizes 100 1000 --output before.json
+    python -m benchmarks.suite --work-dir /tmp/photoframe-bench  # 重複使用生成的圖庫
+
+以固定的亂數種子生成合成圖庫（不同尺寸的 JPEG，其中一部分放在子目錄中），
+每項測量重複數次並記錄最小值與中位數，結果以 JSON 輸出，方便比較不同提交之間的差異。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+from PIL import Image as PILImage
+
+from repositories.image_repository import ImageRepository
+from repositories.selection_store import SelectionStateStore
+from services.selection_model import SelectionModel, ALL_EXCEPT
+from services.slideshow_service import SlideshowService
+from services.instrumentation import configure_logging
+
+# 合成圖片的尺寸與比例（大部分為小圖，讓 10k 圖庫的生成時間可以接受）
+IMAGE_SIZES = [((640, 480), 0.5), ((1280, 960), 0.3), ((1920, 1080), 0.15), ((4000, 3000), 0.05)]
+# 每個子目錄的圖片數量
+IMAGES_PER_FOLDER = 250
+
+
+def generate_library(images_dir, count, seed=0):
+    """生成 count 張合成 JPEG，已存在相同數量的圖庫時直接沿用"""
+    marker = os.path.join(images_dir, '.generated')
+    if os.path.exists(marker):
+        with open(marker) as f:
+            if f.read() == f'{count}:{seed}':
+                return
+        shutil.rmtree(images_dir)
+    os.makedirs(images_dir, exist_ok=True)
+
+    rng = random.Random(seed)
+    sizes = [size for size, _ in IMAGE_SIZES]
+    weights = [weight for _, weight in IMAGE_SIZES]
+    # 每種尺寸只生成一次像素，再以不同的品質保存
+    templates = {}
+    for size in sizes:
+        noise = PILImage.effect_noise(size, 32)
+        gradient = PILImage.linear_gradient('L').resize(size)
+        templates[size] = PILImage.merge('RGB', (gradient, noise, gradient.transpose(PILImage.Transpose.ROTATE_180)))
+
+    for index in range(count):
+        folder = images_dir if index < IMAGES_PER_FOLDER else os.path.join(
+            images_dir, f'album_{index // IMAGES_PER_FOLDER:03d}'
+        )
+        os.makedirs(folder, exist_ok=True)
+        size = rng.choices(sizes, weights)[0]
+        # 以 JPEG 註解寫入序號，保證每個檔案的內容雜湊不同（縮圖按內容去重）
+        templates[size].save(
+            os.path.join(folder, f'img_{index:05d}.jpg'), 'JPEG',
+            quality=rng.randint(70, 90), comment=f'photoframe-bench {index}'
+        )
+
+    with open(marker, 'w') as f:
+        f.write(f'{count}:{seed}')
+
+
+def measure(fn, repeat=3, setup=None):
+    """執行 fn repeat 次，返回耗時（秒）的最小值與中位數"""
+    durations = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    return {'min_s': min(durations), 'median_s': statistics.median(durations), 'runs': repeat}
+
+
+def reset_thumbnails(library_dir):
+    """刪除縮圖與縮圖索引，下一次初始化為冷啟動"""
+    shutil.rmtree(os.path.join(library_dir, 'thumbnails'), ignore_errors=True)
+    manifest = os.path.join(library_dir, 'thumbnails_manifest.json')
+    if os.path.exists(manifest):
+        os.remove(manifest)
+
+
+def bench_repository(images_dir, results, cold_repeat):
+    """倉庫的冷啟動、熱啟動初始化與 refresh_images"""
+    library_dir = os.path.dirname(images_dir)
+
+    def cold_init():
+        ImageRepository(images_dir).get_image_files()
+
+    results['repository_cold_init'] = measure(
+        cold_init, repeat=cold_repeat, setup=lambda: reset_thumbnails(library_dir)
+    )
+
+    def warm_init():
+        ImageRepository(images_dir).get_image_files()
+
+    results['repository_warm_init'] = measure(warm_init, repeat=5)
+
+    repository = ImageRepository(images_dir)
+    repository.get_image_files()
+    results['repository_refresh_images'] = measure(repository.refresh_images, repeat=5)
+    results['image_count'] = len(repository.get_image_files())
+    return repository
+
+
+def bench_slideshow(repository, results, steps):
+    """SlideshowService.next_image / prev_image 的吞吐量（次/秒）"""
+    service = SlideshowService(repository)
+    service.set_slideshow_loop(True)
+
+    def next_images():
+        for _ in range(steps):
+            service.next_image()
+
+    def prev_images():
+        for _ in range(steps):
+            service.prev_image()
+
+    for name, fn in (('slideshow_next_image', next_images), ('slideshow_prev_image', prev_images)):
+        timing = measure(fn, repeat=3)
+        timing['steps'] = steps
+        timing['ops_per_s'] = steps / timing['min_s'] if timing['min_s'] else None
+        results[name] = timing
+    repository.remove_listener(service._on_repository_changed)
+
+
+def bench_selection_state(repository, results, work_dir):
+    """播放列表選取狀態的保存與加載（一半圖片為例外，最壞情況）"""
+    images = repository.get_image_files()
+    model = SelectionModel(images)
+    for image_path in images[::2]:
+        model.set_selected(image_path, False)
+    store = SelectionStateStore(os.path.join(work_dir, 'checkbox_state.json'))
+
+    def save():
+        store.update(model.mode, model.exceptions)
+        store.flush()
+
+    def load():
+        state = store.load()
+        SelectionModel(images).load_state(state['mode'], state['exceptions'])
+
+    results['selection_state_save'] = measure(save, repeat=5)
+    results['selection_state_load'] = measure(load, repeat=5)
+    results['selection_state_exceptions'] = len(model.exceptions) if model.mode == ALL_EXCEPT else None
+
+
+def bench_build_grid(repository, results):
+    """無視窗構建 PlaylistScreen 網格（資料與第一次版面配置）"""
+    from services.service_manager import ServiceManager
+    from services.texture_cache import TextureCache
+
+    # 讓 ServiceManager 單例使用測試圖庫，不掃描真正的圖片目錄
+    manager = ServiceManager.__new__(ServiceManager)
+    manager.repository = repository
+    manager.texture_cache = TextureCache()
+    manager.initialized = True
+
+    from ui.playlist_page import PlaylistScreen
+    screen = PlaylistScreen(name='playlist')
+    screen.grid_view.size = (1024, 600)
+
+    def build():
+        screen._grid_images = []
+        screen.build_grid()
+        screen.grid_view.refresh_views()
+
+    results['playlist_build_grid'] = measure(build, repeat=5)
+    ServiceManager._instance = None
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='圖片倉庫、幻燈片服務與播放列表網格的基準測試')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='圖庫的圖片數量')
+    parser.add_argument('--work-dir', help='生成圖庫的目錄（預設為暫存目錄，測試後刪除）')
+    parser.add_argument('--cold-repeat', type=int, default=2, help='冷啟動初始化的重複次數')
+    parser.add_argument('--steps', type=int, default=10000, help='next/prev 吞吐量測試的步數')
+    parser.add_argument('--skip-grid', action='store_true', help='不測試播放列表網格（沒有 Kivy 時使用）')
+    parser.add_argument('--output', help='JSON 結果的輸出檔案（預設輸出到標準輸出）')
+    args = parser.parse_args()
+    # 只保留警告，避免逐張圖片的日誌影響測量
+    configure_logging('WARNING')
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='photoframe-bench-')
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'libraries': {},
+    }
+    try:
+        for count in args.sizes:
+            library_dir = os.path.join(work_dir, f'library_{count}')
+            images_dir = os.path.join(library_dir, 'images')
+            print(f"生成 {count} 張圖片的圖庫...", flush=True)
+            generate_library(images_dir, count)
+
+            results = {}
+            print(f"測量 {count} 張圖片的圖庫...", flush=True)
+            repository = bench_repository(images_dir, results, args.cold_repeat)
+            bench_slideshow(repository, results, args.steps)
+            bench_selection_state(repository, results, library_dir)
+            if not args.skip_grid:
+                bench_build_grid(repository, results)
+            report['libraries'][str(count)] = results
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"結果已寫入 {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
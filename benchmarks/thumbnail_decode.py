@@ -0,0 +1,128 @@
+"""縮圖創建的基準測試：比較各個品質與速度策略的每張圖片延遲與峰值記憶體
+
+在專案根目錄執行：
+
+    python -m benchmarks.thumbnail_decode                  # 生成 8 張 24MP 的 JPEG 測試
+    python -m benchmarks.thumbnail_decode --library DIR    # 使用現有的圖片目錄
+    python -m benchmarks.thumbnail_decode --json           # 以 JSON 輸出結果
+
+每個策略在獨立的子進程中執行，峰值記憶體互不影響。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import tempfile
+import time
+
+from PIL import Image as PILImage
+
+from repositories.image_discovery import scan_images
+from repositories.image_repository import IMAGE_EXTENSIONS, THUMBNAIL_POLICIES, _build_thumbnail
+
+
+def generate_library(directory, count, size):
+    """生成 count 張指定尺寸的合成 JPEG（漸層加雜訊，壓縮特性接近照片）"""
+    gradient = PILImage.radial_gradient('L').resize(size)
+    for index in range(count):
+        noise = PILImage.effect_noise(size, 24 + index)
+        ramp = PILImage.linear_gradient('L').rotate(index * 40).resize(size)
+        img = PILImage.merge('RGB', (gradient, noise, ramp))
+        img.save(os.path.join(directory, f'large_{index:03d}.jpg'), 'JPEG', quality=92)
+    return [os.path.join(directory, f'large_{index:03d}.jpg') for index in range(count)]
+
+
+def peak_rss_bytes():
+    """當前進程的峰值常駐記憶體
+
+    優先讀取 /proc/self/status 的 VmHWM：ru_maxrss 在 exec 後會保留父進程的值。
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Linux 上 ru_maxrss 的單位為 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _run_policy(policy, image_paths, max_size, grid_size, output_dir, results):
+    """在子進程中以指定策略為每張圖片創建縮圖，回報每張的耗時與峰值記憶體"""
+    latencies = []
+    for index, image_path in enumerate(image_paths):
+        thumbnail_path = os.path.join(output_dir, f'{policy}_{index}.jpg')
+        grid_path = os.path.join(output_dir, f'{policy}_{index}_grid.jpg')
+        started = time.perf_counter()
+        _build_thumbnail(image_path, thumbnail_path, max_size, grid_path, grid_size, policy)
+        latencies.append(time.perf_counter() - started)
+    results.put((latencies, peak_rss_bytes()))
+
+
+def benchmark_policy(policy, image_paths, max_size, grid_size, output_dir):
+    """在獨立子進程中測量一個策略，返回結果字典"""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(
+        target=_run_policy,
+        args=(policy, image_paths, max_size, grid_size, output_dir, results),
+    )
+    process.start()
+    latencies, peak_rss = results.get()
+    process.join()
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    return {
+        'policy': policy,
+        'images': len(latencies_ms),
+        'mean_ms': statistics.mean(latencies_ms),
+        'median_ms': statistics.median(latencies_ms),
+        'p95_ms': latencies_ms[min(len(latencies_ms) - 1, int(len(latencies_ms) * 0.95))],
+        'max_ms': latencies_ms[-1],
+        'peak_rss_mb': peak_rss / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較縮圖策略的延遲與峰值記憶體')
+    parser.add_argument('--library', help='圖片目錄（預設生成合成的大尺寸 JPEG）')
+    parser.add_argument('--count', type=int, default=8, help='生成的圖片數量')
+    parser.add_argument('--source-size', type=int, nargs=2, default=(6000, 4000), metavar=('W', 'H'),
+                        help='生成的圖片尺寸（預設 24MP）')
+    parser.add_argument('--screen-size', type=int, nargs=2, default=(800, 600), metavar=('W', 'H'),
+                        help='螢幕版本縮圖的尺寸')
+    parser.add_argument('--policies', nargs='+', default=list(THUMBNAIL_POLICIES),
+                        choices=list(THUMBNAIL_POLICIES))
+    parser.add_argument('--json', action='store_true', help='以 JSON 輸出結果')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        if args.library:
+            image_paths = sorted(path for path, _ in scan_images(args.library, IMAGE_EXTENSIONS))
+        else:
+            library_dir = os.path.join(work_dir, 'library')
+            os.makedirs(library_dir)
+            image_paths = generate_library(library_dir, args.count, tuple(args.source_size))
+
+        output_dir = os.path.join(work_dir, 'thumbnails')
+        os.makedirs(output_dir)
+        results = [
+            benchmark_policy(policy, image_paths, tuple(args.screen_size), (320, 240), output_dir)
+            for policy in args.policies
+        ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'策略':<10}{'圖片':>6}{'平均 ms':>10}{'中位 ms':>10}{'p95 ms':>10}{'最大 ms':>10}{'峰值 RSS MB':>14}")
+    for result in results:
+        print(f"{result['policy']:<10}{result['images']:>6}{result['mean_ms']:>10.1f}"
+              f"{result['median_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['max_ms']:>10.1f}"
+              f"{result['peak_rss_mb']:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,50 @@
+from services.instrumentation import STARTUP_PROFILE, configure_logging
 from kivy.app import App
 from kivy.core.window import Window
-from kivy.uix.screenmanager import ScreenManager, FadeTransition
-from ui.main_page import HomeScreen
-from ui.slide_page import SlideshowScreen
-from ui.playlist_page import PlaylistScreen
-from ui.setup_page import SetupScreen
+from kivy.uix.screenmanager import FadeTransition
+STARTUP_PROFILE.mark('導入 Kivy 並創建視窗')
 from services.service_manager import ServiceManager
+from ui.lazy_screen_manager import LazyScreenManager
+STARTUP_PROFILE.mark('導入服務模組')
 
 class MainApp(App):
     def build(self):
         # 設定全螢幕模式
         Window.fullscreen = 'auto'  # 自動全螢幕
         # 或者使用 'auto' 讓系統決定，或使用 True 強制全螢幕
-        
+
         # 隱藏游標（可選）
         Window.show_cursor = False
-        
-        # 初始化服务管理器
-        self.service_manager = ServiceManager()
-        
+
+        # 初始化服务管理器，按螢幕尺寸生成幻燈片使用的縮圖
+        self.service_manager = ServiceManager(screen_size=Window.size)
+        STARTUP_PROFILE.mark('初始化服務')
+
         Window.clearcolor = (0.95, 0.95, 0.95, 1)
-        sm = ScreenManager(transition=FadeTransition())
-        sm.add_widget(HomeScreen(name='home'))
-        sm.add_widget(SlideshowScreen(name='slideshow'))
-        sm.add_widget(PlaylistScreen(name='playlist'))
-        sm.add_widget(SetupScreen(name='setup'))
+        sm = LazyScreenManager(transition=FadeTransition())
+        # 頁面在第一次切換到時才導入與建立，只有起始的幻燈片頁面在啟動時建立；
+        # 幻燈片頁面持有播放狀態與服務回調，記憶體不足時也不釋放
+        sm.register('home', 'ui.main_page:HomeScreen')
+        sm.register('slideshow', 'ui.slide_page:SlideshowScreen', releasable=False)
+        sm.register('playlist', 'ui.playlist_page:PlaylistScreen')
+        sm.register('setup', 'ui.setup_page:SetupScreen')
         sm.current = 'slideshow'
         return sm
 
+    def on_start(self):
+        Window.bind(on_flip=self._on_first_frame)
+
+    def on_stop(self):
+        # 寫入延遲保存的設定與隨機播放位置，結束時不遺失
+        self.service_manager.flush_state()
+
+    def _on_first_frame(self, *args):
+        """第一幀顯示後輸出啟動耗時報告（設定 PHOTOFRAME_STARTUP_PROFILE 時）"""
+        Window.unbind(on_flip=self._on_first_frame)
+        STARTUP_PROFILE.mark('第一幀')
+        STARTUP_PROFILE.log_report()
+
 if __name__ == '__main__':
-    MainApp().run() 
\ No newline at end of file
+    # 日誌等級由 PHOTOFRAME_LOG_LEVEL 設定（DEBUG 會記錄每張縮圖與每次勾選）
+    configure_logging()
+    MainApp().run()
@@ -0,0 +1,50 @@
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def scan_images(directory, extensions, on_directory=None, on_error=None):
+    """遞迴走訪圖片目錄，每找到一張圖片就產生 (圖片路徑, os.stat 結果)
+
+    使用 os.scandir，檔案類型直接取自目錄項（不需額外的 stat），
+    每張圖片只做一次 stat 且結果隨圖片一起交給調用者，不需要再調用 exists/getsize。
+    以隱藏名稱開頭的檔案與目錄（例如 macOS 在隨身碟上留下的 ._ 檔案、.Trashes）會被略過，
+    不跟隨指向目錄的符號連結，避免循環。
+
+    Args:
+        directory: 圖片目錄
+        extensions: 圖片副檔名（小寫）的 tuple
+        on_directory: 可選的回調 on_directory(path)，每進入一個目錄（包括 directory 本身）時調用
+        on_error: 可選的回調 on_error(path, error)，目錄或檔案無法讀取時調用（該目錄或檔案會被略過）
+    """
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        if on_directory:
+            on_directory(current)
+        subdirectories = []
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirectories.append(entry.path)
+                            continue
+                        if not (entry.name.lower().endswith(extensions) and entry.is_file()):
+                            continue
+                        stat_result = entry.stat()
+                    except OSError as e:
+                        logger.warning(f"無法讀取檔案資訊 {entry.path}: {e}")
+                        if on_error:
+                            on_error(entry.path, e)
+                        continue
+                    yield entry.path, stat_result
+        except OSError as e:
+            logger.warning(f"無法讀取目錄 {current}: {e}")
+            if on_error:
+                on_error(current, e)
+        # 按名稱順序走訪子目錄
+        pending.extend(sorted(subdirectories, reverse=True))
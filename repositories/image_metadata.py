@@ -0,0 +1,108 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# EXIF 標籤
+_ORIENTATION = 0x0112
+_MAKE = 0x010F
+_MODEL = 0x0110
+_DATETIME = 0x0132
+_EXIF_IFD = 0x8769
+_DATETIME_ORIGINAL = 0x9003
+_DATETIME_DIGITIZED = 0x9004
+
+# EXIF 方向 -> 轉正需要的 PIL.Image.Transpose 名稱（與 PIL.ImageOps.exif_transpose 相同）
+_ORIENTATION_TRANSPOSE = {
+    2: 'FLIP_LEFT_RIGHT',
+    3: 'ROTATE_180',
+    4: 'FLIP_TOP_BOTTOM',
+    5: 'TRANSPOSE',
+    6: 'ROTATE_270',
+    7: 'TRANSVERSE',
+    8: 'ROTATE_90',
+}
+
+
+def swaps_axes(orientation):
+    """該方向轉正時寬高是否互換（旋轉 90 度的照片）"""
+    return orientation in (5, 6, 7, 8)
+
+
+def apply_orientation(img, orientation):
+    """按 EXIF 方向把圖片轉正，返回轉正後的圖片（方向為 1 時返回原圖片）"""
+    method = _ORIENTATION_TRANSPOSE.get(orientation)
+    if method is None:
+        return img
+    from PIL import Image as PILImage
+    return img.transpose(PILImage.Transpose[method])
+
+
+def _parse_datetime(value):
+    """EXIF 日期時間 'YYYY:MM:DD HH:MM:SS' -> 'YYYY-MM-DDTHH:MM:SS'，格式不符（例如全為 0）時返回 None"""
+    if not isinstance(value, str):
+        return None
+    value = value.strip().rstrip('\x00')
+    if len(value) < 19 or value[4] != ':' or value[7] != ':' or not value[:4].isdigit():
+        return None
+    date, time = value[:10], value[11:19]
+    if date.startswith('0000'):
+        return None
+    return f"{date.replace(':', '-')}T{time}"
+
+
+def _text(value):
+    if not isinstance(value, str):
+        return ''
+    return value.strip().rstrip('\x00').strip()
+
+
+def read_metadata(img):
+    """讀取已打開（尚未解碼，未調用 draft）的 PIL 圖片的中繼資料
+
+    只解析檔頭中的 EXIF，不解碼像素。
+
+    Returns:
+        {'orientation': EXIF 方向 1-8,
+         'taken': 拍攝時間 'YYYY-MM-DDTHH:MM:SS' 或 None,
+         'width', 'height': 轉正後的尺寸,
+         'camera': 相機廠牌與型號或 None}
+    """
+    orientation = 1
+    taken = None
+    camera = None
+    try:
+        exif = img.getexif()
+        orientation = exif.get(_ORIENTATION, 1)
+        if orientation not in range(1, 9):
+            orientation = 1
+        exif_ifd = exif.get_ifd(_EXIF_IFD)
+        taken = (_parse_datetime(exif_ifd.get(_DATETIME_ORIGINAL))
+                 or _parse_datetime(exif_ifd.get(_DATETIME_DIGITIZED))
+                 or _parse_datetime(exif.get(_DATETIME)))
+        make = _text(exif.get(_MAKE))
+        model = _text(exif.get(_MODEL))
+        # 型號常已包含廠牌（例如 "Canon" / "Canon EOS 80D"）
+        camera = model if make and model.lower().startswith(make.lower()) else ' '.join(filter(None, (make, model)))
+    except Exception as e:
+        logger.debug(f"讀取 EXIF 失敗: {e}")
+    width, height = img.size
+    if swaps_axes(orientation):
+        width, height = height, width
+    return {
+        'orientation': orientation,
+        'taken': taken,
+        'width': width,
+        'height': height,
+        'camera': camera or None,
+    }
+
+
+def read_file_metadata(file_path):
+    """打開圖片檔讀取中繼資料（只讀取檔頭），無法讀取時返回 None"""
+    from PIL import Image as PILImage
+    try:
+        with PILImage.open(file_path) as img:
+            return read_metadata(img)
+    except Exception as e:
+        logger.warning(f"讀取圖片資訊失敗 {file_path}: {e}")
+        return None
@@ -1,139 +1,994 @@
+import logging
 import os
-from PIL import Image as PILImage
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor
+from queue import Empty, SimpleQueue
+from repositories.image_discovery import scan_images
+from repositories.image_metadata import apply_orientation, read_file_metadata, read_metadata, swaps_axes
+from repositories.thumbnail_manifest import ThumbnailManifest, hash_file
+from services.instrumentation import METRICS
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+# 縮圖的品質與速度策略
+#   reducing_gap: JPEG 以 DCT 縮放（Image.draft）直接解碼為不小於目標尺寸這個倍數的 1/2、1/4 或 1/8，
+#                 其他格式先以整數倍縮小（Image.reduce）；None 表示完整解碼
+#   resample: 最後縮放到目標尺寸使用的濾波器（PIL.Image.Resampling 的名稱，PIL 在需要創建縮圖時才導入）
+#   optimize: 保存 JPEG 時是否多做一次霍夫曼表最佳化
+THUMBNAIL_POLICIES = {
+    'exact': {'reducing_gap': None, 'resample': 'LANCZOS', 'optimize': True},
+    'quality': {'reducing_gap': 2.0, 'resample': 'LANCZOS', 'optimize': True},
+    'balanced': {'reducing_gap': 1.0, 'resample': 'LANCZOS', 'optimize': True},
+    'fast': {'reducing_gap': 1.0, 'resample': 'BILINEAR', 'optimize': False},
+}
+DEFAULT_THUMBNAIL_POLICY = 'balanced'
+
+
+def _build_thumbnail(file_path, thumbnail_path, max_size, grid_path, grid_size,
+                     policy=DEFAULT_THUMBNAIL_POLICY):
+    """在工作進程中創建縮圖：螢幕尺寸版本與網格縮圖（由螢幕版本縮小，只解碼一次）
+
+    大尺寸 JPEG 按 policy（見 THUMBNAIL_POLICIES）以 DCT 縮放解碼，不需要解碼完整解析度。
+    解碼前從檔頭讀取 EXIF，縮圖按 EXIF 方向轉正，顯示時不需要再處理方向。
+    先寫入暫存檔再改名，多個進程同時處理相同內容時也不會留下寫了一半的縮圖。
+
+    Returns:
+        成功時返回圖片的中繼資料（見 read_metadata），失敗時返回 None
+    """
+    try:
+        # 檢查原檔案是否存在
+        if not os.path.exists(file_path):
+            logger.warning(f"原檔案不存在: {file_path}")
+            return None
+
+        from PIL import Image as PILImage
+
+        settings = THUMBNAIL_POLICIES[policy]
+        reducing_gap = settings['reducing_gap']
+        resample = PILImage.Resampling[settings['resample']]
+        suffix = f'.{os.getpid()}.tmp'
+        # 使用 PIL 創建縮圖
+        with PILImage.open(file_path) as img:
+            # draft 會改變 img.size，必須先讀取
+            metadata = read_metadata(img)
+            orientation = metadata['orientation']
+            # 旋轉 90 度的照片先按互換寬高的尺寸縮小，轉正後剛好符合螢幕尺寸
+            decode_size = (max_size[1], max_size[0]) if swaps_axes(orientation) else max_size
+            if reducing_gap:
+                # 必須在載入像素前設定，之後的 convert 只處理縮小後的像素
+                img.draft('RGB', (int(decode_size[0] * reducing_gap), int(decode_size[1] * reducing_gap)))
+
+            # 轉換為 RGB 模式（處理 RGBA 等格式）
+            if img.mode in ('RGBA', 'LA', 'P'):
+                img = img.convert('RGB')
+
+            # 計算縮圖尺寸，保持比例；在縮小後的圖片上轉正，成本最低
+            img.thumbnail(decode_size, resample, reducing_gap=reducing_gap)
+            img = apply_orientation(img, orientation)
+
+            # 保存縮圖，使用較高品質
+            img.save(thumbnail_path + suffix, 'JPEG', quality=85, optimize=settings['optimize'])
+
+            # 網格縮圖
+            grid_img = img.copy()
+            grid_img.thumbnail(grid_size, resample, reducing_gap=reducing_gap)
+            grid_img.save(grid_path + suffix, 'JPEG', quality=80)
+
+        os.replace(grid_path + suffix, grid_path)
+        os.replace(thumbnail_path + suffix, thumbnail_path)
+
+        # 驗證縮圖是否成功創建
+        if os.path.exists(thumbnail_path) and os.path.getsize(thumbnail_path) > 0:
+            logger.debug(f"已成功創建縮圖: {os.path.basename(file_path)}")
+            return metadata
+        else:
+            logger.warning(f"縮圖創建失敗: {thumbnail_path}")
+            return None
+
+    except Exception as e:
+        logger.warning(f"創建縮圖失敗 {file_path}: {e}")
+        return None
+
+
+def _build_thumbnail_timed(*args):
+    """在工作進程中創建縮圖並計時，返回 (中繼資料或 None, 秒數)"""
+    started = time.perf_counter()
+    metadata = _build_thumbnail(*args)
+    return metadata, time.perf_counter() - started
+
+
+def _hash_source(file_path):
+    """在工作進程中計算原圖的內容雜湊，失敗時返回 None"""
+    try:
+        return hash_file(file_path)
+    except Exception as e:
+        logger.warning(f"讀取檔案失敗 {file_path}: {e}")
+        return None
+
+
+def _identify_source(file_path):
+    """在工作進程中計算原圖的內容雜湊並讀取中繼資料，返回 (雜湊, 中繼資料)，失敗的項目為 None"""
+    content_hash = _hash_source(file_path)
+    if content_hash is None:
+        return None, None
+    return content_hash, read_file_metadata(file_path)
+
+
+def _process_source(file_path, thumbnails_dir, max_size, grid_dir, grid_size,
+                    policy=DEFAULT_THUMBNAIL_POLICY):
+    """在工作進程中計算內容雜湊，該內容還沒有縮圖時創建縮圖（同時讀取中繼資料）
+
+    Returns:
+        (內容雜湊, 縮圖是否可用, 創建縮圖的秒數, 中繼資料)，無法讀取檔案時雜湊為 None，
+        沿用既有縮圖時秒數為 None
+    """
+    content_hash = _hash_source(file_path)
+    if content_hash is None:
+        return None, False, None, None
+    thumbnail_path = os.path.join(thumbnails_dir, content_hash + '.jpg')
+    grid_path = os.path.join(grid_dir, content_hash + '.jpg')
+    if os.path.exists(thumbnail_path) and os.path.exists(grid_path):
+        return content_hash, True, None, read_file_metadata(file_path)
+    metadata, build_seconds = _build_thumbnail_timed(file_path, thumbnail_path, max_size, grid_path, grid_size, policy)
+    return content_hash, metadata is not None, build_seconds, metadata
+
+
+def _record_thumbnail_result(ok, build_seconds):
+    """在主進程中記錄工作進程回報的縮圖結果（工作進程中的指標不會回到主進程）"""
+    if not ok:
+        METRICS.counter('photoframe_thumbnail_failures_total', '創建失敗或無法讀取的原圖數').inc()
+    elif build_seconds is not None:
+        METRICS.counter('photoframe_thumbnails_built_total', '已創建的縮圖數').inc()
+        METRICS.histogram('photoframe_thumbnail_build_seconds', '每張原圖創建縮圖（解碼、縮放與保存）的耗時').observe(build_seconds)
+
+
+class _InlineExecutor:
+    """在當前線程中立即執行的執行器，進程池不可用時代替 ProcessPoolExecutor"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class _ThumbnailJobs:
+    """追蹤一批縮圖任務（見 ImageRepository._create_thumbnails）
+
+    第一個出現某個檔案大小的原圖直接在同一個任務中計算雜湊並創建縮圖；
+    之後相同大小的原圖先只計算雜湊（與讀取中繼資料），相同內容只創建一次縮圖。
+    結果為 {原圖路徑: (內容雜湊或 None, 中繼資料或 None)}。
+    相同大小的原圖仍在處理時，只計算了雜湊的結果會等它完成後再決定是否需要創建縮圖。
+    完成的任務由 add_done_callback 放入佇列，收集時只取出佇列中的任務，不必逐一檢查所有進行中的任務；
+    進行中的任務超過 max_pending 時，collect 會等待任務完成，走訪目錄不會遠遠超前進程池。
+    """
+
+    def __init__(self, repository, executor, results, on_created, max_pending=None):
+        self.repository = repository
+        self.executor = executor
+        self.results = results
+        self.on_created = on_created
+        self.max_pending = max_pending
+        self.futures = {}
+        self.completed = SimpleQueue()
+        # 已出現過的檔案大小，以及各大小仍在處理中的任務數
+        self.seen_sizes = set()
+        self.processing_sizes = Counter()
+        # 等待同大小任務完成的 (原圖路徑, 大小, 雜湊, 中繼資料)
+        self.deferred = []
+        # 雜湊 -> 等待該縮圖創建完成的 (原圖路徑, 中繼資料)
+        self.building = {}
+
+    def add(self, file_path, stat_result):
+        size = stat_result.st_size
+        if size not in self.seen_sizes:
+            self.seen_sizes.add(size)
+            self.processing_sizes[size] += 1
+            self._submit(('process', file_path, size),
+                         _process_source, file_path, *self.repository._thumbnail_args())
+        else:
+            self._submit(('hash', file_path, size), _identify_source, file_path)
+
+    def _submit(self, job, fn, *args):
+        future = self.executor.submit(fn, *args)
+        self.futures[future] = job
+        future.add_done_callback(self.completed.put)
+
+    def collect(self, until_done=False):
+        """收集已完成的任務；until_done 為 True 時等待全部完成，否則只在進行中的任務超過 max_pending 時等待"""
+        while self.futures:
+            block = until_done or (self.max_pending is not None and len(self.futures) > self.max_pending)
+            try:
+                future = self.completed.get(block=block)
+            except Empty:
+                return
+            self._handle(future)
+
+    def _finish(self, file_path, content_hash, metadata):
+        self.results[file_path] = (content_hash, metadata)
+        if self.on_created:
+            self.on_created(file_path, content_hash, metadata)
+
+    def _thumbnail_ready(self, content_hash):
+        repository = self.repository
+        return content_hash in repository._hash_sources or (
+            os.path.exists(repository._get_thumbnail_path(content_hash))
+            and os.path.exists(repository._get_grid_thumbnail_path(content_hash))
+        )
+
+    def _handle(self, future):
+        kind, key, size = self.futures.pop(future)
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.warning(f"創建縮圖失敗 {key}: {e}")
+            result = {'process': (None, False, None, None), 'hash': (None, None)}.get(kind)
+
+        if kind == 'process':
+            content_hash, ok, build_seconds, metadata = result
+            _record_thumbnail_result(ok, build_seconds)
+            self._finish(key, content_hash if ok else None, metadata)
+            self.processing_sizes[size] -= 1
+            if not self.processing_sizes[size]:
+                del self.processing_sizes[size]
+                deferred = [item for item in self.deferred if item[1] == size]
+                self.deferred = [item for item in self.deferred if item[1] != size]
+                for file_path, _, content_hash, metadata in deferred:
+                    self._resolve_hash(file_path, size, content_hash, metadata)
+        elif kind == 'hash':
+            self._resolve_hash(key, size, *result)
+        else:
+            metadata, build_seconds = result if result else (None, None)
+            ok = metadata is not None
+            _record_thumbnail_result(ok, build_seconds)
+            for waiting_path, waiting_metadata in self.building.pop(key):
+                self._finish(waiting_path, key if ok else None, waiting_metadata or metadata)
+
+    def _resolve_hash(self, file_path, size, content_hash, metadata):
+        """只計算了雜湊的原圖：沿用既有縮圖、等待進行中的任務，或提交創建縮圖的任務"""
+        if content_hash is None:
+            self._finish(file_path, None, metadata)
+        elif content_hash in self.building:
+            self.building[content_hash].append((file_path, metadata))
+        elif self._thumbnail_ready(content_hash):
+            self._finish(file_path, content_hash, metadata)
+        elif size in self.processing_sizes:
+            # 相同大小的原圖可能正在創建同一張縮圖
+            self.deferred.append((file_path, size, content_hash, metadata))
+        else:
+            repository = self.repository
+            self.building[content_hash] = [(file_path, metadata)]
+            self._submit(
+                ('build', content_hash, size),
+                _build_thumbnail_timed,
+                file_path,
+                repository._get_thumbnail_path(content_hash),
+                repository.max_thumbnail_size,
+                repository._get_grid_thumbnail_path(content_hash),
+                repository.grid_thumbnail_size,
+                repository.thumbnail_policy,
+            )
+
 
 class ImageRepository:
-    def __init__(self, images_dir):
+    def __init__(self, images_dir, screen_size=None):
         self.images_dir = images_dir
-        # 創建縮圖目錄
+        # 創建縮圖目錄（網格縮圖放在子目錄 grid 中）
         self.thumbnails_dir = os.path.join(os.path.dirname(images_dir), 'thumbnails')
+        self.grid_thumbnails_dir = os.path.join(self.thumbnails_dir, 'grid')
         self._ensure_thumbnails_dir()
-        
-        # 縮圖設定
-        self.max_thumbnail_size = (800, 600)  # 最大縮圖尺寸
-        self.max_file_size = 5 * 1024 * 1024  # 5MB 限制
-        
+        # 縮圖索引檔，與縮圖目錄放在同一層
+        self.manifest = ThumbnailManifest(
+            os.path.join(os.path.dirname(images_dir), 'thumbnails_manifest.json')
+        )
+
+        # 縮圖設定：螢幕版本與螢幕尺寸相同，網格縮圖用於播放列表
+        self.max_thumbnail_size = tuple(screen_size) if screen_size else (800, 600)
+        self.grid_thumbnail_size = (320, 240)
+        # 縮圖工作進程數量，預設與 CPU 核心數相同（Raspberry Pi 4 為 4）
+        self.thumbnail_workers = os.cpu_count() or 1
+        # 少於這個數量的原圖（例如目錄監視回報的單一檔案）直接在當前線程中處理，
+        # 不為幾張圖片從背景線程 fork 出整個進程池
+        self.inline_thumbnail_limit = 8
+        # 縮圖的品質與速度策略（THUMBNAIL_POLICIES 的鍵）
+        self.thumbnail_policy = DEFAULT_THUMBNAIL_POLICY
+
         # 緩存已處理的圖片列表
         self._processed_images_cache = None
         self._is_initialized = False
 
+        # 縮圖以內容雜湊命名，內容相同的原圖共用一張縮圖：
+        # 原圖路徑 -> 雜湊、雜湊 -> 原圖路徑列表（第一個為主要原圖）
+        self._source_hashes = {}
+        self._hash_sources = {}
+        # 圖片路徑 -> {'grid': 網格縮圖路徑, 'original': 原圖路徑}
+        self._renditions = {}
+        # 圖片路徑 -> 中繼資料（EXIF 方向、拍攝時間、尺寸、相機），來自縮圖索引或創建縮圖時讀取
+        self._metadata = {}
+        # 圖片路徑 -> 排序鍵（主要原圖相對於圖片目錄的路徑，主要原圖改變時一併更新），圖片列表按此排序；
+        # 圖片移除後保留排序鍵，監聽器收到刪除通知時仍能以二分搜尋定位
+        self._sort_keys = {}
+
+        # 圖片目錄是否可用；隨身碟被拔出時為 False，圖片、縮圖索引與縮圖都保留，重新插入後直接沿用
+        self._available = True
+        # 最近一次完整掃描時原圖的 {路徑: (大小, 修改時間)}，交給目錄監視器作為比較的基準
+        self._scan_snapshot = None
+
+        # 背景加載狀態：加載期間已完成的圖片，以及圖片列表變更監聽器
+        self._lock = threading.RLock()
+        self._is_loading = False
+        self._loading_images = []
+        self._listeners = []
+
     def _ensure_thumbnails_dir(self):
         """確保縮圖目錄存在"""
-        if not os.path.exists(self.thumbnails_dir):
-            os.makedirs(self.thumbnails_dir)
-    
-    def _should_create_thumbnail(self, file_path):
-        """判斷是否需要創建縮圖"""
-        try:
-            # 檢查檔案大小
-            file_size = os.path.getsize(file_path)
-            if file_size > self.max_file_size:
-                return True
-            
-            # 檢查是否已有縮圖
-            filename = os.path.basename(file_path)
-            thumbnail_path = os.path.join(self.thumbnails_dir, filename)
-            if not os.path.exists(thumbnail_path):
-                return True
-                
-            return False
-        except Exception:
-            return False
-    
-    def _create_thumbnail(self, file_path):
-        """創建縮圖"""
-        try:
-            # 檢查原檔案是否存在
-            if not os.path.exists(file_path):
-                print(f"原檔案不存在: {file_path}")
-                return file_path
-            
-            filename = os.path.basename(file_path)
-            thumbnail_path = os.path.join(self.thumbnails_dir, filename)
-            
-            # 使用 PIL 創建縮圖
-            with PILImage.open(file_path) as img:
-                # 轉換為 RGB 模式（處理 RGBA 等格式）
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    img = img.convert('RGB')
-                
-                # 計算縮圖尺寸，保持比例
-                img.thumbnail(self.max_thumbnail_size, PILImage.Resampling.LANCZOS)
-                
-                # 保存縮圖，使用較高品質
-                img.save(thumbnail_path, 'JPEG', quality=85, optimize=True)
-                
-            # 驗證縮圖是否成功創建
-            if os.path.exists(thumbnail_path) and os.path.getsize(thumbnail_path) > 0:
-                print(f"已成功創建縮圖: {filename}")
-                return thumbnail_path
+        if not os.path.exists(self.grid_thumbnails_dir):
+            os.makedirs(self.grid_thumbnails_dir)
+
+    def _manifest_key(self, file_path):
+        """獲取原圖在縮圖索引中的鍵（相對於圖片目錄的路徑）"""
+        return os.path.relpath(file_path, self.images_dir)
+
+    def _get_thumbnail_path(self, content_hash):
+        """獲取內容雜湊對應的縮圖路徑"""
+        return os.path.join(self.thumbnails_dir, content_hash + '.jpg')
+
+    def _get_grid_thumbnail_path(self, content_hash):
+        """獲取內容雜湊對應的網格縮圖路徑"""
+        return os.path.join(self.grid_thumbnails_dir, content_hash + '.jpg')
+
+    def _lookup_thumbnail(self, file_path, stat_result, existing_thumbnails):
+        """查詢縮圖索引，原圖未變更且縮圖仍存在時返回索引記錄，否則返回 None"""
+        entry = self.manifest.lookup(
+            self._manifest_key(file_path), stat_result.st_size, stat_result.st_mtime_ns
+        )
+        if (entry and entry.get('screen_size') == list(self.max_thumbnail_size)
+                and entry['thumbnail'] in existing_thumbnails
+                and entry.get('grid') in existing_thumbnails):
+            return entry
+        return None
+
+    def _list_existing_thumbnails(self):
+        """列出縮圖目錄中已存在的縮圖（相對於縮圖目錄的路徑）"""
+        existing = set(os.listdir(self.thumbnails_dir))
+        grid_dir = os.path.relpath(self.grid_thumbnails_dir, self.thumbnails_dir)
+        existing.update(os.path.join(grid_dir, name) for name in os.listdir(self.grid_thumbnails_dir))
+        return existing
+
+    def _record_thumbnail(self, file_path, stat_result, content_hash, metadata):
+        """將原圖與其縮圖、中繼資料記錄到縮圖索引"""
+        self.manifest.update(
+            self._manifest_key(file_path),
+            stat_result.st_size,
+            stat_result.st_mtime_ns,
+            content_hash,
+            os.path.relpath(self._get_thumbnail_path(content_hash), self.thumbnails_dir),
+            os.path.relpath(self._get_grid_thumbnail_path(content_hash), self.thumbnails_dir),
+            self.max_thumbnail_size,
+            metadata,
+        )
+
+    def _register_source(self, file_path, content_hash, metadata=None):
+        """登記原圖與其內容雜湊、中繼資料，返回 (圖片路徑, 是否為新圖片)
+
+        content_hash 為 None（縮圖創建失敗）時直接以原圖作為圖片路徑。
+        內容相同的原圖共用同一個圖片路徑，只有第一個登記的原圖會成為新圖片。
+        """
+        with self._lock:
+            if content_hash is None:
+                image_path = file_path
+                is_new = image_path not in self._renditions
+                self._renditions[image_path] = {'grid': file_path, 'original': file_path}
             else:
-                print(f"縮圖創建失敗: {thumbnail_path}")
-                return file_path
-                
-        except Exception as e:
-            print(f"創建縮圖失敗 {file_path}: {e}")
-            return file_path  # 失敗時返回原檔案路徑
+                image_path = self._get_thumbnail_path(content_hash)
+                sources = self._hash_sources.setdefault(content_hash, [])
+                is_new = not sources
+                if file_path not in sources:
+                    sources.append(file_path)
+                self._source_hashes[file_path] = content_hash
+                if is_new:
+                    self._renditions[image_path] = {
+                        'grid': self._get_grid_thumbnail_path(content_hash),
+                        'original': file_path,
+                    }
+            if is_new:
+                self._sort_keys[image_path] = self._manifest_key(file_path)
+            if metadata is not None and (is_new or image_path not in self._metadata):
+                self._metadata[image_path] = metadata
+            return image_path, is_new
+
+    def _unregister_source(self, file_path):
+        """取消登記原圖，返回 (被移除的圖片路徑, 雜湊, 排序鍵改變的圖片路徑)
+
+        該內容已沒有其他原圖時移除圖片，返回 (圖片路徑, 雜湊, None)；
+        被取消的是主要原圖而仍有相同內容的原圖時，下一個原圖成為主要原圖，
+        排序鍵隨之改變（與重新掃描的結果一致），圖片在緩存列表中移到新的位置，返回 (None, None, 圖片路徑)；
+        其他情況返回 (None, None, None)。
+        """
+        with self._lock:
+            content_hash = self._source_hashes.pop(file_path, None)
+            if content_hash is None:
+                if self._renditions.pop(file_path, None) is not None:
+                    self._metadata.pop(file_path, None)
+                    return file_path, None, None
+                return None, None, None
+
+            sources = self._hash_sources.get(content_hash, [])
+            if file_path in sources:
+                sources.remove(file_path)
+            image_path = self._get_thumbnail_path(content_hash)
+            if sources:
+                rendition = self._renditions[image_path]
+                if rendition['original'] == sources[0]:
+                    return None, None, None
+                rendition['original'] = sources[0]
+                sort_key = self._manifest_key(sources[0])
+                if sort_key == self._sort_keys.get(image_path):
+                    return None, None, None
+                # 先以舊的排序鍵從緩存列表中移除，再以新的排序鍵插入
+                in_cache = self._processed_images_cache is not None and self._remove_from_cache(image_path)
+                self._sort_keys[image_path] = sort_key
+                if in_cache:
+                    self._insert_into_cache(image_path)
+                    return None, None, image_path
+                return None, None, None
+
+            del self._hash_sources[content_hash]
+            self._renditions.pop(image_path, None)
+            self._metadata.pop(image_path, None)
+            return image_path, content_hash, None
+
+    def sort_key(self, image_path):
+        """圖片列表的排序鍵：主要原圖相對於圖片目錄的路徑"""
+        return self._sort_keys.get(image_path, image_path)
+
+    def _thumbnail_args(self):
+        """_process_source 除原圖路徑外的參數"""
+        return (
+            self.thumbnails_dir,
+            self.max_thumbnail_size,
+            self.grid_thumbnails_dir,
+            self.grid_thumbnail_size,
+            self.thumbnail_policy,
+        )
+
+    def _create_thumbnails(self, sources, on_created=None, parallel=True):
+        """使用進程池並行計算內容雜湊、讀取中繼資料並創建縮圖
 
-    def _initialize_images(self):
-        """初始化圖片列表，只執行一次"""
+        返回 {原檔案路徑: (內容雜湊或 None, 中繼資料或 None)}。
+
+        sources 可以是邊走訪目錄邊產生的迭代器：每取得一個檔案就提交任務，
+        並隨時收集已完成的結果，不需要等待走訪結束。
+        進程池大小由 thumbnail_workers 決定；parallel 為 False、只有一個工作進程或進程池無法啟動時，
+        在當前線程中逐張處理。
+
+        Args:
+            sources: (原檔案路徑, os.stat 結果) 的可迭代對象
+            on_created: 可選的回調 on_created(file_path, content_hash, metadata)，每個檔案完成時調用
+            parallel: 是否使用進程池（少量原圖時逐張處理比啟動進程池快）
+        """
+        sources = iter(sources)
+        results = {}
+        consumed = []
+        if parallel and self.thumbnail_workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=self.thumbnail_workers) as executor:
+                    jobs = _ThumbnailJobs(self, executor, results, on_created,
+                                          max_pending=2 * self.thumbnail_workers)
+                    for file_path, stat_result in sources:
+                        consumed.append((file_path, stat_result))
+                        jobs.add(file_path, stat_result)
+                        jobs.collect()
+                    jobs.collect(until_done=True)
+                return results
+            except Exception as e:
+                logger.warning(f"無法啟動縮圖進程池，改為逐張處理: {e}")
+
+        with _InlineExecutor() as executor:
+            jobs = _ThumbnailJobs(self, executor, results, on_created)
+            for file_path, stat_result in consumed:
+                if file_path not in results:
+                    jobs.add(file_path, stat_result)
+            for file_path, stat_result in sources:
+                jobs.add(file_path, stat_result)
+                jobs.collect()
+            jobs.collect(until_done=True)
+        return results
+
+    def add_listener(self, callback):
+        """註冊圖片列表變更監聽器 callback(added, removed, modified, moved)
+
+        moved 為路徑不變但排序鍵改變（例如原圖改名）的圖片，需要按 sort_key 移到新的位置。
+        回調在處理圖片的線程中執行（背景加載時為加載線程）。
+        """
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """移除圖片列表變更監聽器"""
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _notify_listeners(self, added, removed, modified=(), moved=()):
+        """通知所有監聽器圖片列表的變更"""
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(added, removed, modified, moved)
+            except Exception as e:
+                logger.exception(f"圖片列表監聽器執行失敗: {e}")
+
+    def set_available(self, available):
+        """標記圖片目錄是否可用（由目錄監視器在目錄消失與重新出現時調用）"""
+        self._available = available
+
+    def is_available(self):
+        """圖片目錄是否可用（隨身碟被拔出時為 False）"""
+        return self._available
+
+    def is_loading(self):
+        """是否正在背景加載圖片"""
+        return self._is_loading
+
+    def load_images_async(self, on_complete=None):
+        """在背景線程中發現圖片並創建縮圖，不阻塞調用者
+
+        每張圖片準備好後立即通過監聽器通知（added=[路徑]），
+        加載期間 get_image_files() 返回目前已完成的圖片。
+
+        Args:
+            on_complete: 可選的完成回調 on_complete(image_files)，在加載線程中執行
+        """
+        with self._lock:
+            if self._is_initialized or self._is_loading:
+                return
+            self._is_loading = True
+            self._loading_images = []
+
+        def worker():
+            try:
+                image_files = self._initialize_images()
+            except Exception as e:
+                logger.exception(f"背景加載圖片失敗: {e}")
+                with self._lock:
+                    self._processed_images_cache = sorted(self._loading_images, key=self.sort_key)
+                    self._is_initialized = True
+                image_files = self._processed_images_cache
+            finally:
+                with self._lock:
+                    self._is_loading = False
+                    self._loading_images = []
+            if on_complete:
+                on_complete(image_files)
+
+        threading.Thread(target=worker, name='image-loader', daemon=True).start()
+
+    def _initialize_images(self, progress_callback=None):
+        """初始化圖片列表，只執行一次
+
+        Args:
+            progress_callback: 可選的進度回調 progress_callback(completed, discovered, image_path)，
+                每個原圖處理完成時調用一次（在調用本方法的線程中執行）；
+                目錄邊走訪邊處理，discovered 為目前已發現的原圖數量
+        """
         if self._is_initialized:
             return self._processed_images_cache
-        
-        print("正在初始化圖片列表，創建必要的縮圖...")
-        
+
+        logger.info("正在初始化圖片列表，創建必要的縮圖...")
+        started = time.perf_counter()
+
         if not os.path.exists(self.images_dir):
             self._processed_images_cache = []
+            self._scan_snapshot = {}
             self._is_initialized = True
             return self._processed_images_cache
-        
+
         image_files = []
-        for f in os.listdir(self.images_dir):
-            if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
-                file_path = os.path.join(self.images_dir, f)
-                
-                # 檢查是否需要創建縮圖
-                if self._should_create_thumbnail(file_path):
-                    thumbnail_path = self._create_thumbnail(file_path)
-                    image_files.append(thumbnail_path)
+        completed = 0
+        discovered = 0
+
+        def report(results):
+            """results 為 [(原圖路徑, 內容雜湊或 None, 中繼資料)]，只回報新的（內容不重複的）圖片"""
+            nonlocal completed
+            new_images = []
+            processed = []
+            for file_path, content_hash, metadata in results:
+                image_path, is_new = self._register_source(file_path, content_hash, metadata)
+                processed.append(image_path)
+                if is_new:
+                    new_images.append(image_path)
+            with self._lock:
+                image_files.extend(new_images)
+                if self._is_loading:
+                    self._loading_images.extend(new_images)
+            if new_images:
+                self._notify_listeners(new_images, [])
+            if progress_callback:
+                for image_path in processed:
+                    completed += 1
+                    progress_callback(completed, discovered, image_path)
+
+        # 一次載入索引並列出既有縮圖，之後每張圖片只需走訪目錄時的一次 stat
+        self.manifest.load()
+        existing_thumbnails = self._list_existing_thumbnails()
+        if self.manifest.outdated:
+            # 舊版索引的縮圖沒有按 EXIF 方向轉正，也沒有中繼資料，全部重新創建
+            self._remove_orphan_thumbnails(existing_thumbnails)
+            existing_thumbnails = set()
+        stats = {}
+        # 走訪時無法讀取的目錄或檔案：其中的圖片可能只是暫時無法讀取，不能當作已刪除
+        scan_errors = []
+
+        def discover():
+            """邊走訪目錄邊回報已有縮圖的圖片，產生需要創建縮圖的原圖"""
+            nonlocal discovered
+            # 現有縮圖分批回報：第一張立即回報讓幻燈片盡快開始，之後按數量或時間間隔回報
+            ready = []
+            last_report = time.monotonic()
+            for file_path, stat_result in scan_images(
+                self.images_dir, IMAGE_EXTENSIONS, on_error=lambda path, error: scan_errors.append(path)
+            ):
+                discovered += 1
+                stats[file_path] = stat_result
+                entry = self._lookup_thumbnail(file_path, stat_result, existing_thumbnails)
+                if entry:
+                    # 使用現有縮圖與索引中的中繼資料，不需要打開原圖
+                    ready.append((file_path, entry['hash'], entry.get('meta')))
+                    if not image_files or len(ready) >= 256 or time.monotonic() - last_report > 0.2:
+                        report(ready)
+                        ready = []
+                        last_report = time.monotonic()
                 else:
-                    # 使用現有縮圖
-                    filename = os.path.basename(file_path)
-                    thumbnail_path = os.path.join(self.thumbnails_dir, filename)
-                    if os.path.exists(thumbnail_path):
-                        image_files.append(thumbnail_path)
-                    else:
-                        image_files.append(file_path)
-        
-        image_files.sort()
-        self._processed_images_cache = image_files
-        self._is_initialized = True
-        
-        print(f"圖片初始化完成，共 {len(image_files)} 張圖片")
+                    yield file_path, stat_result
+            if ready:
+                report(ready)
+
+        def on_created(file_path, content_hash, metadata):
+            if content_hash is not None:
+                self._record_thumbnail(file_path, stats[file_path], content_hash, metadata)
+            report([(file_path, content_hash, metadata)])
+
+        self._create_thumbnails(discover(), on_created=on_created)
+
+        if scan_errors:
+            # 不完整的走訪不能判斷哪些原圖已刪除，保留索引記錄與縮圖，下次完整走訪時再清理
+            logger.warning(f"有 {len(scan_errors)} 個目錄或檔案無法讀取，本次不清理縮圖索引與縮圖")
+        else:
+            self.manifest.prune({self._manifest_key(file_path) for file_path in stats})
+        self.manifest.save()
+        if not scan_errors:
+            self._remove_orphan_thumbnails(existing_thumbnails)
+
+        image_files.sort(key=self.sort_key)
+        with self._lock:
+            self._processed_images_cache = image_files
+            self._scan_snapshot = {
+                file_path: (stat_result.st_size, stat_result.st_mtime_ns)
+                for file_path, stat_result in stats.items()
+            }
+            self._is_initialized = True
+
+        elapsed = time.perf_counter() - started
+        METRICS.histogram('photoframe_library_scan_seconds', '完整掃描圖片目錄並準備縮圖的耗時').observe(elapsed)
+        logger.info(f"圖片初始化完成，共 {len(image_files)} 張圖片，耗時 {elapsed:.2f} 秒")
         return image_files
 
-    def get_image_files(self):
-        """獲取圖片檔案列表，使用緩存避免重複處理"""
+    def _remove_orphan_thumbnails(self, existing_thumbnails):
+        """刪除縮圖索引中已沒有引用的縮圖（例如原圖已刪除或舊的命名方式）"""
+        referenced = set()
+        for entry in self.manifest.entries.values():
+            referenced.add(entry['thumbnail'])
+            referenced.add(entry.get('grid'))
+        grid_dir = os.path.relpath(self.grid_thumbnails_dir, self.thumbnails_dir)
+        for name in existing_thumbnails - referenced:
+            if name == grid_dir:
+                continue
+            try:
+                os.remove(os.path.join(self.thumbnails_dir, name))
+            except OSError as e:
+                logger.warning(f"刪除縮圖失敗 {name}: {e}")
+
+    def take_scan_snapshot(self):
+        """取出最近一次完整掃描時原圖的 {路徑: (大小, 修改時間)}（只能取出一次），沒有時返回 None
+
+        掃描是邊走訪邊進行的，先走訪過的目錄在掃描結束前可能已經改變；
+        目錄監視器以此為基準比較，補上這段期間的變更。
+        """
+        with self._lock:
+            snapshot, self._scan_snapshot = self._scan_snapshot, None
+            return snapshot
+
+    def get_image_files(self, progress_callback=None):
+        """獲取圖片檔案列表，使用緩存避免重複處理
+
+        背景加載期間不會阻塞，返回目前已準備好的圖片（已排序的副本）。
+        """
+        with self._lock:
+            if self._is_loading:
+                return sorted(self._loading_images, key=self.sort_key)
         if self._processed_images_cache is None:
-            return self._initialize_images()
+            return self._initialize_images(progress_callback)
         return self._processed_images_cache
-    
-    def refresh_images(self):
+
+    def refresh_images(self, progress_callback=None):
         """強制刷新圖片列表（清除緩存並重新處理）"""
-        print("強制刷新圖片列表...")
-        self._processed_images_cache = None
-        self._is_initialized = False
-        return self._initialize_images()
-    
+        with self._lock:
+            if self._is_loading:
+                return sorted(self._loading_images, key=self.sort_key)
+        logger.info("強制刷新圖片列表...")
+        self.clear_cache()
+        return self._initialize_images(progress_callback)
+
+    def apply_changes(self, added=(), removed=(), modified=()):
+        """增量套用圖片目錄的變更（原檔案路徑），只處理變更的檔案
+
+        處理完成後以差異通知監聽器，而不是重建整個圖片列表。
+        縮圖以內容命名，內容改變的原圖會以「刪除舊圖片、新增新圖片」通知；
+        改名或移動的原圖圖片路徑不變，排序鍵改變時以 moved 通知；
+        相同內容的主要原圖被刪除、改用下一個原圖排序時同樣以 moved 通知。
+        尚未初始化或正在背景加載時忽略（完整掃描會包含這些變更）。
+        """
+        with self._lock:
+            if not self._is_initialized or self._is_loading:
+                return
+
+        if removed and not os.path.isdir(self.images_dir):
+            # 圖片目錄不存在（隨身碟被拔出）：無法確認原圖已刪除，保留圖片、縮圖索引與縮圖
+            logger.warning(f"圖片目錄不存在，忽略 {len(removed)} 個刪除事件: {self.images_dir}")
+            self.set_available(False)
+            removed = ()
+        # 只處理確實已不存在的原圖
+        removed = {p for p in removed if not os.path.exists(p)}
+        changed = [p for p in list(added) + list(modified) if p.lower().endswith(IMAGE_EXTENSIONS)]
+        removed_images = []
+        added_images = []
+        moved_images = []
+
+        # 刪除與修改的原圖都先取消登記，內容已沒有其他原圖時移除圖片與縮圖；
+        # 移除的是主要原圖時圖片改以下一個原圖排序，以 moved 通知
+        for file_path in list(removed) + changed:
+            if file_path in removed:
+                self.manifest.remove(self._manifest_key(file_path))
+            image_path, content_hash, moved_image = self._unregister_source(file_path)
+            if moved_image is not None and moved_image not in moved_images:
+                moved_images.append(moved_image)
+            if image_path is None:
+                continue
+            with self._lock:
+                if self._remove_from_cache(image_path):
+                    removed_images.append(image_path)
+                    if image_path in moved_images:
+                        moved_images.remove(image_path)
+            if content_hash is None:
+                continue
+            for path in (image_path, self._get_grid_thumbnail_path(content_hash)):
+                if os.path.exists(path):
+                    try:
+                        os.remove(path)
+                    except OSError as e:
+                        logger.warning(f"刪除縮圖失敗 {path}: {e}")
+
+        # 索引仍然有效的檔案（例如完整掃描時暫時無法讀取的檔案）直接沿用縮圖，其餘重新創建
+        stats = {}
+        results = {}
+        pending = {}
+        for file_path in changed:
+            try:
+                stats[file_path] = os.stat(file_path)
+            except OSError:
+                continue
+            entry = self.manifest.entries.get(self._manifest_key(file_path))
+            existing = set()
+            if entry:
+                existing = {
+                    name for name in (entry['thumbnail'], entry.get('grid'))
+                    if name and os.path.exists(os.path.join(self.thumbnails_dir, name))
+                }
+            entry = self._lookup_thumbnail(file_path, stats[file_path], existing)
+            if entry:
+                results[file_path] = (entry['hash'], entry.get('meta'))
+            else:
+                pending[file_path] = stats[file_path]
+
+        if pending:
+            parallel = len(pending) >= self.inline_thumbnail_limit
+            for file_path, (content_hash, metadata) in self._create_thumbnails(pending.items(), parallel=parallel).items():
+                if content_hash is not None:
+                    self._record_thumbnail(file_path, stats[file_path], content_hash, metadata)
+                results[file_path] = (content_hash, metadata)
+
+        # 被刪除的圖片原本的排序鍵，同一內容又加入（改名或移動）時判斷位置是否改變
+        previous_keys = {image_path: self.sort_key(image_path) for image_path in removed_images}
+        for file_path, (content_hash, metadata) in results.items():
+            image_path, is_new = self._register_source(file_path, content_hash, metadata)
+            with self._lock:
+                if is_new and self._insert_into_cache(image_path):
+                    if image_path in removed_images:
+                        # 同一內容被刪除後又加入（例如改名），圖片不變，只有排序鍵可能改變
+                        removed_images.remove(image_path)
+                        if self.sort_key(image_path) != previous_keys[image_path]:
+                            moved_images.append(image_path)
+                    else:
+                        added_images.append(image_path)
+        self.manifest.save()
+
+        if added_images or removed_images or moved_images:
+            logger.info(f"圖片目錄變更：新增 {len(added_images)}，刪除 {len(removed_images)}，移動 {len(moved_images)}")
+            self._notify_listeners(added_images, removed_images, [], moved_images)
+
+    def _insert_into_cache(self, image_path):
+        """將圖片按排序鍵插入緩存列表，已存在時返回 False"""
+        cache = self._processed_images_cache
+        key = self.sort_key(image_path)
+        position = bisect_left(cache, key, key=self.sort_key)
+        if position < len(cache) and cache[position] == image_path:
+            return False
+        cache.insert(position, image_path)
+        return True
+
+    def _remove_from_cache(self, image_path):
+        """從緩存列表中移除圖片，不存在時返回 False"""
+        cache = self._processed_images_cache
+        position = bisect_left(cache, self.sort_key(image_path), key=self.sort_key)
+        if position < len(cache) and cache[position] == image_path:
+            del cache[position]
+            return True
+        return False
+
     def clear_cache(self):
         """清除緩存"""
-        self._processed_images_cache = None
-        self._is_initialized = False
-        print("圖片緩存已清除")
-    
+        with self._lock:
+            self._processed_images_cache = None
+            self._is_initialized = False
+            self._source_hashes = {}
+            self._hash_sources = {}
+            self._renditions = {}
+            self._metadata = {}
+            self._sort_keys = {}
+            self._scan_snapshot = None
+        logger.debug("圖片緩存已清除")
+
+    def get_rendition_path(self, image_path, target_size):
+        """返回足以覆蓋目標尺寸的最小圖片版本路徑
+
+        版本由小到大為：網格縮圖（grid_thumbnail_size）、螢幕版本（max_thumbnail_size，
+        即 get_image_files() 返回的路徑）與原圖，讓每個使用者只解碼需要的像素。
+        """
+        target_width, target_height = target_size
+        rendition = self._renditions.get(image_path)
+        if rendition is None:
+            return image_path
+
+        grid_width, grid_height = self.grid_thumbnail_size
+        if target_width <= grid_width and target_height <= grid_height:
+            return rendition['grid']
+
+        screen_width, screen_height = self.max_thumbnail_size
+        if target_width <= screen_width and target_height <= screen_height:
+            return image_path
+        return rendition['original']
+
+    def get_metadata(self, image_path):
+        """圖片的中繼資料（見 image_metadata.read_metadata），來自索引而不讀取圖片；未知時返回 None"""
+        return self._metadata.get(image_path)
+
+    def get_capture_time(self, image_path):
+        """拍攝時間 'YYYY-MM-DDTHH:MM:SS'（可直接按字串比較），沒有 EXIF 拍攝時間時返回 None"""
+        metadata = self._metadata.get(image_path)
+        return metadata.get('taken') if metadata else None
+
+    def capture_time_key(self, image_path):
+        """按拍攝時間排序的鍵：沒有拍攝時間的圖片排在最後，拍攝時間相同時按原本的排序鍵"""
+        taken = self.get_capture_time(image_path)
+        return (taken is None, taken or '', self.sort_key(image_path))
+
+    def sort_by_capture_time(self, images):
+        """按拍攝時間排序圖片（不讀取圖片）"""
+        return sorted(images, key=self.capture_time_key)
+
+    def filter_by_capture_time(self, images, start=None, end=None):
+        """篩選拍攝時間在 [start, end) 之間的圖片（不讀取圖片），沒有拍攝時間的圖片不包括在內
+
+        Args:
+            start, end: ISO 格式的日期或日期時間字串，或 date / datetime；None 表示不限
+        """
+        start = start.isoformat() if hasattr(start, 'isoformat') else start
+        end = end.isoformat() if hasattr(end, 'isoformat') else end
+        selected = []
+        for image_path in images:
+            taken = self.get_capture_time(image_path)
+            if taken is None or (start is not None and taken < start) or (end is not None and taken >= end):
+                continue
+            selected.append(image_path)
+        return selected
+
+    def get_image_for_source(self, file_path):
+        """根據原圖路徑獲取圖片路徑（內容相同的原圖返回同一個圖片路徑）"""
+        content_hash = self._source_hashes.get(file_path)
+        if content_hash is not None:
+            return self._get_thumbnail_path(content_hash)
+        if file_path in self._renditions:
+            return file_path
+        return None
+
+    def resolve_image_path(self, path):
+        """將保存的路徑解析為目前的圖片路徑，無法解析時返回 None
+
+        接受目前的圖片路徑、原圖路徑，以及舊版以原圖檔名命名的縮圖路徑。
+        """
+        if path in self._renditions:
+            return path
+        image_path = self.get_image_for_source(path)
+        if image_path is None and os.path.dirname(path) == self.thumbnails_dir:
+            image_path = self.get_image_for_source(
+                os.path.join(self.images_dir, os.path.basename(path))
+            )
+        return image_path
+
+    def get_image_id(self, image_path):
+        """圖片的穩定 ID：'主要原圖相對於圖片目錄的路徑#內容雜湊'，未知的圖片返回 None
+
+        與圖片目錄的掛載位置無關，適合保存到檔案；縮圖創建失敗（沒有內容雜湊）的圖片只有相對路徑。
+        """
+        rendition = self._renditions.get(image_path)
+        if rendition is None:
+            return None
+        original = rendition['original']
+        content_hash = self._source_hashes.get(original)
+        relative = self._manifest_key(original).replace(os.sep, '/')
+        return f'{relative}#{content_hash}' if content_hash else relative
+
+    def resolve_image_id(self, image_id):
+        """將穩定 ID 解析為目前的圖片路徑，無法解析時返回 None
+
+        只查詢記憶體中的索引，不存取檔案系統。內容雜湊吻合時，即使原圖已改名或移動也能解析；
+        否則按相對路徑查找（例如原圖內容已修改）。
+        也接受舊版保存的絕對路徑（任何掛載位置下的原圖或縮圖路徑）：以內容雜湊命名的縮圖直接按雜湊查找，
+        其他路徑依次以去掉開頭目錄的路徑作為相對路徑查找，與舊版按檔名對應到新圖片目錄的行為相同。
+        """
+        relative, _, content_hash = image_id.partition('#')
+        if content_hash and content_hash in self._hash_sources:
+            return self._get_thumbnail_path(content_hash)
+        if not os.path.isabs(relative):
+            return self.get_image_for_source(os.path.join(self.images_dir, *relative.split('/')))
+
+        image_path = self.resolve_image_path(relative)
+        if image_path is not None:
+            return image_path
+        stem = os.path.splitext(os.path.basename(relative))[0]
+        if stem in self._hash_sources:
+            return self._get_thumbnail_path(stem)
+        parts = [part for part in relative.split('/') if part]
+        for start in range(1, len(parts)):
+            image_path = self.get_image_for_source(os.path.join(self.images_dir, *parts[start:]))
+            if image_path is not None:
+                return image_path
+        return None
+
+    def get_source_paths(self, image_path):
+        """獲取內容與該圖片相同的所有原圖路徑"""
+        content_hash = os.path.splitext(os.path.basename(image_path))[0]
+        return list(self._hash_sources.get(content_hash, []))
+
     def get_original_image_path(self, thumbnail_path):
         """根據縮圖路徑獲取原圖路徑"""
-        filename = os.path.basename(thumbnail_path)
-        original_path = os.path.join(self.images_dir, filename)
-        if os.path.exists(original_path):
-            return original_path
-        return thumbnail_path 
\ No newline at end of file
+        rendition = self._renditions.get(thumbnail_path)
+        if rendition is not None:
+            return rendition['original']
+        return thumbnail_path
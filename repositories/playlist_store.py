@@ -0,0 +1,79 @@
+import json
+import logging
+import os
+import threading
+
+from services.instrumentation import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+class PlaylistStore:
+    """具名播放列表的持久化
+
+    第一次使用時才加載檔案；每次變更立即以「先寫暫存檔再改名」的方式寫回，
+    斷電時不會留下寫了一半的檔案。
+    檔案格式：{"version": 1, "playlists": {"名稱": [圖片的穩定 ID, ...]}}（較早的檔案保存的是原圖路徑）
+    """
+
+    VERSION = 1
+
+    def __init__(self, playlists_file):
+        self.playlists_file = playlists_file
+        self._playlists = None
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        """在持有 _lock 時調用"""
+        if self._playlists is not None:
+            return
+        self._playlists = {}
+        try:
+            if os.path.exists(self.playlists_file):
+                with open(self.playlists_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == self.VERSION:
+                    self._playlists = data.get('playlists', {})
+        except Exception as e:
+            logger.warning(f"加載播放列表失敗: {e}")
+
+    def names(self):
+        """所有播放列表的名稱（按名稱排序）"""
+        with self._lock:
+            self._ensure_loaded()
+            return sorted(self._playlists)
+
+    def get(self, name):
+        """返回播放列表的圖片路徑，不存在時返回 None"""
+        with self._lock:
+            self._ensure_loaded()
+            images = self._playlists.get(name)
+            return list(images) if images is not None else None
+
+    def save(self, name, image_paths):
+        """新增或覆蓋播放列表"""
+        with self._lock:
+            self._ensure_loaded()
+            self._playlists[name] = list(image_paths)
+            self._write()
+
+    def delete(self, name):
+        """刪除播放列表，不存在時返回 False"""
+        with self._lock:
+            self._ensure_loaded()
+            if self._playlists.pop(name, None) is None:
+                return False
+            self._write()
+            return True
+
+    def _write(self):
+        """在持有 _lock 時調用"""
+        temp_file = self.playlists_file + '.tmp'
+        try:
+            with METRICS.span('photoframe_playlists_save_seconds', '寫入播放列表檔的耗時'):
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump({'version': self.VERSION, 'playlists': self._playlists}, f,
+                              ensure_ascii=False, separators=(',', ':'))
+                os.replace(temp_file, self.playlists_file)
+        except Exception as e:
+            logger.warning(f"保存播放列表失敗: {e}")
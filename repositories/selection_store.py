@@ -0,0 +1,124 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from services.instrumentation import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+class SelectionStateStore:
+    """播放列表勾選狀態的持久化
+
+    變更先合併在記憶體中，最後一次變更後 flush_delay 秒才寫入磁碟（或調用 flush() 立即寫入），
+    連續變更只推遲寫入時間，不會每次都建立計時器線程；
+    寫入時先寫暫存檔再改名，斷電時不會留下寫了一半的檔案。
+    檔案格式只保存選取模式與例外集合：
+    {"version": 3, "mode": "all_except" | "none_except", "exceptions": [...]}
+    exceptions 為圖片的穩定 ID（見 ImageRepository.get_image_id）；較早的檔案保存的是絕對路徑，
+    同樣由 ImageRepository.resolve_image_id 解析。
+    """
+
+    VERSION = 3
+
+    def __init__(self, state_file, flush_delay=2.0):
+        self.state_file = state_file
+        self.flush_delay = flush_delay
+        self._pending = None
+        self._timer = None
+        # 延遲寫入的時間（time.monotonic()），沒有待寫入時為 None
+        self._deadline = None
+        # 寫入順序：較舊的狀態不會覆蓋已寫入的較新狀態
+        self._sequence = 0
+        self._written_sequence = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def load(self):
+        """讀取保存的狀態，返回 {'mode', 'exceptions'}，沒有保存的狀態時返回 None
+
+        兼容舊格式（選取集合或帶有 image_states 的檔案）。
+        """
+        try:
+            if not os.path.exists(self.state_file):
+                return None
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state_data = json.load(f)
+        except Exception as e:
+            logger.warning(f"加載勾選框狀態失敗: {e}")
+            return None
+
+        if state_data.get('version') == self.VERSION:
+            return {
+                'mode': state_data.get('mode', 'all_except'),
+                'exceptions': state_data.get('exceptions', []),
+            }
+
+        # 舊格式：全部選中，或以選取集合（更舊的檔案為每張圖片的勾選狀態）為準
+        if state_data.get('all_selected', True):
+            return {'mode': 'all_except', 'exceptions': []}
+        if 'image_states' in state_data:
+            selected_images = [path for path, active in state_data['image_states'].items() if active]
+        else:
+            selected_images = state_data.get('selected_images', [])
+        return {'mode': 'none_except', 'exceptions': selected_images}
+
+    def update(self, mode, exceptions):
+        """記錄最新狀態並延遲寫入，期間的多次變更只寫入一次"""
+        with self._lock:
+            self._sequence += 1
+            # 只在這裡複製一份，排序與序列化留給寫入線程
+            self._pending = self._sequence, mode, list(exceptions)
+            self._deadline = time.monotonic() + self.flush_delay
+            if self._timer is None:
+                self._start_timer(self.flush_delay)
+
+    def _start_timer(self, delay):
+        """在持有 _lock 時調用"""
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            if threading.current_thread() is not self._timer:
+                # 已被 flush() 取消或取代的計時器
+                return
+            remaining = self._deadline - time.monotonic() if self._deadline is not None else 0
+            if remaining > 0:
+                self._start_timer(remaining)
+                return
+            self._timer = None
+        self.flush()
+
+    def flush(self):
+        """立即寫入尚未保存的狀態"""
+        with self._lock:
+            pending = self._pending
+            self._pending = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._deadline = None
+        if pending is None:
+            return
+
+        sequence, mode, exceptions = pending
+        state_data = {
+            'version': self.VERSION,
+            'mode': mode,
+            'exceptions': sorted(exceptions),
+        }
+        with self._write_lock:
+            if sequence <= self._written_sequence:
+                return
+            temp_file = self.state_file + '.tmp'
+            try:
+                with METRICS.span('photoframe_state_save_seconds', '寫入勾選框狀態的耗時'):
+                    with open(temp_file, 'w', encoding='utf-8') as f:
+                        json.dump(state_data, f, ensure_ascii=False, separators=(',', ':'))
+                    os.replace(temp_file, self.state_file)
+                self._written_sequence = sequence
+            except Exception as e:
+                logger.warning(f"保存勾選框狀態失敗: {e}")
@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from services.instrumentation import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+class SettingsStore:
+    """設定值的持久化
+
+    第一次讀取時才加載檔案；變更以 update() 批次合併，只有值真的改變時才安排寫入，
+    最後一次變更後 flush_delay 秒寫入磁碟（或調用 flush() 立即寫入），連續變更只推遲寫入時間，不會每次都建立計時器線程。
+    寫入時先寫暫存檔再改名，斷電時不會留下寫了一半的檔案。
+    檔案格式：{"version": 1, "settings": {...}}
+    """
+
+    VERSION = 1
+
+    def __init__(self, settings_file, defaults, flush_delay=1.0):
+        self.settings_file = settings_file
+        self.defaults = dict(defaults)
+        self.flush_delay = flush_delay
+        self._settings = None
+        self._dirty = False
+        self._timer = None
+        # 延遲寫入的時間（time.monotonic()），沒有待寫入時為 None
+        self._deadline = None
+        # 寫入順序：較舊的設定不會覆蓋已寫入的較新設定
+        self._sequence = 0
+        self._written_sequence = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        """在持有 _lock 時調用：尚未加載時讀取檔案，缺少或未知的鍵使用預設值"""
+        if self._settings is not None:
+            return
+        settings = dict(self.defaults)
+        try:
+            if os.path.exists(self.settings_file):
+                with open(self.settings_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == self.VERSION:
+                    settings.update(
+                        (key, value) for key, value in data.get('settings', {}).items()
+                        if key in self.defaults
+                    )
+        except Exception as e:
+            logger.warning(f"加載設定失敗，使用預設值: {e}")
+        self._settings = settings
+
+    def load(self):
+        """加載設定（已加載時不重複讀取），返回所有設定的副本"""
+        with self._lock:
+            self._ensure_loaded()
+            return dict(self._settings)
+
+    def get(self, key):
+        with self._lock:
+            self._ensure_loaded()
+            return self._settings[key]
+
+    def get_all(self):
+        return self.load()
+
+    def update(self, changes):
+        """合併一批變更並安排寫入
+
+        Returns:
+            實際改變了的 {鍵: 新值}；未知的鍵與值沒有改變的鍵會被略過
+        """
+        with self._lock:
+            self._ensure_loaded()
+            changed = {
+                key: value for key, value in changes.items()
+                if key in self.defaults and self._settings.get(key) != value
+            }
+            if not changed:
+                return {}
+            self._settings.update(changed)
+            self._sequence += 1
+            self._dirty = True
+            self._deadline = time.monotonic() + self.flush_delay
+            if self._timer is None:
+                self._start_timer(self.flush_delay)
+            return changed
+
+    def _start_timer(self, delay):
+        """在持有 _lock 時調用"""
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            if threading.current_thread() is not self._timer:
+                # 已被 flush() 取消或取代的計時器
+                return
+            remaining = self._deadline - time.monotonic() if self._deadline is not None else 0
+            if remaining > 0:
+                self._start_timer(remaining)
+                return
+            self._timer = None
+        self.flush()
+
+    def flush(self):
+        """立即寫入尚未保存的設定"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._deadline = None
+            if not self._dirty:
+                return
+            sequence = self._sequence
+            settings = dict(self._settings)
+
+        with self._write_lock:
+            if sequence > self._written_sequence:
+                temp_file = self.settings_file + '.tmp'
+                try:
+                    with METRICS.span('photoframe_settings_save_seconds', '寫入設定檔的耗時'):
+                        with open(temp_file, 'w', encoding='utf-8') as f:
+                            json.dump({'version': self.VERSION, 'settings': settings}, f, ensure_ascii=False)
+                        os.replace(temp_file, self.settings_file)
+                    self._written_sequence = sequence
+                except Exception as e:
+                    # 保持未保存的狀態，下一次變更或 flush() 時重試
+                    logger.warning(f"保存設定失敗: {e}")
+                    return
+        with self._lock:
+            # 寫入期間沒有新的變更時才清除未保存的標記
+            if self._sequence == sequence:
+                self._dirty = False
@@ -0,0 +1,177 @@
+import contextlib
+import json
+import logging
+import os
+import threading
+
+from services.instrumentation import METRICS
+from services.shuffle_order import ShuffleOrder
+
+logger = logging.getLogger(__name__)
+
+
+class ShuffleStateStore:
+    """隨機播放順序的持久化，重新開機後繼續同一個循環
+
+    分為兩個檔案：很小的狀態檔（seed、已抽出的數量與目前位置）在每次切換後更新；
+    槽位檔（圖片 ID 列表，大圖片庫時可達數百 KB）只在加入或刪除圖片、開始新循環後重寫。
+    兩者以 slots_id（seed 與槽位修訂號）對應，不一致時放棄恢復。
+    save() 只記錄需要寫入，寫入時才讀取順序並複製槽位，最多每 flush_delay 秒一次
+    （或調用 flush() 立即寫入），先寫暫存檔再改名。
+    槽位以 to_id 轉換為與掛載位置無關的穩定 ID 保存，加載時以 from_id 解析回圖片路徑；
+    暫時無法解析的 ID（例如圖片仍在背景加載）原樣留在槽位中，圖片出現後由調用者以 ShuffleOrder.replace 換回路徑。
+    狀態檔格式：{"version": 1, "source": ..., "slots_id": ..., "state": {...}}
+    槽位檔格式：{"version": 1, "slots_id": ..., "slots": [圖片 ID 或 null, ...]}
+    """
+
+    VERSION = 1
+
+    def __init__(self, state_file, slots_file, flush_delay=10.0, to_id=None, from_id=None):
+        self.state_file = state_file
+        self.slots_file = slots_file
+        self.flush_delay = flush_delay
+        # 圖片路徑 <-> 穩定 ID 的轉換（ImageRepository.get_image_id / resolve_image_id），沒有時保存路徑
+        self.to_id = to_id
+        self.from_id = from_id
+        # 尚未寫入的 (source, order, lock)
+        self._pending = None
+        self._written_slots_id = None
+        # 讀取順序的序號，較舊的讀取不會覆蓋已寫入的較新狀態
+        self._sequence = 0
+        self._written_sequence = 0
+        self._timer = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    @staticmethod
+    def _slots_id(order):
+        return f'{order.seed}-{order.revision}'
+
+    def load(self, source):
+        """恢復 source（例如 'library'）的隨機播放順序，沒有保存或資料不一致時返回 None"""
+        # 先寫入尚未保存的順序，讀到的總是最新的狀態
+        self.flush()
+        try:
+            state_data = self._read(self.state_file)
+            if state_data is None or state_data.get('source') != source:
+                return None
+            slots_data = self._read(self.slots_file)
+            if slots_data is None or slots_data.get('slots_id') != state_data.get('slots_id'):
+                logger.warning("隨機播放的狀態與槽位不一致，重新洗牌")
+                return None
+            order = ShuffleOrder.restore(self._decode_slots(slots_data['slots']), state_data['state'])
+        except Exception as e:
+            logger.warning(f"恢復隨機播放順序失敗: {e}")
+            return None
+        if order is not None:
+            with self._lock:
+                self._written_slots_id = slots_data['slots_id']
+        return order
+
+    def _decode_slots(self, image_ids):
+        """穩定 ID -> 圖片路徑；無法解析的 ID 保留原樣，解析到同一張圖片的後者視為已刪除"""
+        if self.from_id is None:
+            return image_ids
+        slots = []
+        seen = set()
+        for image_id in image_ids:
+            path = self.from_id(image_id) if image_id is not None else None
+            if path is None:
+                slots.append(image_id)
+            elif path in seen:
+                slots.append(None)
+            else:
+                seen.add(path)
+                slots.append(path)
+        return slots
+
+    def _encode_slots(self, slots):
+        """圖片路徑 -> 穩定 ID；不是已知圖片的值（例如尚未解析的 ID）原樣保存"""
+        if self.to_id is None:
+            return slots
+        return [(self.to_id(path) or path) if path is not None else None for path in slots]
+
+    def _read(self, path):
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if data.get('version') == self.VERSION else None
+
+    def save(self, source, order, lock=None):
+        """記錄順序需要寫入並安排寫入（常數時間，不複製槽位）
+
+        Args:
+            lock: 修改 order 時持有的鎖，寫入時在持有它的情況下讀取 order
+        """
+        with self._lock:
+            self._pending = (source, order, lock)
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """立即寫入尚未保存的順序"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self._pending = self._pending, None
+            written_slots_id = self._written_slots_id
+        if pending is None:
+            return
+
+        # 在寫入鎖之外讀取順序：持有 lock 的線程（例如關閉隨機播放時）也會調用 flush()
+        source, order, lock = pending
+        with lock if lock is not None else contextlib.nullcontext():
+            slots_id = self._slots_id(order)
+            state = order.state()
+            # 槽位列表只在改變後複製
+            slots = order.slots() if slots_id != written_slots_id else None
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+
+        with self._write_lock:
+            if sequence < self._written_sequence:
+                # 較新的狀態已經寫入
+                return
+            if slots is None and slots_id != self._written_slots_id:
+                # 讀取順序後另一次寫入換了槽位檔，稍後以新的槽位重新寫入
+                self._requeue(pending, schedule=True)
+                return
+            try:
+                with METRICS.span('photoframe_shuffle_state_save_seconds', '寫入隨機播放狀態的耗時'):
+                    # 先寫槽位再寫狀態：中途斷電時狀態檔仍指向舊的槽位 ID，不會配錯
+                    if slots is not None:
+                        self._write(self.slots_file, {
+                            'version': self.VERSION, 'slots_id': slots_id, 'slots': self._encode_slots(slots)
+                        })
+                    self._write(self.state_file, {
+                        'version': self.VERSION, 'source': source, 'slots_id': slots_id, 'state': state
+                    })
+            except Exception as e:
+                logger.warning(f"保存隨機播放狀態失敗: {e}")
+                # 下一次 save() 或 flush() 時重試
+                self._requeue(pending, schedule=False)
+                return
+            self._written_sequence = sequence
+            with self._lock:
+                self._written_slots_id = slots_id
+
+    def _requeue(self, pending, schedule):
+        """寫入沒有完成時放回待寫入（已有較新的待寫入時不需要）"""
+        with self._lock:
+            if self._pending is None:
+                self._pending = pending
+            if schedule and self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _write(self, path, data):
+        temp_file = path + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_file, path)
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import logging
+import os
+
+from services.instrumentation import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """計算檔案內容的 SHA-1 雜湊值"""
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ThumbnailManifest:
+    """縮圖索引檔
+
+    以相對於圖片目錄的原圖路徑為鍵，記錄原圖大小、修改時間、內容雜湊，
+    螢幕版本縮圖、網格縮圖的路徑與生成螢幕版本時的螢幕尺寸，以及原圖的中繼資料（EXIF）。
+    啟動時只需載入一次索引並對原圖做 stat，大小與修改時間都吻合的圖片直接沿用既有縮圖與中繼資料。
+    """
+
+    # 版本 3：縮圖按 EXIF 方向轉正，記錄包含中繼資料
+    VERSION = 3
+
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.entries = {}
+        # 載入的是舊版索引：既有縮圖不符合目前的格式，需要重新創建
+        self.outdated = False
+        self._dirty = False
+
+    def load(self):
+        """從磁碟載入索引，檔案不存在或格式不符時從空索引開始"""
+        self.entries = {}
+        self.outdated = False
+        self._dirty = False
+        try:
+            if not os.path.exists(self.manifest_path):
+                return
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != self.VERSION:
+                logger.info(f"縮圖索引版本不符，將重新建立: {self.manifest_path}")
+                self.outdated = True
+                return
+            self.entries = data.get('entries', {})
+        except Exception as e:
+            logger.warning(f"加載縮圖索引失敗: {e}")
+            self.entries = {}
+
+    def save(self):
+        """將索引原子性地寫回磁碟（先寫暫存檔再改名），沒有變更時不寫入"""
+        if not self._dirty:
+            return
+        temp_path = self.manifest_path + '.tmp'
+        try:
+            with METRICS.span('photoframe_manifest_save_seconds', '寫入縮圖索引的耗時'):
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(
+                        {'version': self.VERSION, 'entries': self.entries},
+                        f, ensure_ascii=False, separators=(',', ':')
+                    )
+                os.replace(temp_path, self.manifest_path)
+            self._dirty = False
+        except Exception as e:
+            logger.warning(f"保存縮圖索引失敗: {e}")
+
+    def lookup(self, key, size, mtime_ns):
+        """查詢索引，原圖大小與修改時間都吻合時返回記錄，否則返回 None"""
+        entry = self.entries.get(key)
+        if entry and entry['size'] == size and entry['mtime'] == mtime_ns:
+            return entry
+        return None
+
+    def update(self, key, size, mtime_ns, content_hash, thumbnail, grid, screen_size, metadata=None):
+        """新增或更新一筆記錄"""
+        self.entries[key] = {
+            'size': size,
+            'mtime': mtime_ns,
+            'hash': content_hash,
+            'thumbnail': thumbnail,
+            'grid': grid,
+            'screen_size': list(screen_size),
+            'meta': metadata,
+        }
+        self._dirty = True
+
+    def remove(self, key):
+        """移除一筆記錄"""
+        if self.entries.pop(key, None) is not None:
+            self._dirty = True
+
+    def prune(self, keep_keys):
+        """移除不在 keep_keys 中的記錄（原圖已被刪除）"""
+        stale = [key for key in self.entries if key not in keep_keys]
+        for key in stale:
+            del self.entries[key]
+        if stale:
+            self._dirty = True
@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AutoPlayScheduler:
+    """固定間隔觸發回調的排程器
+
+    以 time.monotonic() 計算每次觸發的截止時間，工作線程在條件變數上等待到截止時間，
+    啟動、停止、暫停與修改間隔只需更新狀態並喚醒線程，不需要 join。
+    下一次截止時間由上一次的截止時間加上間隔得出（而不是回調結束後再等待一個間隔），
+    長時間播放不會累積誤差；落後超過一個間隔時跳過錯過的觸發，不會連續補播。
+
+    設定 prepare_callback 時，每次觸發前 lead_time 秒先調用它（例如開始解碼下一張圖片），
+    讓觸發時需要的資源已經準備好。
+    """
+
+    def __init__(self, callback, interval, prepare_callback=None, lead_time=0.0):
+        self.callback = callback
+        self.interval = interval
+        self.prepare_callback = prepare_callback
+        self.lead_time = lead_time
+        # 正在觸發的截止時間（在回調中讀取，用於計算延遲）
+        self.current_deadline = None
+        self._condition = threading.Condition()
+        self._deadline = None
+        # 已調用過 prepare_callback 的截止時間
+        self._prepared_deadline = None
+        # 暫停時剩餘的等待時間，恢復時沿用
+        self._remaining = None
+        self._thread = None
+
+    def is_running(self):
+        """是否已排程下一次觸發（暫停中不算）"""
+        return self._deadline is not None
+
+    def start(self, delay=None):
+        """開始排程，delay 秒後第一次觸發（預設為一個間隔）"""
+        with self._condition:
+            self._remaining = None
+            self._arm(self.interval if delay is None else delay)
+
+    def stop(self):
+        """取消排程，立即返回"""
+        with self._condition:
+            self._remaining = None
+            self._disarm()
+
+    def pause(self):
+        """暫停排程並記住距離下一次觸發的剩餘時間"""
+        with self._condition:
+            if self._deadline is None:
+                return
+            self._remaining = max(0.0, self._deadline - time.monotonic())
+            self._disarm()
+
+    def resume(self):
+        """從暫停處恢復，沿用暫停時的剩餘時間"""
+        with self._condition:
+            if self._remaining is None:
+                return
+            remaining, self._remaining = self._remaining, None
+            self._arm(remaining)
+
+    def set_interval(self, interval):
+        """修改間隔並立即重新排程，保持相位：下一次觸發為上一次觸發加上新的間隔"""
+        with self._condition:
+            previous = self.interval
+            self.interval = interval
+            if self._deadline is not None:
+                last_tick = self._deadline - previous
+                self._arm(max(0.0, last_tick + interval - time.monotonic()))
+            elif self._remaining is not None:
+                self._remaining = max(0.0, self._remaining + interval - previous)
+
+    def _arm(self, delay):
+        self._deadline = time.monotonic() + delay
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='auto-play', daemon=True)
+            self._thread.start()
+        self._condition.notify()
+
+    def _disarm(self):
+        self._deadline = None
+        self._condition.notify()
+
+    def _prepare_time(self):
+        """當前截止時間的準備時間點（提前量不超過間隔的九成）"""
+        return self._deadline - min(self.lead_time, self.interval * 0.9)
+
+    def _run(self):
+        while True:
+            prepare = False
+            with self._condition:
+                while True:
+                    if self._deadline is None:
+                        self._condition.wait()
+                        continue
+                    now = time.monotonic()
+                    if (self.prepare_callback and self._prepared_deadline != self._deadline
+                            and now >= self._prepare_time()):
+                        self._prepared_deadline = self._deadline
+                        prepare = True
+                        break
+                    timeout = self._deadline - now
+                    if timeout <= 0:
+                        break
+                    if self.prepare_callback and self._prepared_deadline != self._deadline:
+                        timeout = min(timeout, self._prepare_time() - now)
+                    self._condition.wait(timeout)
+
+                if not prepare:
+                    deadline = self._deadline
+                    # 以截止時間累加，避免回調執行時間造成漂移
+                    now = time.monotonic()
+                    self._deadline += self.interval
+                    if self._deadline <= now:
+                        # 落後超過一個間隔（例如系統休眠），從現在重新對齊
+                        self._deadline = now + self.interval
+
+            if prepare:
+                try:
+                    self.prepare_callback()
+                except Exception as e:
+                    logger.exception(f"自動播放準備回調執行失敗: {e}")
+                continue
+
+            self.current_deadline = deadline
+            try:
+                self.callback()
+            except Exception as e:
+                logger.exception(f"自動播放回調執行失敗: {e}")
+            finally:
+                self.current_deadline = None
@@ -0,0 +1,254 @@
+import logging
+import os
+import stat
+import threading
+import time
+
+from services.instrumentation import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Raspberry Pi 觸控螢幕的背光控制檔
+BACKLIGHT_PATH = '/sys/class/backlight/11-0045/brightness'
+
+
+class NightSchedule:
+    """夜間調暗排程：每天 start 到 end（跨午夜）之間把亮度淡化到 brightness
+
+    Args:
+        start: 開始時間 (時, 分)
+        end: 結束時間 (時, 分)
+        brightness: 夜間亮度（0-100）
+        fade_duration: 進入與離開夜間模式的淡化秒數
+    """
+
+    def __init__(self, start, end, brightness, fade_duration=60.0):
+        self.start = tuple(start)
+        self.end = tuple(end)
+        self.brightness = brightness
+        self.fade_duration = fade_duration
+
+    def is_night(self, local_time):
+        minutes = local_time.tm_hour * 60 + local_time.tm_min
+        start = self.start[0] * 60 + self.start[1]
+        end = self.end[0] * 60 + self.end[1]
+        if start <= end:
+            return start <= minutes < end
+        return minutes >= start or minutes < end
+
+
+class BrightnessController:
+    """背光亮度控制
+
+    亮度以 0-100 的百分比表示，線性映射到 min_value-max_value 的背光值（避免螢幕全黑）。
+    set_brightness 與 fade_to 只更新目標並喚醒寫入線程，不在調用者的線程中寫檔：
+    拖動滑桿時的大量變更會合併為最新的值，每秒最多寫入 max_writes_per_second 次，
+    背光值沒有改變時不寫入。控制檔只打開一次並保持打開。
+    path 可以指向一般檔案代替 sysfs 節點（例如測試時的暫存檔）。
+    """
+
+    def __init__(self, path=BACKLIGHT_PATH, min_value=8, max_value=31,
+                 max_writes_per_second=20, localtime=time.localtime):
+        self.path = path
+        self.min_value = min_value
+        self.max_value = max_value
+        self.min_write_interval = 1.0 / max_writes_per_second
+        self.localtime = localtime
+        self.night_schedule = None
+        # 使用者設定的（白天）亮度；None 表示尚未設定
+        self.brightness = None
+        # 淡化：(起始百分比, 目標百分比, 開始時間, 秒數)；沒有淡化時起始與目標相同
+        self._fade = None
+        self._is_night = None
+        self._fd = None
+        self._is_regular_file = False
+        self._open_failed = False
+        self._last_written = None
+        self._last_write_time = 0.0
+        self._changed = False
+        self._running = False
+        self._thread = None
+        self._condition = threading.Condition()
+
+    def percent_to_value(self, percent):
+        """0-100 的百分比 -> 背光值"""
+        percent = max(0.0, min(100.0, percent))
+        return int(self.min_value + (percent / 100.0) * (self.max_value - self.min_value))
+
+    def value_to_percent(self, value):
+        """背光值 -> 0-100 的百分比"""
+        if value <= self.min_value:
+            return 0
+        if value >= self.max_value:
+            return 100
+        return int(((value - self.min_value) / (self.max_value - self.min_value)) * 100)
+
+    def read_percent(self):
+        """讀取目前的背光亮度百分比，控制檔不存在或無法讀取時返回 None"""
+        try:
+            with open(self.path, 'r') as f:
+                return self.value_to_percent(int(f.read().strip()))
+        except FileNotFoundError:
+            logger.warning(f"亮度控制文件不存在: {self.path}")
+        except Exception as e:
+            logger.warning(f"讀取系統亮度時發生錯誤: {e}")
+        return None
+
+    def set_brightness(self, percent):
+        """立即（在寫入頻率限制內）套用亮度；夜間排程生效時只記錄為白天亮度"""
+        with self._condition:
+            self.brightness = percent
+            if not self._is_night:
+                self._fade = (percent, percent, time.monotonic(), 0.0)
+            self._wake()
+
+    def fade_to(self, percent, duration):
+        """在 duration 秒內由目前亮度平滑變化到 percent"""
+        with self._condition:
+            now = time.monotonic()
+            current = self._current_percent(now)
+            self._fade = (current if current is not None else percent, percent, now, duration)
+            self._wake()
+
+    def set_night_schedule(self, schedule):
+        """設定或取消（None）夜間調暗排程"""
+        with self._condition:
+            self.night_schedule = schedule
+            if schedule is not None:
+                # 重新判斷時段並直接套用；取消排程時保留狀態，由寫入線程恢復白天亮度
+                self._is_night = None
+            self._wake()
+
+    def flush(self, timeout=1.0):
+        """等待目前的目標亮度寫入（例如測試或程式結束前）"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._changed or self._fade_active(time.monotonic()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def stop(self):
+        """停止寫入線程並關閉控制檔"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _wake(self):
+        """在持有 _condition 時調用：標記有變更並確保寫入線程在執行"""
+        self._changed = True
+        if not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name='brightness-writer', daemon=True)
+            self._thread.start()
+        self._condition.notify_all()
+
+    def _current_percent(self, now):
+        """目前應顯示的亮度百分比；還沒有設定過亮度時返回 None（保持螢幕原本的亮度）"""
+        if self._fade is None:
+            return self.brightness
+        start, end, started, duration = self._fade
+        if duration <= 0 or now >= started + duration:
+            return end
+        return start + (end - start) * (now - started) / duration
+
+    def _fade_active(self, now):
+        return self._fade is not None and now < self._fade[2] + self._fade[3]
+
+    def _check_schedule(self, now):
+        """在持有 _condition 時調用：進入或離開夜間時段時開始淡化"""
+        schedule = self.night_schedule
+        if schedule is None:
+            if self._is_night:
+                self._is_night = False
+                if self.brightness is not None:
+                    self._fade = (self.brightness, self.brightness, now, 0.0)
+            return
+        is_night = schedule.is_night(self.localtime())
+        if is_night == self._is_night:
+            return
+        # 啟動時已在夜間直接套用，之後的切換才淡化
+        duration = schedule.fade_duration if self._is_night is not None else 0.0
+        self._is_night = is_night
+        if is_night:
+            target = schedule.brightness
+        elif self.brightness is not None:
+            target = self.brightness
+        else:
+            return
+        current = self._current_percent(now)
+        self._fade = (current if current is not None else target, target, now, duration)
+        self._changed = True
+
+    def _run(self):
+        with self._condition:
+            while self._running:
+                now = time.monotonic()
+                self._check_schedule(now)
+                if not self._changed and not self._fade_active(now):
+                    # 有排程時每 30 秒檢查一次時段
+                    self._condition.wait(30.0 if self.night_schedule else None)
+                    continue
+                # 頻率限制：距上次寫入不足 min_write_interval 時等待（期間的變更會合併）
+                wait = self._last_write_time + self.min_write_interval - now
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                percent = self._current_percent(now)
+                # 淡化進行中時保持標記，淡化結束後還會寫入一次最終值
+                self._changed = self._fade_active(now)
+                if percent is None:
+                    self._condition.notify_all()
+                    continue
+                value = self.percent_to_value(percent)
+                self._condition.release()
+                try:
+                    self._write(value)
+                finally:
+                    self._condition.acquire()
+                self._last_write_time = time.monotonic()
+                self._condition.notify_all()
+
+    def _write(self, value):
+        """把背光值寫入控制檔（在寫入線程中執行，不持有鎖）"""
+        if value == self._last_written:
+            return
+        if self._fd is None and not self._open():
+            return
+        data = f'{value}\n'.encode()
+        try:
+            os.pwrite(self._fd, data, 0)
+            if self._is_regular_file:
+                os.ftruncate(self._fd, len(data))
+            self._last_written = value
+            METRICS.counter('photoframe_brightness_writes_total', '寫入背光控制檔的次數').inc()
+            logger.debug(f"已設置亮度: {value}/{self.max_value} (映射範圍: {self.min_value}-{self.max_value})")
+        except OSError as e:
+            logger.warning(f"設置系統亮度時發生錯誤: {e}")
+            os.close(self._fd)
+            self._fd = None
+
+    def _open(self):
+        try:
+            self._fd = os.open(self.path, os.O_WRONLY)
+            self._is_regular_file = stat.S_ISREG(os.fstat(self._fd).st_mode)
+            self._open_failed = False
+            return True
+        except PermissionError:
+            if not self._open_failed:
+                logger.error("權限不足，無法寫入亮度控制文件，請嘗試使用 sudo 運行程序或將用戶加入 video 組")
+        except OSError as e:
+            if not self._open_failed:
+                logger.warning(f"無法打開亮度控制文件 {self.path}: {e}，"
+                               "請確認 Raspberry Pi 硬體配置或使用其他亮度控制方法")
+        # 只警告一次，之後的變更仍會重試
+        self._open_failed = True
+        return False
@@ -0,0 +1,335 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+from repositories.image_discovery import scan_images
+
+logger = logging.getLogger(__name__)
+
+# inotify 事件常數（見 <sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_UNMOUNT = 0x00002000
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_UNMOUNT)
+EVENT_HEADER = struct.Struct('iIII')
+
+# 這些檔案系統（FAT 格式的隨身碟等）改用輪詢
+POLLING_FILESYSTEMS = ('vfat', 'msdos', 'exfat', 'fuseblk')
+
+
+def _get_filesystem_type(path):
+    """從 /proc/mounts 查詢路徑所在的檔案系統類型，查詢失敗時返回 None"""
+    try:
+        path = os.path.realpath(path)
+        best_mount, best_type = '', None
+        with open('/proc/mounts', 'r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1].replace('\\040', ' ')
+                if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) \
+                        and len(mount_point) > len(best_mount):
+                    best_mount, best_type = mount_point, fields[2]
+        return best_type
+    except OSError:
+        return None
+
+
+class DirectoryWatcher:
+    """監視圖片目錄（包括所有子目錄）的變更
+
+    優先使用 inotify（每個子目錄一個監視，新建立的子目錄會自動加入）；系統不支援 inotify，或目錄位於 FAT 格式的隨身碟上時改用輪詢。
+    變更經過短暫合併後，以 on_changes(added, removed, modified) 回調原檔案路徑的集合，
+    回調在監視線程中執行。
+    目錄本身不存在（隨身碟被拔出）時不視為所有圖片已刪除：保留快照並以 on_availability(False) 通知，
+    目錄重新出現後以 on_availability(True) 通知，並只報告與拔出前相比真正改變的檔案。
+    start() 可以傳入開始監視前已知的檔案狀態（例如啟動時完整掃描的結果），
+    第一次掃描與它不同的檔案會先回調一次，掃描期間發生的變更不會遺漏。
+    """
+
+    def __init__(self, directory, on_changes, extensions, poll_interval=5.0, debounce=1.0,
+                 on_availability=None):
+        self.directory = directory
+        self.on_changes = on_changes
+        self.on_availability = on_availability
+        self.available = True
+        self.extensions = tuple(extensions)
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.mode = None
+        self._snapshot = {}
+        # start() 傳入的已知檔案狀態，第一次掃描後與它比較
+        self._baseline = None
+        # inotify 監視描述符 -> 目錄路徑
+        self._watches = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self, baseline=None):
+        """開始監視（在背景線程中執行）
+
+        Args:
+            baseline: 可選的 {路徑: (大小, 修改時間)}，開始監視前已處理的檔案；
+                第一次掃描時與它不同的檔案（新增、刪除或修改）會以一次回調報告
+        """
+        if self._thread is not None:
+            return
+        self._baseline = baseline
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='directory-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止監視"""
+        self._stop_event.set()
+        self._thread = None
+
+    def _is_image(self, name):
+        return name.lower().endswith(self.extensions)
+
+    def _stat(self, path):
+        """返回 (大小, 修改時間)，檔案不存在時返回 None"""
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            return None
+        return stat_result.st_size, stat_result.st_mtime_ns
+
+    def _take_snapshot(self, directory=None, on_directory=None, on_error=None):
+        """遞迴掃描目錄，返回 {路徑: (大小, 修改時間)}"""
+        return {
+            path: (stat_result.st_size, stat_result.st_mtime_ns)
+            for path, stat_result in scan_images(
+                directory or self.directory, self.extensions, on_directory=on_directory, on_error=on_error
+            )
+        }
+
+    def _set_available(self, available):
+        """記錄圖片目錄是否存在，改變時通知 on_availability"""
+        if available == self.available:
+            return
+        self.available = available
+        if available:
+            logger.info(f"圖片目錄已重新出現: {self.directory}")
+        else:
+            logger.warning(f"圖片目錄不存在（隨身碟被拔出？），保留圖片等待重新出現: {self.directory}")
+        if self.on_availability:
+            try:
+                self.on_availability(available)
+            except Exception as e:
+                logger.exception(f"處理圖片目錄狀態變更失敗: {e}")
+
+    def _diff_snapshot(self):
+        """重新掃描目錄並與上次的快照比較，返回 (新增, 刪除, 修改)
+
+        目錄不存在時不比較並保留上次的快照；走訪不完整（有目錄或檔案無法讀取，例如正在拔出隨身碟）時
+        不報告刪除，未讀到的檔案保留在快照中。
+        """
+        if not os.path.isdir(self.directory):
+            self._set_available(False)
+            return set(), set(), set()
+        errors = []
+        snapshot = self._take_snapshot(on_error=lambda path, error: errors.append(path))
+        old = self._snapshot
+        if errors:
+            snapshot.update((path, stat) for path, stat in old.items() if path not in snapshot)
+        else:
+            self._set_available(True)
+        added = {path for path in snapshot if path not in old}
+        removed = {path for path in old if path not in snapshot}
+        modified = {path for path in snapshot if path in old and snapshot[path] != old[path]}
+        self._snapshot = snapshot
+        return added, removed, modified
+
+    def _take_initial_snapshot(self, on_directory=None):
+        """第一次掃描目錄作為之後比較的快照，並回調與已知檔案狀態的差異"""
+        baseline, self._baseline = self._baseline, None
+        if not os.path.isdir(self.directory):
+            # 目錄已不存在：以已知狀態作為快照，目錄重新出現後再比較
+            self._snapshot = dict(baseline or {})
+            self._set_available(False)
+            return
+        errors = []
+        snapshot = self._take_snapshot(
+            on_directory=on_directory, on_error=lambda path, error: errors.append(path)
+        )
+        if baseline is not None and errors:
+            # 未讀到的檔案不當作已刪除
+            snapshot.update((path, stat) for path, stat in baseline.items() if path not in snapshot)
+        self._snapshot = snapshot
+        if baseline is not None:
+            self._emit(
+                {path for path in snapshot if path not in baseline},
+                {path for path in baseline if path not in snapshot},
+                {path for path in snapshot if path in baseline and snapshot[path] != baseline[path]},
+            )
+
+    def _emit(self, added, removed, modified):
+        if not (added or removed or modified):
+            return
+        try:
+            self.on_changes(added, removed, modified)
+        except Exception as e:
+            logger.exception(f"處理目錄變更失敗: {e}")
+
+    def _run(self):
+        fs_type = _get_filesystem_type(self.directory)
+        if fs_type not in POLLING_FILESYSTEMS and self._run_inotify():
+            return
+        if self.mode is None:
+            # inotify 沒有啟動（已啟動時快照由 inotify 維護）
+            self._take_initial_snapshot()
+        self._run_polling()
+
+    def _run_polling(self):
+        """輪詢模式：定期重新掃描目錄"""
+        self.mode = 'polling'
+        logger.info(f"使用輪詢監視圖片目錄（每 {self.poll_interval} 秒）: {self.directory}")
+        while not self._stop_event.wait(self.poll_interval):
+            self._emit(*self._diff_snapshot())
+
+    def _run_inotify(self):
+        """inotify 模式，無法使用 inotify 時返回 False 以改用輪詢"""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return False
+        if fd < 0:
+            return False
+
+        def add_watch(directory):
+            wd = libc.inotify_add_watch(fd, os.fsencode(directory), WATCH_MASK)
+            if wd >= 0:
+                self._watches[wd] = directory
+            return wd
+
+        def remove_watches(directory):
+            prefix = directory + os.sep
+            for wd, path in list(self._watches.items()):
+                if path == directory or path.startswith(prefix):
+                    libc.inotify_rm_watch(fd, wd)
+                    del self._watches[wd]
+
+        self._watches = {}
+        try:
+            root_wd = add_watch(self.directory)
+            if root_wd < 0:
+                return False
+            # 掃描並監視所有子目錄；監視建立前的變更由這次掃描與 start() 傳入的已知狀態比較後補上
+            self._take_initial_snapshot(
+                on_directory=lambda path: path == self.directory or add_watch(path)
+            )
+
+            self.mode = 'inotify'
+            logger.info(f"使用 inotify 監視圖片目錄（{len(self._watches)} 個目錄）: {self.directory}")
+            added, removed, modified = set(), set(), set()
+            while not self._stop_event.is_set():
+                # 有待處理的變更時，等待 debounce 秒沒有新事件後再一次回調
+                timeout = self.debounce if (added or removed or modified) else 1.0
+                readable, _, _ = select.select([fd], [], [], timeout)
+                if not readable:
+                    self._emit(added, removed, modified)
+                    added, removed, modified = set(), set(), set()
+                    continue
+
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+
+                offset = 0
+                while offset < len(data):
+                    wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+                    offset += EVENT_HEADER.size
+                    name = data[offset:offset + name_len].rstrip(b'\0')
+                    offset += name_len
+
+                    if mask & IN_Q_OVERFLOW:
+                        # 事件隊列溢出，改為重新掃描比對
+                        logger.warning("inotify 事件隊列溢出，重新掃描圖片目錄")
+                        diff = self._diff_snapshot()
+                        added |= diff[0]
+                        removed |= diff[1]
+                        modified |= diff[2]
+                        continue
+
+                    if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_UNMOUNT | IN_IGNORED):
+                        if wd == root_wd:
+                            # 目錄被刪除或隨身碟被拔出，改用輪詢等待目錄重新出現（快照保留，不報告刪除）
+                            self._emit(added, removed, modified)
+                            if not os.path.isdir(self.directory):
+                                self._set_available(False)
+                            return False
+                        # 子目錄的刪除由父目錄的事件處理
+                        if mask & IN_IGNORED:
+                            self._watches.pop(wd, None)
+                        continue
+
+                    directory = self._watches.get(wd)
+                    name = os.fsdecode(name)
+                    if directory is None or not name or name.startswith('.'):
+                        continue
+                    path = os.path.join(directory, name)
+
+                    if mask & IN_ISDIR:
+                        if mask & (IN_CREATE | IN_MOVED_TO):
+                            # 新的子目錄：加入監視並掃描其中已有的圖片
+                            for image_path, stat_result in self._take_snapshot(path, add_watch).items():
+                                if image_path not in self._snapshot:
+                                    added.add(image_path)
+                                    removed.discard(image_path)
+                                self._snapshot[image_path] = stat_result
+                        elif mask & (IN_DELETE | IN_MOVED_FROM):
+                            remove_watches(path)
+                            prefix = path + os.sep
+                            for image_path in [p for p in self._snapshot if p.startswith(prefix)]:
+                                if image_path in added:
+                                    added.discard(image_path)
+                                else:
+                                    removed.add(image_path)
+                                modified.discard(image_path)
+                                del self._snapshot[image_path]
+                        continue
+
+                    if not self._is_image(name):
+                        continue
+
+                    if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                        stat_result = self._stat(path)
+                        if stat_result is None:
+                            continue
+                        if path in self._snapshot and path not in added:
+                            if self._snapshot[path] != stat_result:
+                                modified.add(path)
+                        else:
+                            added.add(path)
+                        removed.discard(path)
+                        self._snapshot[path] = stat_result
+                    elif mask & (IN_DELETE | IN_MOVED_FROM):
+                        if path in added:
+                            added.discard(path)
+                        elif path in self._snapshot:
+                            removed.add(path)
+                        modified.discard(path)
+                        self._snapshot.pop(path, None)
+            return True
+        finally:
+            self._watches = {}
+            os.close(fd)
@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from services.instrumentation import METRICS
+
+logger = logging.getLogger(__name__)
+
+# 已解碼的圖片：尺寸、RGB 像素資料（已上下翻轉為 Kivy 紋理的座標方向）
+DecodedImage = namedtuple('DecodedImage', ['size', 'pixels', 'colorfmt'])
+
+
+def decode_image(image_path, max_size=None):
+    """解碼圖片為 RGB 像素資料（可在任意線程中執行）"""
+    # 第一次解碼時才導入 PIL（在解碼線程中），不佔用啟動時間
+    from PIL import Image as PILImage
+
+    with PILImage.open(image_path) as img:
+        if max_size:
+            img.draft('RGB', max_size)
+        img = img.convert('RGB')
+        if max_size and (img.width > max_size[0] or img.height > max_size[1]):
+            img.thumbnail(max_size, PILImage.Resampling.BILINEAR)
+        # Kivy 紋理的原點在左下角，預先翻轉避免在主線程中處理
+        img = img.transpose(PILImage.Transpose.FLIP_TOP_BOTTOM)
+        return DecodedImage(img.size, img.tobytes(), 'rgb')
+
+
+class ImagePrefetcher:
+    """圖片預解碼快取
+
+    在工作線程中預先解碼即將顯示的圖片，主線程只需把像素資料上傳為紋理。
+    快取以位元組數為上限，超出時按最近最少使用（LRU）順序淘汰。
+    """
+
+    def __init__(self, memory_budget=48 * 1024 * 1024, max_size=None):
+        self.memory_budget = memory_budget
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._queue = []
+        self._condition = threading.Condition()
+        self._thread = None
+        # 解碼時間的指數移動平均（秒），用於估計需要提前多久開始解碼
+        self.average_decode_time = 0.0
+
+    def prefetch(self, image_paths):
+        """要求預先解碼這些圖片（按優先順序），取代之前尚未處理的請求"""
+        with self._condition:
+            self._queue = [path for path in image_paths if path and path not in self._cache]
+            if self._queue:
+                self._ensure_worker()
+                self._condition.notify()
+
+    def get(self, image_path):
+        """取得已解碼的圖片，尚未解碼時返回 None"""
+        with self._condition:
+            decoded = self._cache.get(image_path)
+            if decoded is not None:
+                self._cache.move_to_end(image_path)
+                METRICS.counter('photoframe_prefetch_hits_total', '顯示時已預解碼的圖片數').inc()
+            else:
+                METRICS.counter('photoframe_prefetch_misses_total', '顯示時尚未預解碼的圖片數').inc()
+            return decoded
+
+    def is_ready(self, image_path):
+        """圖片是否已解碼完成（不影響 LRU 順序）"""
+        with self._condition:
+            return image_path in self._cache
+
+    def discard(self, image_path):
+        """移除某張圖片的快取（例如圖片內容已更新）"""
+        with self._condition:
+            decoded = self._cache.pop(image_path, None)
+            if decoded is not None:
+                self._cache_bytes -= len(decoded.pixels)
+
+    def clear(self):
+        """清除所有快取與待處理的請求"""
+        with self._condition:
+            self._cache.clear()
+            self._cache_bytes = 0
+            self._queue = []
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._worker, name='image-prefetcher', daemon=True)
+            self._thread.start()
+
+    def _store(self, image_path, decoded):
+        """加入快取並按 LRU 淘汰超出預算的圖片"""
+        size = len(decoded.pixels)
+        if size > self.memory_budget:
+            return
+        self._cache[image_path] = decoded
+        self._cache_bytes += size
+        while self._cache_bytes > self.memory_budget:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted.pixels)
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                image_path = self._queue.pop(0)
+                if image_path in self._cache:
+                    continue
+
+            started = time.monotonic()
+            try:
+                decoded = decode_image(image_path, self.max_size)
+            except Exception as e:
+                logger.warning(f"預解碼圖片失敗 {image_path}: {e}")
+                METRICS.counter('photoframe_image_decode_failures_total', '預解碼失敗的圖片數').inc()
+                continue
+            elapsed = time.monotonic() - started
+            METRICS.histogram('photoframe_image_decode_seconds', '預解碼一張圖片的耗時').observe(elapsed)
+
+            with self._condition:
+                self._store(image_path, decoded)
+                if self.average_decode_time:
+                    self.average_decode_time += (elapsed - self.average_decode_time) * 0.2
+                else:
+                    self.average_decode_time = elapsed
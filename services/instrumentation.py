@@ -0,0 +1,276 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# 程式的頂層套件，日誌等級統一設定在這些記錄器上
+LOGGER_PACKAGES = ('repositories', 'services', 'ui')
+# 耗時直方圖的預設分桶上限（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def configure_logging(level=None):
+    """設定程式記錄器的等級（預設取自環境變數 PHOTOFRAME_LOG_LEVEL，否則為 INFO）
+
+    在 Kivy 中執行時日誌由 Kivy 的處理器輸出（終端與 ~/.kivy/logs）；
+    根記錄器沒有處理器時（例如基準測試）加上一個輸出到 stderr 的處理器。
+    """
+    level = (level or os.environ.get('PHOTOFRAME_LOG_LEVEL') or 'INFO').upper()
+    for name in LOGGER_PACKAGES:
+        logging.getLogger(name).setLevel(level)
+    if not logging.getLogger().handlers:
+        logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+
+class Counter:
+    """只增不減的計數器"""
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def render(self):
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} counter',
+            f'{self.name} {self._value}',
+        ]
+
+
+class Gauge:
+    """讀取時調用回調取得當前值的量測值（例如快取大小）"""
+
+    def __init__(self, name, documentation, callback):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    @property
+    def value(self):
+        try:
+            return self.callback()
+        except Exception as e:
+            logger.warning(f"讀取指標 {self.name} 失敗: {e}")
+            return None
+
+    def render(self):
+        value = self.value
+        if value is None:
+            return []
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} gauge',
+            f'{self.name} {value}',
+        ]
+
+
+class Histogram:
+    """固定分桶的直方圖，記錄次數、總和與各分桶的次數"""
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        # 最後一個位置為 +Inf
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @contextmanager
+    def time(self):
+        """計時區段：區段結束時（包括拋出例外）記錄經過的秒數"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def render(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} histogram',
+        ]
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {count}')
+        lines.append(f'{self.name}_sum {total}')
+        lines.append(f'{self.name}_count {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """指標的註冊表，以名稱取得（不存在時創建）計數器、量測值與直方圖"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name, factory):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            return metric
+
+    def counter(self, name, documentation=''):
+        return self._get_or_create(name, lambda: Counter(name, documentation))
+
+    def histogram(self, name, documentation='', buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(name, lambda: Histogram(name, documentation, buckets))
+
+    def gauge(self, name, documentation, callback):
+        """註冊量測值；同名的量測值會被取代（例如服務重新創建時）"""
+        gauge = Gauge(name, documentation, callback)
+        with self._lock:
+            self._metrics[name] = gauge
+        return gauge
+
+    def span(self, name, documentation=''):
+        """計時區段的簡寫：with METRICS.span('..._seconds'): ..."""
+        return self.histogram(name, documentation).time()
+
+    def snapshot(self):
+        """以字典返回所有指標的當前值（直方圖為次數與總和）"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        snapshot = {}
+        for name, metric in sorted(metrics.items()):
+            if isinstance(metric, Histogram):
+                snapshot[name] = {'count': metric.count, 'sum': metric.sum}
+            else:
+                snapshot[name] = metric.value
+        return snapshot
+
+    def render(self):
+        """以 Prometheus 文字格式輸出所有指標"""
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """在背景線程中以 HTTP 提供 /metrics（Prometheus 文字格式）"""
+
+    def __init__(self, registry, port, host='127.0.0.1'):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f"指標請求 {self.address_string()}: {format % args}")
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        # 埠號為 0 時由系統分配
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True).start()
+        logger.info(f"指標端點已啟動: http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class StartupProfile:
+    """啟動耗時記錄
+
+    mark(name) 記錄一個時間點，耗時為距上一個記錄的時間；phase(name) 記錄一個區段的耗時。
+    時間從導入本模組開始計算（main.py 最先導入本模組），報告中的「累計」為記錄結束時距啟動的秒數。
+    設定環境變數 PHOTOFRAME_STARTUP_PROFILE 時，第一幀顯示後以日誌輸出報告。
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.enabled = bool(os.environ.get('PHOTOFRAME_STARTUP_PROFILE'))
+        # (名稱, 耗時, 累計)
+        self.records = []
+        self._last = self.started
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.records.append((name, now - self._last, now - self.started))
+        self._last = now
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.records.append((name, end - start, end - self.started))
+            self._last = end
+
+    def report(self):
+        lines = [f'{"階段":<36}{"耗時":>10}{"累計":>10}']
+        for name, duration, elapsed in self.records:
+            lines.append(f'{name:<36}{duration:>10.3f}{elapsed:>10.3f}')
+        return '\n'.join(lines)
+
+    def log_report(self):
+        """啟用時以日誌輸出報告"""
+        if self.enabled:
+            logger.info("啟動耗時報告（秒）:\n" + self.report())
+
+
+# 全程式共用的註冊表；縮圖工作進程中的記錄不會回到主進程，由主進程根據任務結果記錄
+METRICS = MetricsRegistry()
+# 程式啟動的耗時記錄
+STARTUP_PROFILE = StartupProfile()
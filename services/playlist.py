@@ -0,0 +1,71 @@
+from bisect import bisect_left
+
+
+class Playlist:
+    """有序且不重複的圖片列表，附帶「路徑 -> 位置」的雜湊索引
+
+    成員檢查與位置查詢為常數時間。插入與刪除只使索引失效，下一次查詢時才重建一次，
+    背景加載時連續插入大量圖片不需要每次都更新索引。
+    """
+
+    def __init__(self, images=(), name=None):
+        self.name = name
+        # dict.fromkeys 去除重複並保持原本的順序
+        self._images = list(dict.fromkeys(images))
+        self._positions = None
+
+    @classmethod
+    def sorted(cls, images, sort_key, name=None):
+        """按排序鍵建立播放列表，順序與輸入的順序無關"""
+        return cls(sorted(set(images), key=sort_key), name)
+
+    def _index(self):
+        if self._positions is None:
+            self._positions = {path: position for position, path in enumerate(self._images)}
+        return self._positions
+
+    def __len__(self):
+        return len(self._images)
+
+    def __getitem__(self, position):
+        return self._images[position]
+
+    def __iter__(self):
+        return iter(self._images)
+
+    def __contains__(self, path):
+        return path in self._index()
+
+    def position_of(self, path):
+        """圖片在列表中的位置，不在列表中時返回 None"""
+        return self._index().get(path)
+
+    def to_list(self):
+        return list(self._images)
+
+    def insert_sorted(self, path, sort_key):
+        """按排序鍵插入圖片，返回插入的位置；已存在時返回 None"""
+        if self._positions is not None and path in self._positions:
+            return None
+        position = bisect_left(self._images, sort_key(path), key=sort_key)
+        if position < len(self._images) and self._images[position] == path:
+            return None
+        self._images.insert(position, path)
+        self._positions = None
+        return position
+
+    def move_sorted(self, path, sort_key):
+        """圖片的排序鍵改變後（例如原圖改名）按新的排序鍵移動它，返回新的位置；不在列表中時返回 None"""
+        if path not in self:
+            return None
+        self._images.remove(path)
+        self._positions = None
+        return self.insert_sorted(path, sort_key)
+
+    def remove(self, paths):
+        """移除圖片（paths 應為集合），返回實際移除的數量"""
+        count = len(self._images)
+        self._images = [path for path in self._images if path not in paths]
+        if len(self._images) != count:
+            self._positions = None
+        return count - len(self._images)
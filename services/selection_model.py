@@ -0,0 +1,75 @@
+ALL_EXCEPT = 'all_except'
+NONE_EXCEPT = 'none_except'
+
+
+class SelectionModel:
+    """圖片選取模型
+
+    以「全部選中，除了 exceptions」或「全部不選，除了 exceptions」表示選取集合，
+    全選、全不選、反選與「是否全部選中」都是常數時間，不需要走訪每張圖片。
+    """
+
+    def __init__(self, images=None):
+        self.mode = ALL_EXCEPT
+        self.exceptions = set()
+        self._images = set(images or [])
+
+    def set_images(self, images):
+        """設定圖片全集，並移除已不存在的圖片的例外記錄"""
+        self._images = set(images)
+        self.exceptions &= self._images
+        self._normalize()
+
+    def _normalize(self):
+        """例外涵蓋全部圖片時轉換為另一種模式，讓 is_all_selected 保持常數時間"""
+        if self._images and len(self.exceptions) == len(self._images):
+            self.mode = ALL_EXCEPT if self.mode == NONE_EXCEPT else NONE_EXCEPT
+            self.exceptions = set()
+
+    def is_selected(self, image_path):
+        """圖片是否被選中"""
+        return (image_path in self.exceptions) != (self.mode == ALL_EXCEPT)
+
+    def set_selected(self, image_path, selected):
+        """設定單張圖片的選取狀態"""
+        if image_path not in self._images:
+            return
+        if selected == (self.mode == ALL_EXCEPT):
+            self.exceptions.discard(image_path)
+        else:
+            self.exceptions.add(image_path)
+            self._normalize()
+
+    def select_all(self):
+        """全選"""
+        self.mode = ALL_EXCEPT
+        self.exceptions = set()
+
+    def deselect_all(self):
+        """全不選"""
+        self.mode = NONE_EXCEPT
+        self.exceptions = set()
+
+    def invert(self):
+        """反選：只需切換模式，例外集合不變"""
+        self.mode = NONE_EXCEPT if self.mode == ALL_EXCEPT else ALL_EXCEPT
+
+    def is_all_selected(self):
+        """是否全部選中"""
+        return self.mode == ALL_EXCEPT and not self.exceptions
+
+    def count(self):
+        """選中的圖片數量"""
+        if self.mode == ALL_EXCEPT:
+            return len(self._images) - len(self.exceptions)
+        return len(self.exceptions)
+
+    def selected_images(self, ordered_images):
+        """按 ordered_images 的順序返回選中的圖片"""
+        return [image_path for image_path in ordered_images if self.is_selected(image_path)]
+
+    def load_state(self, mode, exceptions):
+        """從保存的狀態恢復（不在圖片全集中的例外會被忽略）"""
+        self.mode = mode if mode in (ALL_EXCEPT, NONE_EXCEPT) else ALL_EXCEPT
+        self.exceptions = set(exceptions) & self._images
+        self._normalize()
@@ -1,84 +1,250 @@
+import logging
 import os
+import threading
+from kivy.clock import Clock
 from services.slideshow_service import SlideshowService
-from repositories.image_repository import ImageRepository
+from services.directory_watcher import DirectoryWatcher
+from services.image_prefetcher import ImagePrefetcher
+from services.texture_cache import TextureCache
+from services.brightness_controller import BrightnessController, NightSchedule
+from services.instrumentation import METRICS, MetricsServer
+from repositories.image_repository import ImageRepository, IMAGE_EXTENSIONS
+from repositories.settings_store import SettingsStore
+from repositories.playlist_store import PlaylistStore
+from repositories.shuffle_store import ShuffleStateStore
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_FILE = os.path.join(os.path.dirname(__file__), '../settings.json')
+PLAYLISTS_FILE = os.path.join(os.path.dirname(__file__), '../playlists.json')
+SHUFFLE_STATE_FILE = os.path.join(os.path.dirname(__file__), '../shuffle_state.json')
+SHUFFLE_SLOTS_FILE = os.path.join(os.path.dirname(__file__), '../shuffle_slots.json')
 
 class ServiceManager:
     _instance = None
+    # 背景啟動模式：視窗立即顯示，圖片發現與縮圖創建在背景線程中進行
+    BACKGROUND_STARTUP = True
+    # 設定的預設值；brightness 為 None 表示沿用螢幕目前的亮度
+    # night_schedule 為 None（不調暗）或
+    # {"start": "22:00", "end": "07:00", "brightness": 10, "fade_duration": 60}
+    DEFAULT_SETTINGS = {
+        'slideshow_interval': 3.0,
+        'slideshow_loop': True,
+        'shuffle': False,
+        'brightness': None,
+        'night_schedule': None,
+    }
     
-    def __new__(cls):
+    def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super(ServiceManager, cls).__new__(cls)
         return cls._instance
     
-    def __init__(self):
+    def __init__(self, screen_size=None):
+        """
+        Args:
+            screen_size: 螢幕尺寸 (寬, 高)，用於生成螢幕版本縮圖，只在第一次創建時生效
+        """
         if not hasattr(self, 'initialized'):
             # 使用隨身碟路徑（無空格）
             IMAGES_DIR = '/media/jh-pi/ESD-USB/images'
             # 如果隨身碟不存在，則使用本地路徑作為備用
             if not os.path.exists(IMAGES_DIR):
                 IMAGES_DIR = os.path.join(os.path.dirname(__file__), '../images')
-                print(f"隨身碟路徑不存在，使用本地路徑: {IMAGES_DIR}")
+                logger.info(f"隨身碟路徑不存在，使用本地路徑: {IMAGES_DIR}")
             else:
-                print(f"使用隨身碟路徑: {IMAGES_DIR}")
+                logger.info(f"使用隨身碟路徑: {IMAGES_DIR}")
             
-            self.repository = ImageRepository(IMAGES_DIR)
+            self.repository = ImageRepository(IMAGES_DIR, screen_size=screen_size)
+            # 目錄監視器：圖片加載完成後開始，只把變更的檔案交給圖片倉庫處理；
+            # 隨身碟被拔出時只標記為不可用，不刪除圖片與縮圖
+            self.directory_watcher = DirectoryWatcher(
+                IMAGES_DIR, self.repository.apply_changes, IMAGE_EXTENSIONS,
+                on_availability=self.repository.set_available
+            )
             
-            # 在初始化時就完成圖片處理，避免後續重複處理
-            print("正在初始化圖片服務...")
-            self.repository.get_image_files()  # 這會觸發縮圖創建
-            print("圖片服務初始化完成！")
+            if self.BACKGROUND_STARTUP:
+                # 在背景加載圖片，準備好的圖片會陸續加入幻燈片服務
+                logger.info("正在背景初始化圖片服務...")
+                self.repository.load_images_async(on_complete=self._on_images_loaded)
+            else:
+                # 在初始化時就完成圖片處理，避免後續重複處理
+                logger.info("正在初始化圖片服務...")
+                self._on_images_loaded(self.repository.get_image_files())  # 這會觸發縮圖創建
             
-            self.slideshow_service = SlideshowService(self.repository)
-            self.slideshow_interval = 3.0  # 默认间隔时间
-            self.slideshow_loop = True     # 默认开启循环
-            self.brightness = 50           # 默认亮度
+            self.slideshow_service = SlideshowService(
+                self.repository, playlist_store=PlaylistStore(PLAYLISTS_FILE),
+                shuffle_store=ShuffleStateStore(
+                    SHUFFLE_STATE_FILE, SHUFFLE_SLOTS_FILE,
+                    to_id=self.repository.get_image_id, from_id=self.repository.resolve_image_id
+                )
+            )
+            # 幻燈片預解碼快取，圖片內容變更或刪除時丟棄對應的快取
+            self.image_prefetcher = ImagePrefetcher(max_size=self.repository.max_thumbnail_size)
+            # 幻燈片與播放列表網格共用的紋理快取
+            self.texture_cache = TextureCache()
+            self.repository.add_listener(self._on_library_changed)
+            # 背光控制：合併頻繁的亮度變更，在寫入線程中按頻率限制寫入
+            self.brightness_controller = BrightnessController()
+            # 設定在背景線程中加載、在主線程中套用，不阻塞第一幀；在此之前讀取設定會直接加載
+            self.settings_store = SettingsStore(SETTINGS_FILE, self.DEFAULT_SETTINGS)
+            # 使用者已修改過的設定項目，加載完成後不以保存的值覆蓋
+            self._touched_settings = set()
+            threading.Thread(target=self._load_settings, name='settings-loader', daemon=True).start()
+            self._register_metrics()
+            self.metrics_server = None
+            self._start_metrics_server()
             self.initialized = True
+
+    def _register_metrics(self):
+        """註冊讀取服務狀態的量測值"""
+        METRICS.gauge('photoframe_images', '圖片庫中的圖片數',
+                      lambda: len(self.repository.get_image_files()))
+        METRICS.gauge('photoframe_texture_cache_resident_bytes', '紋理快取佔用的位元組數',
+                      lambda: self.texture_cache.stats()['resident_bytes'])
+        METRICS.gauge('photoframe_texture_cache_hit_rate', '紋理快取命中率',
+                      lambda: self.texture_cache.stats()['hit_rate'])
+        METRICS.gauge('photoframe_texture_cache_evictions', '紋理快取淘汰次數',
+                      lambda: self.texture_cache.stats()['evictions'])
+
+    def _start_metrics_server(self):
+        """設定環境變數 PHOTOFRAME_METRICS_PORT 時啟動 /metrics 端點
+
+        預設只監聽本機；需要從其他機器抓取時以 PHOTOFRAME_METRICS_HOST（例如 0.0.0.0）指定。
+        """
+        port = os.environ.get('PHOTOFRAME_METRICS_PORT')
+        if not port:
+            return
+        host = os.environ.get('PHOTOFRAME_METRICS_HOST', '127.0.0.1')
+        try:
+            self.metrics_server = MetricsServer(METRICS, int(port), host)
+            self.metrics_server.start()
+        except (OSError, ValueError) as e:
+            logger.warning(f"無法啟動指標端點 {host}:{port}: {e}")
+            self.metrics_server = None
     
+    def _on_images_loaded(self, images):
+        """圖片加載完成後開始監視圖片目錄
+
+        加載可能需要數分鐘，期間的變更由監視器第一次掃描時與加載的掃描結果比較後補上。
+        """
+        logger.info(f"圖片服務初始化完成！共 {len(images)} 張圖片")
+        self.directory_watcher.start(baseline=self.repository.take_scan_snapshot())
+
+    def _on_library_changed(self, added, removed, modified, moved=()):
+        """圖片庫變更時丟棄過期的預解碼快取與紋理
+
+        網格縮圖以內容雜湊命名，內容變更後路徑也不同，舊的紋理會按 LRU 自然淘汰；
+        移動的圖片內容不變，快取仍然有效。
+        """
+        for image_path in list(removed) + list(modified):
+            self.image_prefetcher.discard(image_path)
+            self.texture_cache.discard(image_path)
+
+    def _load_settings(self):
+        """在背景線程中加載保存的設定，再交給主線程套用"""
+        settings = self.settings_store.load()
+        Clock.schedule_once(lambda dt: self._apply_loaded_settings(settings), 0)
+
+    def _apply_loaded_settings(self, settings):
+        """在主線程中套用加載的設定；加載完成前使用者已修改的項目保留使用者的值"""
+        self._apply_settings({
+            key: value for key, value in settings.items() if key not in self._touched_settings
+        })
+
+    def _apply_settings(self, settings):
+        """把設定套用到幻燈片服務與背光控制（只處理 settings 中有的項目）"""
+        if 'slideshow_interval' in settings:
+            self.slideshow_service.set_auto_play_interval(settings['slideshow_interval'])
+        if 'slideshow_loop' in settings:
+            self.slideshow_service.set_slideshow_loop(settings['slideshow_loop'])
+        if 'shuffle' in settings:
+            # 開啟時恢復上次的隨機播放順序
+            self.slideshow_service.set_shuffle(settings['shuffle'])
+        if settings.get('brightness') is not None:
+            # 重新開機後恢復保存的亮度
+            self.brightness_controller.set_brightness(settings['brightness'])
+        if 'night_schedule' in settings:
+            self._apply_night_schedule(settings['night_schedule'])
+
+    def _apply_night_schedule(self, config):
+        """把 night_schedule 設定轉換為背光控制的夜間排程"""
+        if not config:
+            self.brightness_controller.set_night_schedule(None)
+            return
+        try:
+            start = tuple(int(part) for part in config['start'].split(':'))
+            end = tuple(int(part) for part in config['end'].split(':'))
+            schedule = NightSchedule(start, end, config['brightness'], config.get('fade_duration', 60.0))
+        except (KeyError, ValueError, AttributeError) as e:
+            logger.warning(f"夜間調暗設定無效: {config}: {e}")
+            return
+        self.brightness_controller.set_night_schedule(schedule)
+
+    def get_image_prefetcher(self):
+        """获取图片预解码缓存实例"""
+        return self.image_prefetcher
+
+    def get_texture_cache(self):
+        """获取共用纹理缓存实例"""
+        return self.texture_cache
+
+    def get_brightness_controller(self):
+        """获取背光亮度控制实例"""
+        return self.brightness_controller
+
     def get_slideshow_service(self):
         """获取幻灯片服务实例"""
         return self.slideshow_service
     
     def set_slideshow_interval(self, interval: float):
         """设置幻灯片间隔时间"""
-        self.slideshow_interval = interval
-        # 更新幻灯片服务的间隔时间
-        self.slideshow_service.set_auto_play_interval(interval)
+        self.set_all_settings({'slideshow_interval': interval})
     
     def get_slideshow_interval(self) -> float:
         """获取幻灯片间隔时间"""
-        return self.slideshow_interval
+        return self.settings_store.get('slideshow_interval')
     
     def set_slideshow_loop(self, loop: bool):
         """设置幻灯片循环播放"""
-        self.slideshow_loop = loop
-        # 更新幻灯片服务的循环播放设置
-        self.slideshow_service.set_slideshow_loop(loop)
+        self.set_all_settings({'slideshow_loop': loop})
     
     def get_slideshow_loop(self) -> bool:
         """获取幻灯片循环播放设置"""
-        return self.slideshow_loop
+        return self.settings_store.get('slideshow_loop')
     
+    def set_shuffle(self, shuffle: bool):
+        """设置随机播放"""
+        self.set_all_settings({'shuffle': shuffle})
+
+    def get_shuffle(self) -> bool:
+        """获取随机播放设置"""
+        return self.settings_store.get('shuffle')
+
     def set_brightness(self, brightness: int):
         """设置亮度"""
-        self.brightness = brightness
+        self.set_all_settings({'brightness': brightness})
     
-    def get_brightness(self) -> int:
-        """获取亮度设置"""
-        return self.brightness
+    def get_brightness(self):
+        """获取亮度设置（从未设置过时为 None）"""
+        return self.settings_store.get('brightness')
     
     def get_all_settings(self):
         """获取所有设置"""
-        return {
-            'slideshow_interval': self.slideshow_interval,
-            'slideshow_loop': self.slideshow_loop,
-            'brightness': self.brightness
-        }
+        return self.settings_store.get_all()
     
     def set_all_settings(self, settings: dict):
-        """设置所有设置"""
-        if 'slideshow_interval' in settings:
-            self.set_slideshow_interval(settings['slideshow_interval'])
-        if 'slideshow_loop' in settings:
-            self.set_slideshow_loop(settings['slideshow_loop'])
-        if 'brightness' in settings:
-            self.set_brightness(settings['brightness'])
+        """批次更新设置：只套用值真正改变的项目，每项只套用一次，并合并为一次延迟写入"""
+        changed = self.settings_store.update(settings)
+        self._touched_settings.update(changed)
+        self._apply_settings(changed)
+        return changed
+
+    def flush_settings(self):
+        """立即写入尚未保存的设置"""
+        self.settings_store.flush()
+
+    def flush_state(self):
+        """立即写入尚未保存的设置与随机播放状态（程序结束前调用）"""
+        self.settings_store.flush()
+        self.slideshow_service.flush_shuffle_state()
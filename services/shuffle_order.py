@@ -0,0 +1,213 @@
+import random
+
+
+class ShuffleOrder:
+    """不重複的隨機播放順序（惰性 Fisher-Yates 洗牌）
+
+    圖片放在只增不減的槽位中（槽位編號即加入的順序），洗牌只記錄被交換過的位置，
+    每一步只需一次隨機數與常數次字典操作，不需要先複製並打亂整個列表。
+    一個循環內每張圖片只出現一次；新加入的圖片放在尚未抽出的範圍內，本循環就會出現。
+    被刪除的圖片的槽位設為 None，抽到時略過，下一個循環開始時才壓縮。
+
+    抽出的順序完全由 seed 與每次抽取時的槽位數決定，
+    因此只需保存 seed、已抽出的數量與新增槽位時的抽取位置，就能重播出相同的順序。
+    """
+
+    def __init__(self, images, seed=None):
+        self._reset(images, seed)
+
+    def _reset(self, images, seed):
+        self.seed = seed if seed is not None else random.SystemRandom().randrange(2 ** 63)
+        self._rng = random.Random(self.seed)
+        self._slots = list(images)
+        self._base_count = len(self._slots)
+        self._slot_of = {path: slot for slot, path in enumerate(self._slots)}
+        # 位置 -> 槽位，只記錄與初始排列不同的位置；已抽出的位置即播放歷史
+        self._swaps = {}
+        self._drawn = 0
+        # 目前顯示的位置，-1 表示尚未開始
+        self._position = -1
+        # 每個新增槽位加入時已抽出的數量，用於重播
+        self._appended_at = []
+        # 已抽出的槽位 -> 位置，讓 seek 為常數時間
+        self._drawn_position = {}
+        # 槽位列表的修訂號，加入或刪除圖片時遞增；與 seed 一起識別保存的槽位列表
+        self.revision = 0
+
+    def __len__(self):
+        """仍在順序中的圖片數"""
+        return len(self._slot_of)
+
+    def __contains__(self, path):
+        return path in self._slot_of
+
+    @property
+    def finished(self):
+        """本循環的圖片是否都已抽出且已顯示到最後"""
+        return self._drawn >= len(self._slots) and self._position >= self._drawn - 1
+
+    def _draw(self):
+        """抽出下一個槽位（Fisher-Yates 的一步）"""
+        k = self._drawn
+        j = self._rng.randrange(k, len(self._slots))
+        drawn = self._swaps.get(j, j)
+        self._swaps[j] = self._swaps.get(k, k)
+        self._swaps[k] = drawn
+        self._drawn_position[drawn] = k
+        self._drawn += 1
+        return drawn
+
+    def _path_at(self, position):
+        return self._slots[self._swaps.get(position, position)]
+
+    def current(self):
+        """目前的圖片，尚未開始或圖片已被刪除時返回 None"""
+        if self._position < 0:
+            return None
+        return self._path_at(self._position)
+
+    def next(self, is_valid=None):
+        """前進到下一張圖片並返回，本循環已結束時返回 None
+
+        Args:
+            is_valid: 可選的 is_valid(path)，返回 False 的圖片會被略過（例如尚不在播放列表中）
+        """
+        while True:
+            if self._position + 1 >= self._drawn:
+                if self._drawn >= len(self._slots):
+                    return None
+                self._draw()
+            self._position += 1
+            path = self._path_at(self._position)
+            if path is not None and (is_valid is None or is_valid(path)):
+                return path
+
+    def prev(self, is_valid=None):
+        """回到本循環中的上一張圖片並返回，已在第一張時返回 None（位置不變）"""
+        position = self._position
+        while position > 0:
+            position -= 1
+            path = self._path_at(position)
+            if path is not None and (is_valid is None or is_valid(path)):
+                self._position = position
+                return path
+        return None
+
+    def upcoming(self, count, is_valid=None):
+        """接下來的 count 張圖片（需要時會抽出，但不改變目前位置）"""
+        images = []
+        position = self._position
+        while len(images) < count:
+            if position + 1 >= self._drawn:
+                if self._drawn >= len(self._slots):
+                    break
+                self._draw()
+            position += 1
+            path = self._path_at(position)
+            if path is not None and (is_valid is None or is_valid(path)):
+                images.append(path)
+        return images
+
+    def previous(self, count, is_valid=None):
+        """之前的 count 張圖片（不改變目前位置）"""
+        images = []
+        position = self._position
+        while position > 0 and len(images) < count:
+            position -= 1
+            path = self._path_at(position)
+            if path is not None and (is_valid is None or is_valid(path)):
+                images.append(path)
+        return images
+
+    def seek(self, path):
+        """把目前位置移到已抽出的某張圖片，找不到時返回 False
+
+        尚未抽出的圖片需要以 next() 抽到。
+        """
+        position = self._drawn_position.get(self._slot_of.get(path))
+        if position is None:
+            return False
+        self._position = position
+        return True
+
+    def add(self, path):
+        """加入新圖片（放在尚未抽出的範圍中），已存在時返回 False"""
+        if path in self._slot_of:
+            return False
+        self._slot_of[path] = len(self._slots)
+        self._slots.append(path)
+        self._appended_at.append(self._drawn)
+        self.revision += 1
+        return True
+
+    def replace(self, old, new):
+        """以 new 取代順序中的 old（槽位與抽出的位置不變），old 不存在或 new 已存在時返回 False"""
+        slot = self._slot_of.get(old)
+        if slot is None or new in self._slot_of:
+            return False
+        del self._slot_of[old]
+        self._slots[slot] = new
+        self._slot_of[new] = slot
+        self.revision += 1
+        return True
+
+    def remove(self, path):
+        """移除圖片（槽位保留為 None），不存在時返回 False"""
+        slot = self._slot_of.pop(path, None)
+        if slot is None:
+            return False
+        self._slots[slot] = None
+        self.revision += 1
+        return True
+
+    def new_cycle(self, images=None, seed=None):
+        """以新的 seed 開始下一個循環，images 為 None 時沿用目前的圖片（去除已刪除的）"""
+        if images is None:
+            images = [path for path in self._slots if path is not None]
+        self._reset(images, seed)
+
+    def state(self):
+        """可序列化的播放狀態（不含槽位列表，見 slots()）"""
+        return {
+            'seed': self.seed,
+            'base_count': self._base_count,
+            'appended_at': list(self._appended_at),
+            'drawn': self._drawn,
+            'position': self._position,
+            'revision': self.revision,
+        }
+
+    def slots(self):
+        """槽位列表（已刪除的為 None），只在加入或刪除圖片與開始新循環時改變"""
+        return list(self._slots)
+
+    @classmethod
+    def restore(cls, slots, state):
+        """以保存的槽位與狀態重播出相同的順序，資料不一致時返回 None"""
+        base_count = state['base_count']
+        appended_at = state['appended_at']
+        drawn = state['drawn']
+        if base_count + len(appended_at) != len(slots) or drawn > len(slots):
+            return None
+        order = cls(slots[:base_count], state['seed'])
+        appended = iter(zip(appended_at, slots[base_count:]))
+        pending = next(appended, None)
+        for step in range(drawn + 1):
+            # 按當時的抽取位置加入槽位，每一步抽取時的槽位數與原本相同
+            while pending is not None and pending[0] <= step:
+                order._slot_of[pending[1]] = len(order._slots)
+                order._slots.append(pending[1])
+                order._appended_at.append(pending[0])
+                pending = next(appended, None)
+            if step < drawn:
+                if order._drawn >= len(order._slots):
+                    return None
+                order._draw()
+        # 已刪除的圖片恢復為 None
+        for slot, path in enumerate(slots):
+            if path is None:
+                order._slots[slot] = None
+        order._slot_of = {path: slot for slot, path in enumerate(order._slots) if path is not None}
+        order._position = min(state['position'], drawn - 1)
+        order.revision = state.get('revision', 0)
+        return order
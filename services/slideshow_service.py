@@ -1,109 +1,380 @@
+import hashlib
+import logging
 import threading
 import time
 from typing import List, Optional
+from services.auto_play_scheduler import AutoPlayScheduler
+from services.instrumentation import METRICS
+from services.playlist import Playlist
+from services.shuffle_order import ShuffleOrder
+
+logger = logging.getLogger(__name__)
 
 class SlideshowService:
-    def __init__(self, image_repository, auto_play_interval: float = 3.0):
+    def __init__(self, image_repository, auto_play_interval: float = 3.0, playlist_store=None,
+                 shuffle_store=None):
         self.image_repository = image_repository
-        self.images = self.image_repository.get_image_files()
+        # 播放位置、圖片列表與洗牌順序會在加載、目錄監視、自動播放排程與主線程中改變，
+        # 以同一個可重入鎖保護（回調只排程 UI 更新，可以在持有鎖時調用）
+        self._lock = threading.RLock()
+        # 具名播放列表的持久化（PlaylistStore），沒有時不能保存或加載具名播放列表
+        self.playlist_store = playlist_store
+        # 隨機播放順序的持久化（ShuffleStateStore），沒有時重新開機後重新洗牌
+        self.shuffle_store = shuffle_store
+        # 圖片庫與自定義播放列表都是 Playlist：成員檢查與位置查詢為常數時間
+        self.images = Playlist([])
         self.index = 0
         self.auto_play_interval = auto_play_interval
         self.is_auto_playing = False
-        self.auto_play_thread = None
+        self.auto_play_scheduler = AutoPlayScheduler(
+            self._on_auto_play_tick, auto_play_interval, prepare_callback=self._on_auto_play_prepare
+        )
+        self.on_prepare_next_callback = None
+        # 幀節奏統計：自動切換的圖片數、錯過截止時間的次數與延遲
+        self.pacing_stats = {'frames': 0, 'missed_deadlines': 0, 'total_lateness': 0.0, 'max_lateness': 0.0}
         self.custom_playlist = None
         self.on_image_changed_callback = None
         self.slideshow_loop = False  # 添加循环播放状态
         self.has_played_once = False  # 标记是否已经播放过一次
+        # 隨機播放：_shuffle_order 為目前播放列表的惰性洗牌順序，index 仍是圖片在播放列表中的位置
+        self.shuffle = False
+        self._shuffle_order = None
+        self._shuffle_source = None
+        # 所有屬性設定完成後才訂閱：背景加載的回調可能在訂閱後立即到達。
+        # 訂閱與取快照在鎖內進行，其他線程的回調等快照完成後才套用（重複的由 add_images 略過）；
+        # 取快照時在當前線程同步加載觸發的回調已加入的圖片，與快照合併
+        with self._lock:
+            self.image_repository.add_listener(self._on_repository_changed)
+            snapshot = self.image_repository.get_image_files()
+            added_meanwhile = list(self.images)
+            self.images = Playlist(snapshot)
+            if added_meanwhile:
+                self.add_images(added_meanwhile)
 
     def refresh_images(self):
-        self.images = self.image_repository.get_image_files()
-        self.index = 0
-        self.has_played_once = False  # 重置播放状态
-        # 如果使用自定義播放列表，需要重新驗證索引
-        if self.custom_playlist:
-            self._validate_custom_playlist()
-    
+        with self._lock:
+            self.images = Playlist(self.image_repository.get_image_files())
+            self.index = 0
+            self.has_played_once = False  # 重置播放状态
+            # 如果使用自定義播放列表，需要重新驗證索引
+            if self.custom_playlist:
+                self._validate_custom_playlist()
+            if self.shuffle:
+                self._reset_shuffle_order()
 
-    
+    def _on_repository_changed(self, added, removed, modified, moved=()):
+        """圖片庫變更時的回調（在圖片加載或目錄監視線程中執行）"""
+        with self._lock:
+            if removed:
+                self.remove_images(removed)
+            if moved:
+                self.move_images(moved)
+            if added:
+                self.add_images(added)
+            if modified and self.get_current_image() in modified:
+                # 當前圖片內容已更新，重新顯示
+                if self.on_image_changed_callback:
+                    self.on_image_changed_callback(self.get_current_image())
 
+    def add_images(self, image_paths: List[str]):
+        """將新準備好的圖片按圖片庫的排序鍵插入圖片列表，保持當前顯示的圖片不變
+
+        圖片列表原本為空時，第一張加入的圖片會立即通過回調顯示。
+        """
+        with self._lock:
+            was_empty = not self.images
+            sort_key = self.image_repository.sort_key
+            for path in image_paths:
+                position = self.images.insert_sorted(path, sort_key)
+                if position is None:
+                    continue
+                if self._shuffle_order is not None and not self.custom_playlist:
+                    # 恢復的順序中仍以 ID 保存的圖片（恢復時尚未加載）換回路徑，保持原本的位置；
+                    # 其他新圖片放入本循環尚未抽出的範圍，不需要重新洗牌
+                    if not self._shuffle_order.replace(self.image_repository.get_image_id(path), path):
+                        self._shuffle_order.add(path)
+                # 插入在當前圖片之前時，索引後移以保持當前圖片不變
+                if not self.custom_playlist and not was_empty and position <= self.index:
+                    self.index += 1
+
+            if was_empty and self.images and not self.custom_playlist:
+                self.index = 0
+                if self.on_image_changed_callback:
+                    self.on_image_changed_callback(self.get_current_image())
+            self._save_shuffle_state()
+
+    def move_images(self, image_paths: List[str]):
+        """排序鍵改變的圖片（例如原圖改名）按新的排序鍵移到新的位置，保持當前顯示的圖片不變"""
+        with self._lock:
+            current_image = self.get_current_image()
+            sort_key = self.image_repository.sort_key
+            for path in image_paths:
+                self.images.move_sorted(path, sort_key)
+                if self.custom_playlist:
+                    self.custom_playlist.move_sorted(path, sort_key)
+            current_list = self.custom_playlist if self.custom_playlist else self.images
+            position = current_list.position_of(current_image) if current_image else None
+            if position is not None:
+                self.index = position
+
+    def remove_images(self, image_paths: List[str]):
+        """從圖片列表與自定義播放列表中移除圖片
+
+        當前圖片未被移除時保持不變；當前圖片被移除時改為顯示同一位置的下一張圖片。
+        """
+        with self._lock:
+            removed = set(image_paths)
+            current_image = self.get_current_image()
+
+            self.images.remove(removed)
+            if self.custom_playlist:
+                self.custom_playlist.remove(removed)
+            if self._shuffle_order is not None:
+                for path in removed:
+                    self._shuffle_order.remove(path)
+                self._save_shuffle_state()
+
+            current_list = self.custom_playlist if self.custom_playlist else self.images
+            if not current_list:
+                self.index = 0
+                return
+            if current_image and current_image not in removed:
+                position = current_list.position_of(current_image)
+                if position is not None:
+                    self.index = position
+                    return
+
+            self.index = max(0, min(self.index, len(current_list) - 1))
+            if self.shuffle and self._shuffle_order is not None:
+                # 隨機播放時改為顯示順序中的下一張圖片
+                path = self._shuffle_order.next(current_list.__contains__)
+                if path is not None:
+                    self.index = current_list.position_of(path)
+            if self.on_image_changed_callback:
+                self.on_image_changed_callback(self.get_current_image())
 
     def get_current_image(self):
-        if not self.images:
-            return ''
-        
-        if self.custom_playlist:
-            if not self.custom_playlist or self.index >= len(self.custom_playlist):
+        with self._lock:
+            if not self.images:
                 return ''
-            return self.custom_playlist[self.index]
-        
-        return self.images[self.index]
+
+            if self.custom_playlist:
+                if not self.custom_playlist or self.index >= len(self.custom_playlist):
+                    return ''
+                return self.custom_playlist[self.index]
+
+            if self.index >= len(self.images):
+                return ''
+            return self.images[self.index]
+
+    def get_upcoming_images(self, ahead: int = 2, behind: int = 1) -> List[str]:
+        """獲取當前圖片之後 ahead 張與之前 behind 張圖片（按預取優先順序，不含當前圖片）"""
+        with self._lock:
+            current_list = self.custom_playlist if self.custom_playlist else self.images
+            if not current_list:
+                return []
+
+            count = len(current_list)
+            upcoming = []
+            if self.shuffle:
+                order = self._ensure_shuffle_order()
+                upcoming = (order.upcoming(ahead, current_list.__contains__)
+                            + order.previous(behind, current_list.__contains__))
+            else:
+                for offset in range(1, ahead + 1):
+                    position = self.index + offset
+                    if position >= count:
+                        if not self.slideshow_loop:
+                            break
+                        position %= count
+                    upcoming.append(current_list[position])
+                for offset in range(1, behind + 1):
+                    # prev_image 總是循環
+                    upcoming.append(current_list[(self.index - offset) % count])
+
+            current_image = current_list[self.index] if self.index < count else None
+            seen = set()
+            return [path for path in upcoming
+                    if path != current_image and not (path in seen or seen.add(path))]
 
     def next_image(self):
-        if not self.images:
-            return ''
-        
-        current_list = self.custom_playlist if self.custom_playlist else self.images
-        if not current_list:
-            return ''
-        
-        # 检查是否到达最后一张
-        if self.index >= len(current_list) - 1:
-            # 到达最后一张
-            if self.slideshow_loop:
-                # 循环播放：回到第一张
-                self.index = 0
-                self.has_played_once = True
-                print("循环播放：回到第一张图片")
+        with self._lock:
+            if not self.images:
+                return ''
+
+            current_list = self.custom_playlist if self.custom_playlist else self.images
+            if not current_list:
+                return ''
+
+            if self.shuffle:
+                return self._next_shuffled(current_list)
+
+            # 检查是否到达最后一张
+            if self.index >= len(current_list) - 1:
+                # 到达最后一张
+                if self.slideshow_loop:
+                    # 循环播放：回到第一张
+                    self.index = 0
+                    self.has_played_once = True
+                    logger.debug("循环播放：回到第一张图片")
+                else:
+                    # 不循环：停留在最后一张，停止自动播放
+                    if self.is_auto_playing:
+                        self.stop_auto_play()
+                        logger.info("播放完成，已停止自动播放")
+                    return current_list[self.index]  # 返回最后一张
             else:
-                # 不循环：停留在最后一张，停止自动播放
-                if self.is_auto_playing:
-                    self.stop_auto_play()
-                    print("播放完成，已停止自动播放")
-                return current_list[self.index]  # 返回最后一张
-        else:
-            # 未到达最后一张，继续下一张
-            self.index += 1
-            # 检查是否已经播放过一次
-            if self.index == len(current_list) - 1:
-                self.has_played_once = True
-        
-        current_image = self.get_current_image()
-        if self.on_image_changed_callback:
-            self.on_image_changed_callback(current_image)
-        return current_image
+                # 未到达最后一张，继续下一张
+                self.index += 1
+                # 检查是否已经播放过一次
+                if self.index == len(current_list) - 1:
+                    self.has_played_once = True
+
+            current_image = self.get_current_image()
+            if self.on_image_changed_callback:
+                self.on_image_changed_callback(current_image)
+            return current_image
 
     def prev_image(self):
-        if not self.images:
-            return ''
-        
-        if self.custom_playlist:
-            if not self.custom_playlist:
+        with self._lock:
+            if not self.images:
                 return ''
-            self.index = (self.index - 1) % len(self.custom_playlist)
-        else:
-            self.index = (self.index - 1) % len(self.images)
-        
-        current_image = self.get_current_image()
-        if self.on_image_changed_callback:
-            self.on_image_changed_callback(current_image)
-        return current_image
+
+            if self.shuffle:
+                current_list = self.custom_playlist if self.custom_playlist else self.images
+                # 隨機播放時回到本循環中上一張顯示過的圖片，已在第一張時不切換
+                path = self._ensure_shuffle_order().prev(current_list.__contains__)
+                if path is None:
+                    return self.get_current_image()
+                return self._show_shuffled(current_list, path)
+
+            if self.custom_playlist:
+                if not self.custom_playlist:
+                    return ''
+                self.index = (self.index - 1) % len(self.custom_playlist)
+            else:
+                self.index = (self.index - 1) % len(self.images)
+
+            current_image = self.get_current_image()
+            if self.on_image_changed_callback:
+                self.on_image_changed_callback(current_image)
+            return current_image
 
     def set_auto_play_interval(self, interval: float):
         """設定自動播放的間隔時間（秒）"""
         self.auto_play_interval = interval
-        if self.is_auto_playing:
-            self.stop_auto_play()
-            self.start_auto_play()
+        # 立即重新排程，不需要重啟線程
+        self.auto_play_scheduler.set_interval(interval)
 
     def set_slideshow_loop(self, loop: bool):
         """設定循環播放狀態"""
         self.slideshow_loop = loop
-        print(f"循环播放设置已更新: {'开启' if loop else '关闭'}")
+        logger.info(f"循环播放设置已更新: {'开启' if loop else '关闭'}")
 
     def get_slideshow_loop(self) -> bool:
         """獲取循環播放狀態"""
         return self.slideshow_loop
 
+    def set_shuffle(self, enabled: bool):
+        """設定隨機播放
+
+        開啟時若保存了同一播放列表的順序，繼續上次的循環並顯示上次的圖片，否則重新洗牌；
+        每個循環內每張圖片只顯示一次，開啟循環播放時每個循環重新洗牌。
+        """
+        with self._lock:
+            if enabled == self.shuffle:
+                return
+            self.shuffle = enabled
+            if enabled:
+                order = self._reset_shuffle_order(restore=True)
+                current_list = self.custom_playlist if self.custom_playlist else self.images
+                restored = order.current()
+                if restored is not None and restored in current_list:
+                    self._show_shuffled(current_list, restored)
+            else:
+                # 關閉前寫入目前的順序，再次開啟時可以繼續
+                if self.shuffle_store is not None:
+                    self.shuffle_store.flush()
+                self._shuffle_order = None
+                self._shuffle_source = None
+            logger.info(f"隨機播放設置已更新: {'開啟' if enabled else '關閉'}")
+
+    def get_shuffle(self) -> bool:
+        """獲取隨機播放狀態"""
+        return self.shuffle
+
+    def _playlist_source(self):
+        """目前播放列表的識別：圖片庫，或自定義播放列表內容（圖片的穩定 ID）的雜湊"""
+        if not self.custom_playlist:
+            return 'library'
+        get_image_id = self.image_repository.get_image_id
+        image_ids = (get_image_id(path) or path for path in self.custom_playlist)
+        digest = hashlib.sha1('\n'.join(image_ids).encode('utf-8')).hexdigest()
+        return f'custom:{digest}'
+
+    def _reset_shuffle_order(self, restore=False):
+        """為目前的播放列表建立洗牌順序；restore 時先嘗試恢復保存的順序"""
+        current_list = self.custom_playlist if self.custom_playlist else self.images
+        source = self._playlist_source()
+        if restore and self._shuffle_order is not None and source == self._shuffle_source:
+            # 播放列表沒有改變（例如重新選擇相同的圖片），繼續目前的循環
+            return self._shuffle_order
+        order = self.shuffle_store.load(source) if restore and self.shuffle_store else None
+        if order is None:
+            order = ShuffleOrder(current_list)
+        else:
+            # 保存後才加入的圖片放入本循環；已刪除的圖片在抽到時略過
+            for path in current_list:
+                order.add(path)
+            logger.info(f"已恢復隨機播放順序（{len(order)} 張圖片）")
+        self._shuffle_order = order
+        self._shuffle_source = source
+        self._save_shuffle_state()
+        return order
+
+    def _ensure_shuffle_order(self):
+        if self._shuffle_order is None:
+            return self._reset_shuffle_order()
+        return self._shuffle_order
+
+    def _save_shuffle_state(self):
+        """安排寫入隨機播放順序（只做標記，寫入時才在持有鎖的情況下讀取順序）"""
+        if self.shuffle_store is not None and self._shuffle_order is not None:
+            self.shuffle_store.save(self._shuffle_source, self._shuffle_order, self._lock)
+
+    def flush_shuffle_state(self):
+        """立即寫入尚未保存的隨機播放順序（程式結束前調用）"""
+        if self.shuffle_store is not None:
+            self.shuffle_store.flush()
+
+    def _show_shuffled(self, current_list, path):
+        """顯示洗牌順序中的圖片（index 同步為圖片在播放列表中的位置）"""
+        self.index = current_list.position_of(path)
+        self._save_shuffle_state()
+        if self.on_image_changed_callback:
+            self.on_image_changed_callback(path)
+        return path
+
+    def _next_shuffled(self, current_list):
+        order = self._ensure_shuffle_order()
+        # 只顯示仍在播放列表中的圖片（例如背景加載時尚未加入的圖片會被略過）
+        path = order.next(current_list.__contains__)
+        if path is None:
+            # 本循環的圖片都已顯示過
+            if not self.slideshow_loop:
+                if self.is_auto_playing:
+                    self.stop_auto_play()
+                    logger.info("播放完成，已停止自动播放")
+                return self.get_current_image()
+            order.new_cycle(current_list.to_list())
+            logger.debug("隨機播放：開始新的循環")
+            path = order.next(current_list.__contains__)
+            if path is None:
+                return self.get_current_image()
+        if order.finished:
+            self.has_played_once = True
+        return self._show_shuffled(current_list, path)
+
     def start_auto_play(self):
         """開始自動播放"""
         if self.is_auto_playing:
@@ -111,89 +382,237 @@ class SlideshowService:
         
         self.is_auto_playing = True
         self.has_played_once = False  # 重置播放状态
-        self.auto_play_thread = threading.Thread(target=self._auto_play_loop, daemon=True)
-        self.auto_play_thread.start()
+        self.auto_play_scheduler.start()
 
     def stop_auto_play(self):
-        """停止自動播放"""
+        """停止自動播放（只取消排程，不等待線程結束）"""
         self.is_auto_playing = False
-        if self.auto_play_thread:
-            self.auto_play_thread.join(timeout=1.0)
-            self.auto_play_thread = None
-
-    def _auto_play_loop(self):
-        """自動播放循環"""
-        while self.is_auto_playing:
-            time.sleep(self.auto_play_interval)
-            if self.is_auto_playing:  # 再次檢查，避免在sleep期間被停止
-                # 检查是否应该继续播放
-                current_list = self.custom_playlist if self.custom_playlist else self.images
-                if not current_list:
-                    continue
-                
-                # 如果到达最后一张且不循环，停止自动播放
-                if self.index >= len(current_list) - 1 and not self.slideshow_loop:
-                    if self.has_played_once:
-                        print("播放完成，停止自动播放")
-                        # 只设置标志，不调用stop_auto_play避免线程join错误
-                        self.is_auto_playing = False
-                        break
-                    else:
-                        # 第一次到达最后一张，标记为已播放一次
-                        self.has_played_once = True
-                        self.next_image()
+        self.auto_play_scheduler.stop()
+
+    def pause_auto_play(self):
+        """暫停自動播放，恢復時沿用剩餘的等待時間"""
+        if self.is_auto_playing:
+            self.auto_play_scheduler.pause()
+
+    def resume_auto_play(self):
+        """恢復暫停的自動播放"""
+        if self.is_auto_playing:
+            self.auto_play_scheduler.resume()
+
+    # 圖片在截止時間後超過這個時間（約一幀）才顯示，視為錯過截止時間
+    MISSED_DEADLINE_TOLERANCE = 1 / 60
+
+    def peek_next_image(self):
+        """下一次自動播放將顯示的圖片，不會切換時返回 None"""
+        with self._lock:
+            current_list = self.custom_playlist if self.custom_playlist else self.images
+            if not current_list:
+                return None
+            if self.shuffle:
+                # 循環結束時下一個循環尚未洗牌，不預先準備
+                upcoming = self._ensure_shuffle_order().upcoming(1, current_list.__contains__)
+                return upcoming[0] if upcoming else None
+            if self.index >= len(current_list) - 1:
+                if not self.slideshow_loop:
+                    return None
+                return current_list[0]
+            return current_list[self.index + 1]
+
+    def set_prepare_next_callback(self, callback, lead_time):
+        """設定在自動切換前 lead_time 秒調用的回調 callback(image_path)，用於提前解碼下一張圖片"""
+        self.on_prepare_next_callback = callback
+        self.set_prepare_lead_time(lead_time)
+
+    def set_prepare_lead_time(self, lead_time):
+        """調整提前準備下一張圖片的時間（秒）"""
+        self.auto_play_scheduler.lead_time = lead_time
+
+    def get_frame_deadline(self):
+        """正在進行的自動切換的截止時間（time.monotonic()），手動切換時返回 None"""
+        return self.auto_play_scheduler.current_deadline
+
+    def record_frame_shown(self, deadline, ready=True):
+        """記錄自動切換的圖片實際顯示的時間
+
+        Args:
+            deadline: get_frame_deadline() 返回的截止時間
+            ready: 顯示時圖片是否已解碼完成
+        """
+        if deadline is None:
+            return
+        lateness = max(0.0, time.monotonic() - deadline)
+        stats = self.pacing_stats
+        stats['frames'] += 1
+        stats['total_lateness'] += lateness
+        stats['max_lateness'] = max(stats['max_lateness'], lateness)
+        METRICS.histogram('photoframe_frame_lateness_seconds', '自動切換的圖片晚於截止時間顯示的秒數').observe(lateness)
+        if not ready or lateness > self.MISSED_DEADLINE_TOLERANCE:
+            stats['missed_deadlines'] += 1
+            METRICS.counter('photoframe_missed_deadlines_total', '錯過截止時間或顯示時尚未解碼的切換次數').inc()
+
+    def get_pacing_stats(self):
+        """獲取幀節奏統計（切換次數、錯過截止時間次數、平均與最大延遲秒數）"""
+        stats = dict(self.pacing_stats)
+        total_lateness = stats.pop('total_lateness')
+        stats['average_lateness'] = total_lateness / stats['frames'] if stats['frames'] else 0.0
+        return stats
+
+    def _on_auto_play_prepare(self):
+        """自動切換前的準備（在排程線程中執行）"""
+        if not self.is_auto_playing or not self.on_prepare_next_callback:
+            return
+        # peek_next_image 持有鎖；回調（解碼與排程上傳）在鎖外執行
+        next_image = self.peek_next_image()
+        if next_image:
+            self.on_prepare_next_callback(next_image)
+
+    def _on_auto_play_tick(self):
+        """自動播放排程觸發（在排程線程中執行）"""
+        with self._lock:
+            if not self.is_auto_playing:
+                return
+            # 检查是否应该继续播放
+            current_list = self.custom_playlist if self.custom_playlist else self.images
+            if not current_list:
+                return
+
+            # 如果到达最后一张且不循环，停止自动播放
+            if self._at_last_image(current_list) and not self.slideshow_loop:
+                if self.image_repository.is_loading():
+                    # 圖片仍在背景加載，等待後續圖片而不是結束播放
+                    return
+                if self.has_played_once:
+                    logger.info("播放完成，停止自动播放")
+                    self.stop_auto_play()
                 else:
-                    # 继续播放下一张
+                    # 第一次到达最后一张，标记为已播放一次
+                    self.has_played_once = True
                     self.next_image()
+            else:
+                # 继续播放下一张
+                self.next_image()
+
+    def _at_last_image(self, current_list):
+        """是否已顯示到播放列表（隨機播放時為本循環）的最後一張"""
+        if self.shuffle and self._shuffle_order is not None:
+            return self._shuffle_order.finished
+        return self.index >= len(current_list) - 1
 
-    def set_custom_playlist(self, image_paths: List[str]):
+    def set_custom_playlist(self, image_paths: List[str], name: Optional[str] = None):
         """設定自定義播放列表
         
         Args:
             image_paths: 圖片路徑列表，路徑應該是相對於images目錄的完整路徑
+            name: 可選的播放列表名稱（來自具名播放列表時）
         """
-        if not image_paths:
-            self.custom_playlist = None
+        with self._lock:
+            if not image_paths:
+                self.clear_custom_playlist()
+                return
+
+            # 按圖片庫的排序鍵排列，順序與傳入的順序（例如集合的走訪順序）無關；
+            # 不驗證圖片是否在圖片庫中（背景加載時可能尚未出現），圖片庫刷新時才驗證
+            self.custom_playlist = Playlist.sorted(image_paths, self.image_repository.sort_key, name)
             self.index = 0
-            return
-        
-        # 直接使用传入的图片路径，不需要验证是否存在于self.images中
-        # 因为播放列表传递的是完整路径，这些路径是有效的
-        self.custom_playlist = image_paths
-        self.index = 0
+            if self.shuffle:
+                self._reset_shuffle_order(restore=True)
 
     def clear_custom_playlist(self):
         """清除自定義播放列表，回到所有圖片播放模式"""
-        self.custom_playlist = None
-        self.index = 0
+        with self._lock:
+            self.custom_playlist = None
+            self.index = 0
+            if self.shuffle:
+                self._reset_shuffle_order(restore=True)
 
     def get_playlist_info(self):
         """獲取當前播放列表信息"""
-        if self.custom_playlist:
-            return {
-                'type': 'custom',
-                'total': len(self.custom_playlist),
-                'current': self.index + 1,
-                'playlist': self.custom_playlist
-            }
-        else:
-            return {
-                'type': 'all',
-                'total': len(self.images),
-                'current': self.index + 1,
-                'playlist': self.images
-            }
+        with self._lock:
+            if self.custom_playlist:
+                return {
+                    'type': 'custom',
+                    'name': self.custom_playlist.name,
+                    'total': len(self.custom_playlist),
+                    'current': self.index + 1,
+                    'playlist': self.custom_playlist.to_list()
+                }
+            else:
+                return {
+                    'type': 'all',
+                    'name': None,
+                    'total': len(self.images),
+                    'current': self.index + 1,
+                    'playlist': self.images.to_list()
+                }
+
+    def position_of(self, image_path: str) -> Optional[int]:
+        """圖片在目前播放列表中的位置（從 0 開始），不在播放列表中時返回 None"""
+        with self._lock:
+            current_list = self.custom_playlist if self.custom_playlist else self.images
+            return current_list.position_of(image_path)
+
+    def jump_to_image(self, image_path: str) -> bool:
+        """跳到目前播放列表中的某張圖片，圖片不在播放列表中時返回 False"""
+        with self._lock:
+            position = self.position_of(image_path)
+            if position is None:
+                return False
+            self.index = position
+            if self._shuffle_order is not None:
+                # 已在本循環顯示過時回到該位置；尚未抽到的圖片不影響洗牌順序
+                self._shuffle_order.seek(image_path)
+                self._save_shuffle_state()
+            if self.on_image_changed_callback:
+                self.on_image_changed_callback(image_path)
+            return True
+
+    def get_playlist_names(self) -> List[str]:
+        """已保存的具名播放列表名稱"""
+        return self.playlist_store.names() if self.playlist_store else []
+
+    def save_playlist(self, name: str, image_paths: Optional[List[str]] = None):
+        """保存具名播放列表（預設為目前的自定義播放列表）
+
+        以圖片的穩定 ID（相對路徑與內容雜湊）保存，圖片目錄換了掛載位置或縮圖重新生成後仍能解析。
+        """
+        if self.playlist_store is None:
+            raise RuntimeError('No playlist store configured')
+        if image_paths is None:
+            custom_playlist = self.custom_playlist
+            image_paths = custom_playlist.to_list() if custom_playlist else []
+        playlist = Playlist.sorted(image_paths, self.image_repository.sort_key)
+        image_ids = [self.image_repository.get_image_id(path) for path in playlist]
+        self.playlist_store.save(name, [image_id for image_id in image_ids if image_id])
+
+    def load_playlist(self, name: str) -> bool:
+        """以保存的具名播放列表作為自定義播放列表，不存在時返回 False"""
+        saved = self.playlist_store.get(name) if self.playlist_store else None
+        if saved is None:
+            return False
+        image_paths = []
+        for image_id in saved:
+            image_path = self.image_repository.resolve_image_id(image_id)
+            if image_path is not None:
+                image_paths.append(image_path)
+        if len(image_paths) != len(saved):
+            logger.warning(f"播放列表 {name} 中有 {len(saved) - len(image_paths)} 張圖片已不存在")
+        self.set_custom_playlist(image_paths, name)
+        return True
+
+    def delete_playlist(self, name: str) -> bool:
+        """刪除具名播放列表，不存在時返回 False"""
+        return self.playlist_store.delete(name) if self.playlist_store else False
 
     def _validate_custom_playlist(self):
         """驗證自定義播放列表的有效性"""
         if not self.custom_playlist:
             return
         
-        # 檢查播放列表中的圖片是否仍然存在
-        valid_paths = [path for path in self.custom_playlist if path in self.images]
-        if len(valid_paths) != len(self.custom_playlist):
-            print("Warning: Some images in custom playlist no longer exist")
-            self.custom_playlist = valid_paths
+        # 檢查播放列表中的圖片是否仍然存在（每張圖片一次雜湊查詢）
+        missing = {path for path in self.custom_playlist if path not in self.images}
+        if missing:
+            logger.warning("Some images in custom playlist no longer exist")
+            self.custom_playlist.remove(missing)
         
         # 調整索引
         if self.custom_playlist and self.index >= len(self.custom_playlist):
@@ -0,0 +1,117 @@
+import threading
+from collections import OrderedDict
+
+# 每種像素格式每個像素的位元組數
+BYTES_PER_PIXEL = {'rgb': 3, 'bgr': 3, 'rgba': 4, 'bgra': 4, 'luminance': 1, 'alpha': 1}
+
+
+def texture_bytes(texture):
+    """估計紋理佔用的顯示記憶體位元組數"""
+    width, height = texture.size
+    return width * height * BYTES_PER_PIXEL.get(texture.colorfmt, 4)
+
+
+class TextureCache:
+    """所有頁面共用的紋理快取
+
+    以位元組數為上限，超出時按最近最少使用（LRU）順序淘汰；
+    正在顯示的紋理以引用計數保護（acquire/release），引用計數大於零的紋理不會被淘汰，
+    因此使用中的紋理可能讓快取暫時超出預算。
+    紋理的創建與使用應在主線程中進行；其他線程只可調用 discard 與 stats。
+    """
+
+    def __init__(self, memory_budget=64 * 1024 * 1024):
+        self.memory_budget = memory_budget
+        # 鍵 -> [紋理, 位元組數, 引用計數]
+        self._entries = OrderedDict()
+        self._resident_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """取得紋理並增加引用計數，不在快取中時返回 None（計為未命中）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            entry[2] += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def contains(self, key):
+        """紋理是否在快取中（不計入命中率，也不影響 LRU 順序）"""
+        with self._lock:
+            return key in self._entries
+
+    def add(self, key, texture):
+        """加入紋理並持有一個引用（調用者用完後需調用 release）
+
+        鍵已存在時保留快取中的紋理並返回它，讓所有使用者共用同一份。
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[2] += 1
+                self._entries.move_to_end(key)
+                return entry[0]
+            size = texture_bytes(texture)
+            self._entries[key] = [texture, size, 1]
+            self._resident_bytes += size
+            self._evict()
+            return texture
+
+    def release(self, key):
+        """釋放一個引用，引用計數歸零的紋理可以被淘汰"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] == 0:
+                return
+            entry[2] -= 1
+            if entry[2] == 0:
+                self._evict()
+
+    def discard(self, key):
+        """移除紋理（例如圖片已被刪除），正在使用的部件仍保有紋理物件本身"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._resident_bytes -= entry[1]
+
+    def clear(self):
+        """移除所有紋理"""
+        with self._lock:
+            self._entries.clear()
+            self._resident_bytes = 0
+
+    def stats(self):
+        """快取統計：命中率、常駐位元組數、淘汰次數等"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'in_use': sum(1 for entry in self._entries.values() if entry[2] > 0),
+                'resident_bytes': self._resident_bytes,
+                'memory_budget': self.memory_budget,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+            }
+
+    def _evict(self):
+        """從最久未使用的紋理開始淘汰未被引用的紋理，直到回到預算內"""
+        if self._resident_bytes <= self.memory_budget:
+            return
+        for key in list(self._entries):
+            entry = self._entries[key]
+            if entry[2] > 0:
+                continue
+            del self._entries[key]
+            self._resident_bytes -= entry[1]
+            self._evictions += 1
+            if self._resident_bytes <= self.memory_budget:
+                return
@@ -0,0 +1,97 @@
+import gc
+import importlib
+import logging
+from kivy.clock import Clock
+from kivy.uix.screenmanager import ScreenManager
+from services.instrumentation import METRICS, STARTUP_PROFILE
+
+logger = logging.getLogger(__name__)
+
+
+def read_available_memory(meminfo_path='/proc/meminfo'):
+    """讀取系統可用記憶體（位元組），無法讀取時（例如非 Linux）返回 None"""
+    try:
+        with open(meminfo_path, 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class LazyScreenManager(ScreenManager):
+    """第一次切換到頁面時才導入模組並建立頁面的 ScreenManager
+
+    頁面以 register(name, 'module:Class') 登記，get_screen 與切換 current 時才建立。
+    每 memory_check_interval 秒檢查一次可用記憶體，低於 low_memory_bytes 時釋放
+    已建立、不在顯示中且登記為可釋放的頁面，下次切換到該頁面時重新建立。
+    頁面可以定義 release()，在被釋放前解除監聽並交還持有的資源。
+    """
+
+    def __init__(self, low_memory_bytes=64 * 1024 * 1024, memory_check_interval=30.0, **kwargs):
+        super().__init__(**kwargs)
+        self.low_memory_bytes = low_memory_bytes
+        # 頁面名稱 -> (模組:類別, 是否可釋放)
+        self._factories = {}
+        if memory_check_interval:
+            Clock.schedule_interval(self._check_memory, memory_check_interval)
+
+    def register(self, name, target, releasable=True):
+        """登記頁面
+
+        Args:
+            target: 'module:Class'，類別以 Class(name=name) 建立
+            releasable: 記憶體不足時是否可以釋放（保存播放狀態等的頁面應為 False）
+        """
+        self._factories[name] = (target, releasable)
+
+    def is_built(self, name):
+        return super().has_screen(name)
+
+    def has_screen(self, name):
+        return name in self._factories or super().has_screen(name)
+
+    def get_screen(self, name):
+        if name in self._factories and not self.is_built(name):
+            return self._build(name)
+        return super().get_screen(name)
+
+    def _build(self, name):
+        module_name, class_name = self._factories[name][0].split(':')
+        with STARTUP_PROFILE.phase(f'導入 {module_name}'):
+            module = importlib.import_module(module_name)
+        with STARTUP_PROFILE.phase(f'建立頁面 {name}'), \
+                METRICS.span('photoframe_screen_build_seconds', '建立頁面的耗時'):
+            screen = getattr(module, class_name)(name=name)
+        self.add_widget(screen)
+        logger.info(f"已建立頁面 {name}（{STARTUP_PROFILE.records[-1][1]:.3f} 秒）")
+        return screen
+
+    def release_screen(self, name):
+        """釋放已建立的頁面，顯示中、切換中或不可釋放的頁面不會被釋放
+
+        Returns:
+            是否已釋放
+        """
+        factory = self._factories.get(name)
+        if factory is None or not factory[1] or not self.is_built(name):
+            return False
+        screen = super().get_screen(name)
+        if screen is self.current_screen or self.transition.is_active:
+            return False
+        release = getattr(screen, 'release', None)
+        if release is not None:
+            release()
+        self.remove_widget(screen)
+        METRICS.counter('photoframe_screens_released_total', '釋放頁面的次數').inc()
+        return True
+
+    def _check_memory(self, dt):
+        available = read_available_memory()
+        if available is None or available >= self.low_memory_bytes:
+            return
+        released = [name for name in list(self._factories) if self.release_screen(name)]
+        if released:
+            gc.collect()
+            logger.warning(f"可用記憶體不足（{available // (1024 * 1024)} MB），已釋放頁面: {', '.join(released)}")
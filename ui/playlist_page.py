@@ -1,19 +1,26 @@
+import logging
 import os
-import json
+from weakref import WeakSet
 from kivy.uix.screenmanager import Screen
 from kivy.uix.boxlayout import BoxLayout
-from kivy.uix.gridlayout import GridLayout
-from kivy.uix.image import Image
+from kivy.uix.image import AsyncImage
 from kivy.uix.button import Button
 from kivy.uix.checkbox import CheckBox
 from kivy.uix.label import Label
-from kivy.uix.scrollview import ScrollView
 from kivy.uix.floatlayout import FloatLayout
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recyclegridlayout import RecycleGridLayout
 from kivy.graphics import Color, RoundedRectangle
+from kivy.clock import Clock
 from repositories.image_repository import ImageRepository
+from repositories.selection_store import SelectionStateStore
+from services.selection_model import SelectionModel, NONE_EXCEPT
 from ui.main_page import RoundedButton
 from services.service_manager import ServiceManager
 
+logger = logging.getLogger(__name__)
+
 class SmallRoundedButton(Button):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -35,153 +42,222 @@ class SmallRoundedButton(Button):
         self.bg.pos = self.pos
         self.bg.size = self.size
 
+class PlaylistCell(RecycleDataViewBehavior, BoxLayout):
+    """播放列表網格的單元格，由 RecycleView 重複使用，只為可見的行創建
+
+    縮圖使用 AsyncImage 在背景線程中加載，單元格滾動進入畫面時才開始加載；
+    加載完成的紋理放入共用紋理快取，單元格顯示該縮圖期間持有一個引用。
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(orientation='vertical', **kwargs)
+        self.owner = None
+        self.img_path = None
+        # 持有引用的紋理快取鍵
+        self._texture_key = None
+        float_layout = FloatLayout(size_hint=(1, None), height=100)
+        # 紋理由共用紋理快取保留，不使用 Kivy 自己的圖片快取
+        self.image = AsyncImage(size_hint=(0.85, 1), pos_hint={'x': 0.15, 'y': 0}, allow_stretch=True,
+                                keep_ratio=False, nocache=True)
+        self.image.bind(on_load=self._on_image_load)
+        float_layout.add_widget(self.image)
+        self.no_image_label = Label(text='', size_hint=(0.85, 1), pos_hint={'x': 0.15, 'y': 0})
+        float_layout.add_widget(self.no_image_label)
+        self.checkbox = CheckBox(
+            size_hint=(None, None),
+            size=(30, 30),
+            pos_hint={'x': -0.05, 'center_y': 0.80},
+            color=(0.1, 0.2, 0.3, 1)
+        )
+        self.checkbox.bind(active=self.on_checkbox_active)
+        float_layout.add_widget(self.checkbox)
+        self.add_widget(float_layout)
+        self.label = Label(size_hint=(1, None), height=30, color=(0, 0, 0, 1))
+        self.add_widget(self.label)
+
+    def refresh_view_attrs(self, rv, index, data):
+        """單元格被重複使用時更新顯示的圖片與勾選狀態"""
+        self.owner = data['owner']
+        self.owner._cells.add(self)
+        self.img_path = data['img_path']
+        thumb_path = data['thumb_path']
+        cache = self.owner.texture_cache
+        if self._texture_key is not None and self._texture_key != thumb_path:
+            cache.release(self._texture_key)
+            self._texture_key = None
+
+        if self._texture_key != thumb_path:
+            texture = cache.acquire(thumb_path)
+            if texture is not None:
+                # 已在快取中，直接使用紋理，不需要再讀取檔案
+                self._texture_key = thumb_path
+                self.image.source = ''
+                self.image.texture = texture
+                self.image.opacity = 1
+                self.no_image_label.text = ''
+            elif os.path.exists(thumb_path):
+                self.image.source = thumb_path
+                self.image.opacity = 1
+                self.no_image_label.text = ''
+            else:
+                self.image.source = ''
+                self.image.opacity = 0
+                self.no_image_label.text = 'No Image'
+        self.label.text = data['label']
+
+        self.update_selection()
+
+    def release_texture(self):
+        """交還持有的紋理引用並與頁面分離（頁面被釋放時使用）"""
+        if self._texture_key is not None:
+            self.owner.texture_cache.release(self._texture_key)
+            self._texture_key = None
+        self.image.source = ''
+        self.image.texture = None
+        self.owner = None
+        self.img_path = None
+
+    def _on_image_load(self, image):
+        """縮圖加載完成後放入共用紋理快取"""
+        if self.owner is None:
+            return
+        if image.source and image.texture is not None and self._texture_key is None:
+            self._texture_key = image.source
+            self.owner.texture_cache.add(image.source, image.texture)
+
+    def update_selection(self):
+        """從選取模型更新勾選框（不觸發回調）"""
+        self.checkbox.unbind(active=self.on_checkbox_active)
+        self.checkbox.active = self.owner.selection.is_selected(self.img_path)
+        self.checkbox.bind(active=self.on_checkbox_active)
+
+    def on_checkbox_active(self, checkbox, value):
+        if self.owner is not None and self.img_path is not None:
+            self.owner.on_checkbox(self.img_path, value)
+
 CHECKBOX_STATE_FILE = os.path.join(os.path.dirname(__file__), '../checkbox_state.json')
 
 class PlaylistScreen(Screen):
+    # 網格中圖片的大致顯示尺寸，用於選擇縮圖版本
+    GRID_CELL_SIZE = (320, 100)
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # 使用 ServiceManager 來獲取圖片路徑
         self.service_manager = ServiceManager()
         self.repository = self.service_manager.repository
-        self.selected = set()
+        self.texture_cache = self.service_manager.get_texture_cache()
+        self.selection = SelectionModel()
+        self.state_store = SelectionStateStore(CHECKBOX_STATE_FILE)
         self.all_checkbox = None
-        self.image_checkboxes = []
+        self.grid_view = None
+        # 曾顯示本頁面圖片的單元格（包括 RecycleView 暫存待重用的），釋放頁面時交還紋理
+        self._cells = WeakSet()
+        self._grid_images = []
+        # 保存的例外中，圖片仍在背景加載、尚未出現的路徑
+        self._unresolved_exceptions = []
         self.root_layout = BoxLayout(orientation='vertical', spacing=0, padding=0)
         self.build_header()
         self.build_grid()
         self.add_widget(self.root_layout)
+        # 圖片仍在背景加載或目錄有變更時，合併通知後在主線程中更新網格
+        self._sync_grid_trigger = Clock.create_trigger(self._sync_grid, 0.2)
+        self.repository.add_listener(self._on_repository_changed)
+
+    def _on_repository_changed(self, added, removed, modified, moved=()):
+        """圖片庫變更時的回調（在圖片加載或目錄監視線程中執行）"""
+        if added or removed or moved:
+            self._sync_grid_trigger()
+
+    def _sync_grid(self, *args):
+        """頁面顯示中時以最新的圖片列表更新網格（其他時候由 on_pre_enter 處理）"""
+        if not self.manager or self.manager.current != self.name:
+            return
+        if self.repository.get_image_files() != self._grid_images:
+            self.build_grid()
+            self._apply_late_exceptions()
+            self.update_all_checkbox_state()
+            self._refresh_visible_cells()
+
+    def _apply_late_exceptions(self):
+        """對背景加載期間才出現的圖片套用保存的例外狀態"""
+        unresolved = []
+        for image_id in self._unresolved_exceptions:
+            image_path = self.repository.resolve_image_id(image_id)
+            if image_path:
+                self.selection.set_selected(image_path, self.selection.mode == NONE_EXCEPT)
+            else:
+                unresolved.append(image_id)
+        self._unresolved_exceptions = unresolved
 
     def save_checkbox_state(self):
-        """保存勾選框狀態到文件"""
-        try:
-            state_data = {
-                'all_selected': self.all_checkbox.active if self.all_checkbox else True,
-                'selected_images': list(self.selected),
-                'image_states': {}
-            }
-            
-            # 保存每個圖片勾選框的狀態
-            for checkbox in self.image_checkboxes:
-                if hasattr(checkbox, 'img_path'):
-                    state_data['image_states'][checkbox.img_path] = checkbox.active
-            
-            with open(CHECKBOX_STATE_FILE, 'w', encoding='utf-8') as f:
-                json.dump(state_data, f, ensure_ascii=False, indent=2)
-                
-        except Exception as e:
-            print(f"保存勾選框狀態失敗: {e}")
-
-    def convert_old_paths_to_new(self, state_data):
-        """將舊的本地路徑轉換為新的隨身碟路徑"""
-        try:
-            old_base = os.path.join(os.path.dirname(__file__), '../images')
-            new_base = '/media/jh-pi/ESD-USB/images'
-            
-            # 檢查隨身碟路徑是否存在
-            if not os.path.exists(new_base):
-                return state_data
-            
-            converted_data = state_data.copy()
-            
-            # 轉換 selected_images 中的路徑
-            if 'selected_images' in converted_data:
-                converted_selected = []
-                for old_path in converted_data['selected_images']:
-                    if old_path.startswith(old_base):
-                        # 提取文件名
-                        filename = os.path.basename(old_path)
-                        new_path = os.path.join(new_base, filename)
-                        # 檢查新路徑是否存在
-                        if os.path.exists(new_path):
-                            converted_selected.append(new_path)
-                        else:
-                            print(f"圖片文件不存在: {new_path}")
-                    else:
-                        converted_selected.append(old_path)
-                converted_data['selected_images'] = converted_selected
-            
-            # 轉換 image_states 中的路徑
-            if 'image_states' in converted_data:
-                converted_states = {}
-                for old_path, state in converted_data['image_states'].items():
-                    if old_path.startswith(old_base):
-                        filename = os.path.basename(old_path)
-                        new_path = os.path.join(new_base, filename)
-                        if os.path.exists(new_path):
-                            converted_states[new_path] = state
-                        else:
-                            print(f"圖片文件不存在: {new_path}")
-                    else:
-                        converted_states[old_path] = state
-                converted_data['image_states'] = converted_states
-            
-            return converted_data
-            
-        except Exception as e:
-            print(f"路徑轉換失敗: {e}")
-            return state_data
-    
+        """記錄勾選框狀態（以圖片的穩定 ID 保存），由狀態存儲合併後延遲寫入文件"""
+        image_ids = [self.repository.get_image_id(image_path) for image_path in self.selection.exceptions]
+        self.state_store.update(
+            self.selection.mode, [image_id for image_id in image_ids if image_id] + self._unresolved_exceptions
+        )
+
+    def flush_checkbox_state(self):
+        """記錄勾選框狀態並立即寫入文件（離開頁面時使用）"""
+        self.save_checkbox_state()
+        self.state_store.flush()
+
     def load_checkbox_state(self):
         """從文件加載勾選框狀態"""
-        try:
-            if not os.path.exists(CHECKBOX_STATE_FILE):
-                return None
-                
-            with open(CHECKBOX_STATE_FILE, 'r', encoding='utf-8') as f:
-                state_data = json.load(f)
-            
-            # 轉換舊路徑為新路徑
-            converted_state = self.convert_old_paths_to_new(state_data)
-            
-            return converted_state
-        except Exception as e:
-            print(f"加載勾選框狀態失敗: {e}")
+        state_data = self.state_store.load()
+        if state_data is None:
             return None
+        
+        # 以圖片庫的索引把穩定 ID（或舊版保存的絕對路徑）解析為目前的圖片路徑，不存取檔案系統；
+        # 無法解析的 ID（圖片仍在背景加載）放在 unresolved 中
+        resolved = []
+        unresolved = []
+        for image_id in state_data['exceptions']:
+            image_path = self.repository.resolve_image_id(image_id)
+            if image_path:
+                resolved.append(image_path)
+            else:
+                unresolved.append(image_id)
+        state_data['exceptions'] = resolved
+        state_data['unresolved'] = unresolved
+        return state_data
 
     def on_pre_enter(self, *args):
         """頁面進入前初始化選中狀態"""
+        # 背景加載期間建立的網格可能不完整，圖片列表變更時重建
+        if self.repository.get_image_files() != self._grid_images:
+            self.build_grid()
+
         # 加載保存的狀態
         saved_state = self.load_checkbox_state()
         
         if saved_state:
-            # 恢復選中的圖片集合
-            self.selected.clear()
-            self.selected.update(saved_state.get('selected_images', []))
-            
-            # 恢復All勾選框狀態
-            if self.all_checkbox:
-                self.all_checkbox.active = saved_state.get('all_selected', True)
-            
-            # 恢復個別圖片勾選框狀態
-            image_states = saved_state.get('image_states', {})
-            for checkbox in self.image_checkboxes:
-                if hasattr(checkbox, 'img_path') and checkbox.img_path in image_states:
-                    checkbox.active = image_states[checkbox.img_path]
-            
-            # 同步self.selected集合与勾选框状态
-            self._sync_selected_with_checkboxes()
+            # 恢復選取模式與例外；「全部選中」模式下新加入的圖片也是選中的
+            self.selection.load_state(saved_state['mode'], saved_state['exceptions'])
+            # 圖片仍在加載時保留其餘例外，待圖片出現後套用；加載完成後已不存在的圖片則丟棄
+            self._unresolved_exceptions = saved_state['unresolved'] if self.repository.is_loading() else []
         else:
             # 如果沒有保存的狀態，使用默認值（全部選中）
-            self.selected.clear()
-            all_images = self.repository.get_image_files()
-            self.selected.update(all_images)
-            
-            if self.all_checkbox:
-                self.all_checkbox.active = True
-            
-            for checkbox in self.image_checkboxes:
-                checkbox.active = True
-    
-    def _sync_selected_with_checkboxes(self):
-        """同步self.selected集合与勾选框状态"""
-        self.selected.clear()
-        for checkbox in self.image_checkboxes:
-            if checkbox.active and hasattr(checkbox, 'img_path'):
-                self.selected.add(checkbox.img_path)
+            self.selection.select_all()
+            self._unresolved_exceptions = []
+
+        self.update_all_checkbox_state()
+        self._refresh_visible_cells()
 
     def on_leave(self, *args):
-        """頁面離開時保存勾選框狀態"""
-        self.save_checkbox_state()
+        """頁面離開時立即寫入勾選框狀態"""
+        self.flush_checkbox_state()
+
+    def release(self):
+        """頁面被釋放前（記憶體不足時）停止監聽圖片庫並交還單元格持有的紋理"""
+        self.flush_checkbox_state()
+        self.repository.remove_listener(self._on_repository_changed)
+        self._sync_grid_trigger.cancel()
+        for cell in list(self._cells):
+            if cell.owner is self:
+                cell.release_texture()
+        self._cells.clear()
+        self.grid_view.data = []
 
     def build_header(self):
         header = BoxLayout(orientation='horizontal', size_hint=(1, None), height=60, padding=[20, 10, 20, 10], spacing=40)
@@ -218,48 +294,43 @@ class PlaylistScreen(Screen):
         self.root_layout.add_widget(header)
 
     def build_grid(self):
-        images = self.repository.get_image_files()
-        grid = GridLayout(cols=4, spacing=20, padding=[20, 20, 20, 20], size_hint_y=None)
-        grid.bind(minimum_height=grid.setter('height'))
-        
-        for idx, img_path in enumerate(images):
-            cell = BoxLayout(orientation='vertical', size_hint_y=None, height=180)
-            float_layout = FloatLayout(size_hint=(1, None), height=100)
-            
-            if os.path.exists(img_path):
-                img = Image(source=img_path, size_hint=(0.85, 1), pos_hint={'x': 0.15, 'y': 0}, allow_stretch=True, keep_ratio=False)
-            else:
-                img = Label(text='No Image', size_hint=(0.85, 1), pos_hint={'x': 0.15, 'y': 0})
-            float_layout.add_widget(img)
-            
-            # 創建勾選框並設置為選中狀態（因為All默認選中）
-            checkbox = CheckBox(
-                size_hint=(None, None), 
-                size=(30, 30), 
-                pos_hint={'x': -0.05, 'center_y': 0.80}, 
-                color=(0.1, 0.2, 0.3, 1),
-                active=True  # 默認選中
+        """建立虛擬化的圖片網格，只為可見的行創建單元格"""
+        if self.grid_view is None:
+            self.grid_view = RecycleView(size_hint=(1, 1))
+            layout = RecycleGridLayout(
+                cols=4, spacing=20, padding=[20, 20, 20, 20],
+                default_size=(None, 180), default_size_hint=(1, None),
+                size_hint_y=None
             )
-            checkbox.bind(active=self.on_checkbox)
-            checkbox.img_path = img_path  # 保存圖片路徑
-            self.image_checkboxes.append(checkbox)
-            float_layout.add_widget(checkbox)
-            
-            cell.add_widget(float_layout)
-            label = Label(text=f'Image {idx+1}', size_hint=(1, None), height=30, color=(0,0,0,1))
-            cell.add_widget(label)
-            grid.add_widget(cell)
-        
-        scroll = ScrollView(size_hint=(1, 1))
-        scroll.add_widget(grid)
-        self.root_layout.add_widget(scroll)
+            layout.bind(minimum_height=layout.setter('height'))
+            self.grid_view.add_widget(layout)
+            # viewclass 保存在佈局管理器上，必須在加入佈局後設定
+            self.grid_view.viewclass = PlaylistCell
+            self.root_layout.add_widget(self.grid_view)
+
+        images = list(self.repository.get_image_files())
+        self._grid_images = images
+        self.selection.set_images(images)
+        self.grid_view.data = [
+            {
+                'owner': self,
+                'img_path': img_path,
+                # 只加載網格大小的縮圖版本
+                'thumb_path': self.repository.get_rendition_path(img_path, self.GRID_CELL_SIZE),
+                'label': f'Image {idx+1}',
+            }
+            for idx, img_path in enumerate(images)
+        ]
 
-    def on_checkbox(self, checkbox, value):
+    def _refresh_visible_cells(self):
+        """只讓可見的單元格反映選取模型"""
+        for cell in self.grid_view.layout_manager.children:
+            if cell.img_path is not None:
+                cell.update_selection()
+
+    def on_checkbox(self, img_path, value):
         """處理個別圖片勾選框的變化"""
-        if value:
-            self.selected.add(checkbox.img_path)
-        else:
-            self.selected.discard(checkbox.img_path)
+        self.selection.set_selected(img_path, value)
         
         # 檢查是否需要更新All勾選框狀態
         self.update_all_checkbox_state()
@@ -267,35 +338,24 @@ class PlaylistScreen(Screen):
         # 保存狀態
         self.save_checkbox_state()
         
-        # 打印调试信息
-        print(f"Checkbox changed: {checkbox.img_path} -> {value}")
-        print(f"Selected images count: {len(self.selected)}")
+        # 调试日志
+        logger.debug(f"Checkbox changed: {img_path} -> {value}")
+        logger.debug(f"Selected images count: {self.selection.count()}")
 
     def on_all_checkbox(self, checkbox, value):
         """處理All勾選框的變化"""
-        # 暫時解綁所有個別勾選框，避免觸發on_checkbox
-        for cb in self.image_checkboxes:
-            cb.unbind(active=self.on_checkbox)
-        
-        # 同步所有個別勾選框的狀態
-        for cb in self.image_checkboxes:
-            cb.active = value
-            if value:
-                self.selected.add(cb.img_path)
-            else:
-                self.selected.discard(cb.img_path)
-        
-        # 重新綁定所有個別勾選框
-        for cb in self.image_checkboxes:
-            cb.bind(active=self.on_checkbox)
+        if value:
+            self.selection.select_all()
+        else:
+            self.selection.deselect_all()
+        self._refresh_visible_cells()
         
         # 保存狀態
         self.save_checkbox_state()
         
-        # 打印调试信息
-        print(f"All checkbox changed to: {value}")
-        print(f"Selected images count: {len(self.selected)}")
-        print(f"Selected images: {list(self.selected)[:3]}...")  # 显示前3个
+        # 调试日志
+        logger.debug(f"All checkbox changed to: {value}")
+        logger.debug(f"Selected images count: {self.selection.count()}")
 
     def update_all_checkbox_state(self):
         """根據個別勾選框狀態更新All勾選框狀態"""
@@ -303,25 +363,23 @@ class PlaylistScreen(Screen):
         self.all_checkbox.unbind(active=self.on_all_checkbox)
         
         # 檢查是否所有圖片都被選中
-        all_selected = all(cb.active for cb in self.image_checkboxes)
-        self.all_checkbox.active = all_selected
+        self.all_checkbox.active = self.selection.is_all_selected()
         
         # 重新綁定All勾選框
         self.all_checkbox.bind(active=self.on_all_checkbox)
 
     def goto_home(self, instance):
-        # 保存狀態後跳轉
-        self.save_checkbox_state()
+        # 離開頁面時（on_leave）會寫入狀態
         self.manager.current = 'home'
 
     def goto_slideshow(self, instance):
         """跳轉到幻燈片頁面並傳遞選中的圖片列表"""
         # 獲取選中的圖片列表
-        selected_images = list(self.selected)
+        selected_images = self.selection.selected_images(self._grid_images)
         
-        # 打印调试信息
-        print(f"Going to slideshow with {len(selected_images)} selected images")
-        print(f"Selected images: {selected_images[:3]}...")  # 显示前3个
+        # 调试日志
+        logger.info(f"Going to slideshow with {len(selected_images)} selected images")
+        logger.debug(f"Selected images: {selected_images[:3]}...")  # 显示前3个
         
         # 檢查是否有選中的圖片
         if not selected_images:
@@ -365,9 +423,6 @@ class PlaylistScreen(Screen):
             popup.open()
             return
         
-        # 保存狀態
-        self.save_checkbox_state()
-        
         # 將選中的圖片列表傳遞給幻燈片頁面
         slideshow_screen = self.manager.get_screen('slideshow')
         slideshow_screen.set_selected_images(selected_images)
@@ -1,3 +1,4 @@
+import logging
 import os
 from kivy.uix.screenmanager import Screen
 from kivy.uix.boxlayout import BoxLayout
@@ -11,6 +12,8 @@ from kivy.graphics import Color, RoundedRectangle
 from kivy.properties import NumericProperty, BooleanProperty
 from services.service_manager import ServiceManager
 
+logger = logging.getLogger(__name__)
+
 class CustomNumberInput(TextInput):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -41,8 +44,7 @@ class CustomNumberInput(TextInput):
             if hasattr(self, 'on_value_change'):
                 self.on_value_change(self, value)
         except Exception as e:
-            print(f"Text change callback error: {e}")
-            pass
+            logger.exception(f"Text change callback error: {e}")
     
     def on_text_validate(self, instance=None):
         """当用户按回车键或失去焦点时进行严格验证"""
@@ -50,8 +52,7 @@ class CustomNumberInput(TextInput):
             if hasattr(self, 'on_value_change'):
                 self.on_value_change(self, self.text)
         except Exception as e:
-            print(f"Text validate callback error: {e}")
-            pass
+            logger.exception(f"Text validate callback error: {e}")
 
 class RoundedSwitch(Switch):
     def __init__(self, **kwargs):
@@ -76,10 +77,12 @@ class RoundedSlider(Slider):
 class SetupScreen(Screen):
     slideshow_interval = NumericProperty(1)
     slideshow_loop = BooleanProperty(True)  # 默认开启循环
+    shuffle = BooleanProperty(False)
     brightness = NumericProperty(50)
     
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self._syncing_ui = False
         self.service_manager = ServiceManager()
         self.root_layout = BoxLayout(orientation='vertical', spacing=0, padding=0)
         self.build_header()
@@ -93,11 +96,31 @@ class SetupScreen(Screen):
         settings = self.service_manager.get_all_settings()
         self.slideshow_interval = settings['slideshow_interval']
         self.slideshow_loop = settings['slideshow_loop']
+        self.shuffle = settings['shuffle']
+        
+        if settings['brightness'] is None:
+            # 從未設定過亮度：顯示系統實際亮度值（轉換為 0-100 範圍），但不保存——
+            # 夜間排程啟用時讀到的是調暗後的亮度，保存後每次開機都會被恢復為白天亮度
+            self.brightness = self.get_system_brightness_percent()
+        else:
+            # 保存的亮度已在啟動時由背光控制恢復
+            self.brightness = settings['brightness']
         
-        # 讀取系統實際亮度值並轉換為 0-100 範圍
-        self.brightness = self.get_system_brightness_percent()
+        # 更新UI显示（設定滑塊的值會觸發 on_brightness_change，只有使用者拖動時才保存）
+        self._syncing_ui = True
+        try:
+            self._update_settings_widgets()
+        finally:
+            self._syncing_ui = False
         
-        # 更新UI显示
+        # 确保slideshow_service的设置与UI同步（一次批次更新，未改变的项目不会重新套用）；
+        # 亮度只在使用者調整時保存
+        self.service_manager.set_all_settings({
+            'slideshow_interval': self.slideshow_interval,
+            'slideshow_loop': self.slideshow_loop,
+        })
+
+    def _update_settings_widgets(self):
         if hasattr(self, 'interval_input'):
             self.interval_input.text = str(self.slideshow_interval)
         if hasattr(self, 'loop_switch'):
@@ -108,11 +131,9 @@ class SetupScreen(Screen):
             self.brightness_slider.value = self.brightness
         if hasattr(self, 'loop_status_label'):
             self.loop_status_label.text = 'On' if self.slideshow_loop else 'Off'
-        
-        # 确保slideshow_service的设置与UI同步
-        self.service_manager.set_slideshow_interval(self.slideshow_interval)
-        self.service_manager.set_slideshow_loop(self.slideshow_loop)
-        self.service_manager.set_brightness(self.brightness)
+        if hasattr(self, 'shuffle_switch'):
+            self.shuffle_switch.active = self.shuffle
+            self.shuffle_status_label.text = 'On' if self.shuffle else 'Off'
 
     def build_header(self):
         """構建頁面標題和返回按鈕"""
@@ -172,7 +193,7 @@ class SetupScreen(Screen):
         # 設定選項容器
         settings_container = BoxLayout(
             orientation='vertical', 
-            spacing=60, 
+            spacing=40, 
             padding=[20, 0, 20, 0],
             size_hint=(0.7, 1)
         )
@@ -188,6 +209,10 @@ class SetupScreen(Screen):
         loop_layout = self.build_loop_setting()
         settings_container.add_widget(loop_layout)
         
+        # 隨機播放設定
+        shuffle_layout = self.build_shuffle_setting()
+        settings_container.add_widget(shuffle_layout)
+        
         # 亮度設定
         brightness_layout = self.build_brightness_setting()
         settings_container.add_widget(brightness_layout)
@@ -272,6 +297,42 @@ class SetupScreen(Screen):
         
         return layout
     
+    def build_shuffle_setting(self):
+        """構建隨機播放設定"""
+        layout = BoxLayout(orientation='horizontal', size_hint=(0.8, None), height=50, spacing=100)
+        
+        # 標籤
+        label = Label(
+            text='Shuffle',
+            size_hint=(1, 1),
+            color=(0, 0, 0, 1),
+            font_size='18sp',
+            halign='left',
+            valign='middle'
+        )
+        layout.add_widget(label)
+        
+        # 開關
+        self.shuffle_switch = RoundedSwitch(
+            size_hint=(None, None),
+            size=(80, 40)
+        )
+        self.shuffle_switch.bind(active=self.on_shuffle_change)
+        layout.add_widget(self.shuffle_switch)
+        
+        # 開關狀態標籤
+        self.shuffle_status_label = Label(
+            text='Off',
+            size_hint=(0.001, 1),
+            color=(0, 0, 0, 1),
+            font_size='16sp',
+            halign='center',
+            valign='middle'
+        )
+        layout.add_widget(self.shuffle_status_label)
+        
+        return layout
+    
     def build_brightness_setting(self):
         """構建亮度設定"""
         layout = BoxLayout(orientation='horizontal', size_hint=(1, None), height=50, spacing=10)
@@ -324,7 +385,7 @@ class SetupScreen(Screen):
                 self.slideshow_interval = interval
                 # 实时更新服务管理器中的设置
                 self.service_manager.set_slideshow_interval(float(interval))
-                print(f"设置幻灯片间隔为: {interval} 秒")
+                logger.info(f"设置幻灯片间隔为: {interval} 秒")
             else:
                 # 超出范围，进行智能重置
                 if interval < 1:
@@ -336,11 +397,11 @@ class SetupScreen(Screen):
                 self.interval_input.text = str(corrected_value)
                 self.slideshow_interval = corrected_value
                 self.service_manager.set_slideshow_interval(float(corrected_value))
-                print(f"输入值 {interval} 超出范围，已自动调整为: {corrected_value} 秒")
+                logger.info(f"输入值 {interval} 超出范围，已自动调整为: {corrected_value} 秒")
                 
         except ValueError:
             # 如果输入无效（非数字），重置为当前值
-            print(f"输入值 '{value}' 不是有效数字，已重置为: {self.slideshow_interval} 秒")
+            logger.info(f"输入值 '{value}' 不是有效数字，已重置为: {self.slideshow_interval} 秒")
             self.interval_input.text = str(self.slideshow_interval)
     
     def on_loop_change(self, instance, value):
@@ -350,6 +411,12 @@ class SetupScreen(Screen):
         # 实时更新服务管理器中的设置
         self.service_manager.set_slideshow_loop(value)
     
+    def on_shuffle_change(self, instance, value):
+        """處理隨機播放變更"""
+        self.shuffle = value
+        self.shuffle_status_label.text = 'On' if value else 'Off'
+        self.service_manager.set_shuffle(value)
+    
     def on_brightness_change(self, instance, value):
         """處理亮度變更"""
         try:
@@ -360,67 +427,27 @@ class SetupScreen(Screen):
             self.brightness = brightness_value
             self.brightness_label.text = str(brightness_value)
             
-            # 通過 sysfs 控制硬體亮度
-            self.set_system_brightness(brightness_value)
+            if self._syncing_ui:
+                # load_current_settings 設定滑塊的值，不是使用者的調整
+                return
             
-            # 更新服務管理器中的設置
+            # 更新服務管理器中的設置，由背光控制合併拖動時的變更並在背景寫入硬體
             self.service_manager.set_brightness(brightness_value)
             
-            print(f"亮度已調整為: {brightness_value}%")
+            logger.debug(f"亮度已調整為: {brightness_value}%")
             
         except Exception as e:
-            print(f"調整亮度時發生錯誤: {e}")
+            logger.exception(f"調整亮度時發生錯誤: {e}")
     
     def get_system_brightness_percent(self):
         """從系統讀取當前亮度值並轉換為 0-100 百分比"""
-        try:
-            brightness_file = '/sys/class/backlight/11-0045/brightness'
-            
-            if os.path.exists(brightness_file):
-                with open(brightness_file, 'r') as f:
-                    current_brightness = int(f.read().strip())
-                
-                # 將 8-31 範圍轉換為 0-100 百分比
-                # 反向映射：8 -> 0%, 31 -> 100%
-                if current_brightness <= 8:
-                    return 0
-                elif current_brightness >= 31:
-                    return 100
-                else:
-                    percent = int(((current_brightness - 8) / (31 - 8)) * 100)
-                    return percent
-            else:
-                print(f"警告: 亮度控制文件不存在: {brightness_file}")
-                return 50  # 預設值
-                
-        except Exception as e:
-            print(f"讀取系統亮度時發生錯誤: {e}")
-            return 50  # 預設值
-    
-    def set_system_brightness(self, brightness_percent):
-        """通過 sysfs 設置系統亮度"""
-        try:
-            # 將 0-100 的百分比映射到 8-31 範圍，避免螢幕太黑
-            # 使用線性映射：0% -> 8, 100% -> 31
-            brightness_value = int(8 + (brightness_percent / 100.0) * (31 - 8))
-            
-            # 使用你系統中實際存在的亮度控制文件路徑
-            brightness_file = '/sys/class/backlight/11-0045/brightness'
-            
-            if os.path.exists(brightness_file):
-                with open(brightness_file, 'w') as f:
-                    f.write(str(brightness_value))
-                print(f"已通過 sysfs 設置亮度: {brightness_percent}% -> {brightness_value}/31 (映射範圍: 8-31)")
-            else:
-                print(f"警告: 亮度控制文件不存在: {brightness_file}")
-                print("請確認 Raspberry Pi 硬體配置或使用其他亮度控制方法")
-                
-        except PermissionError:
-            print("權限不足，無法寫入亮度控制文件")
-            print("請嘗試使用 sudo 運行程序或將用戶加入 video 組")
-        except Exception as e:
-            print(f"設置系統亮度時發生錯誤: {e}")
+        percent = self.service_manager.get_brightness_controller().read_percent()
+        return percent if percent is not None else 50  # 預設值
     
+    def on_leave(self, *args):
+        """頁面離開時立即寫入設定"""
+        self.service_manager.flush_settings()
+
     def goto_home(self, instance):
         """返回主頁"""
         self.manager.current = 'home'
@@ -430,6 +457,7 @@ class SetupScreen(Screen):
         return {
             'slideshow_interval': self.slideshow_interval,
             'slideshow_loop': self.slideshow_loop,
+            'shuffle': self.shuffle,
             'brightness': self.brightness
         }
     
@@ -437,11 +465,13 @@ class SetupScreen(Screen):
         """設定值"""
         self.slideshow_interval = settings.get('slideshow_interval', 1)
         self.slideshow_loop = settings.get('slideshow_loop', False)
+        self.shuffle = settings.get('shuffle', False)
         self.brightness = settings.get('brightness', 50)
         
         # 更新UI
         self.interval_input.text = str(self.slideshow_interval)
         self.loop_switch.active = self.slideshow_loop
+        self.shuffle_switch.active = self.shuffle
         self.brightness_slider.value = self.brightness
         self.brightness_label.text = str(self.brightness)
         
@@ -1,25 +1,139 @@
+import logging
 import os
 from kivy.uix.screenmanager import Screen
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.image import Image
 from kivy.uix.button import Button
 from kivy.clock import Clock
+from kivy.animation import Animation
+from kivy.graphics.texture import Texture
 from services.service_manager import ServiceManager
+from services.instrumentation import METRICS
+
+logger = logging.getLogger(__name__)
 
 IMAGES_DIR = os.path.join(os.path.dirname(__file__), '../images')
 
+
+class CrossfadeImage(FloatLayout):
+    """雙緩衝的圖片顯示
+
+    兩個 Image 輪流作為前景：新圖片放入背景槽位後移到最上層，以透明度動畫淡入，
+    淡入完成後才隱藏舊圖片並釋放其紋理。動畫期間只改變透明度（可選的 Ken Burns 縮放），
+    不解碼也不上傳圖片，混合由 GPU 完成。
+    傳入 texture_cache 時，每個槽位持有所顯示紋理的一個引用，槽位隱藏時釋放。
+    """
+
+    def __init__(self, transition_duration=0.5, ken_burns_zoom=1.0, texture_cache=None, **kwargs):
+        super().__init__(**kwargs)
+        self.texture_cache = texture_cache
+        # 槽位 -> 持有引用的紋理快取鍵
+        self._slot_keys = {}
+        self.transition_duration = transition_duration
+        # 大於 1 時每張圖片在顯示期間緩慢放大到這個倍數
+        self.ken_burns_zoom = ken_burns_zoom
+        self.ken_burns_duration = 0
+        self._slots = [self._create_slot(), self._create_slot()]
+        self._front = 0
+        self._slots[1].opacity = 0
+
+    def _create_slot(self):
+        slot = Image(
+            allow_stretch=True,
+            keep_ratio=False,
+            size_hint=(1, 1),
+            pos_hint={'center_x': 0.5, 'center_y': 0.5}
+        )
+        self.add_widget(slot)
+        return slot
+
+    @property
+    def texture(self):
+        """前景圖片的紋理"""
+        return self._slots[self._front].texture
+
+    def show(self, texture=None, source=None, animate=True, cache_key=None):
+        """切換到新圖片：texture 為已上傳的紋理；沒有紋理時退回以 source 同步加載
+
+        cache_key 為 texture 在紋理快取中的鍵，調用者持有的引用轉交給槽位，隱藏時釋放。
+        """
+        self._finish_transition()
+        front = self._slots[self._front]
+        back = self._slots[1 - self._front]
+
+        if texture is not None:
+            back.source = ''
+            back.texture = texture
+            if cache_key is not None:
+                self._slot_keys[back] = cache_key
+        else:
+            back.source = source
+            # 強制重新加載圖片
+            back.reload()
+
+        # 移到最上層，淡入時蓋住舊圖片
+        self.remove_widget(back)
+        self.add_widget(back)
+        back.size_hint = (1, 1)
+        self._front = 1 - self._front
+
+        if animate and self.transition_duration > 0:
+            back.opacity = 0
+            fade = Animation(opacity=1, d=self.transition_duration, t='in_out_quad')
+            fade.bind(on_complete=lambda *args: self._hide_slot(front))
+            fade.start(back)
+        else:
+            back.opacity = 1
+            self._hide_slot(front)
+
+        if self.ken_burns_zoom > 1 and self.ken_burns_duration > 0:
+            zoom = self.ken_burns_zoom
+            Animation(size_hint=(zoom, zoom), d=self.ken_burns_duration).start(back)
+
+    def _hide_slot(self, slot):
+        if slot is self._slots[self._front]:
+            return
+        slot.opacity = 0
+        # 釋放舊圖片的紋理，GPU 上只保留正在顯示的圖片與快取中的紋理
+        slot.source = ''
+        slot.texture = None
+        cache_key = self._slot_keys.pop(slot, None)
+        if cache_key is not None and self.texture_cache is not None:
+            self.texture_cache.release(cache_key)
+
+    def _finish_transition(self):
+        """上一次切換的動畫尚未結束時直接跳到結束狀態"""
+        for slot in self._slots:
+            Animation.cancel_all(slot)
+        self._slots[self._front].opacity = 1
+        self._hide_slot(self._slots[1 - self._front])
+
 class SlideshowScreen(Screen):
+    # 預解碼當前圖片之後與之前的圖片數量
+    PREFETCH_AHEAD = 2
+    PREFETCH_BEHIND = 1
+    # 自動切換前開始準備下一張圖片的最短提前時間（秒），實際提前量隨解碼時間調整
+    MIN_PREPARE_LEAD_TIME = 0.3
+    # 交叉淡化時間（秒，不超過切換間隔的一半），Ken Burns 放大倍數（1.0 為關閉）
+    TRANSITION_DURATION = 0.5
+    KEN_BURNS_ZOOM = 1.0
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.service_manager = ServiceManager()
         self.service = self.service_manager.get_slideshow_service()
+        self.prefetcher = self.service_manager.get_image_prefetcher()
+        self.texture_cache = self.service_manager.get_texture_cache()
         self.selected_images = None  # 存儲選中的圖片列表
+        # 自動切換前預先上傳並持有紋理快取引用的圖片路徑
+        self._uploaded = None
 
         layout = FloatLayout()
 
-        self.img_widget = Image(
-            allow_stretch=True,
-            keep_ratio=False,
+        self.img_widget = CrossfadeImage(
+            transition_duration=self.TRANSITION_DURATION,
+            ken_burns_zoom=self.KEN_BURNS_ZOOM,
+            texture_cache=self.texture_cache,
             size_hint=(1, 1),
             pos_hint={'center_x': 0.5, 'center_y': 0.5}
         )
@@ -120,35 +234,33 @@ class SlideshowScreen(Screen):
     def set_selected_images(self, selected_images):
         """設置選中的圖片列表"""
         self.selected_images = selected_images
-        print(f"SlideshowScreen received {len(selected_images)} selected images")
-        print(f"Selected images: {selected_images[:3]}...")  # 显示前3个
+        logger.debug(f"SlideshowScreen received {len(selected_images)} selected images")
+        logger.debug(f"Selected images: {selected_images[:3]}...")  # 显示前3个
 
     def on_pre_enter(self, *args):
         """頁面進入前準備"""
-        print(f"SlideshowScreen on_pre_enter - selected_images: {self.selected_images}")
+        logger.debug(f"SlideshowScreen on_pre_enter - {len(self.selected_images or [])} selected images")
         
-        # 不要在这里调用refresh_images，因为它会覆盖自定义播放列表
-        # self.service.refresh_images()
+        # 圖片列表由目錄監視器增量更新，進入頁面時不需要重新掃描
         
         # 如果有選中的圖片，設置為自定義播放列表
         if self.selected_images and len(self.selected_images) > 0:
-            print(f"Setting custom playlist with {len(self.selected_images)} images")
+            logger.info(f"Setting custom playlist with {len(self.selected_images)} images")
             self.service.set_custom_playlist(self.selected_images)
         else:
-            print("No selected images, using all images")
+            logger.info("No selected images, using all images")
             # 如果沒有選中的圖片，使用所有圖片
             self.service.clear_custom_playlist()
-            # 只有在没有自定义播放列表时才刷新图片
-            self.service.refresh_images()
         
         # 設置圖片改變時的回調函數
         self.service.set_image_changed_callback(self.on_image_changed)
+        self.service.set_prepare_next_callback(self.prepare_next_image, self._prepare_lead_time())
         
         # 顯示當前圖片
         current_image = self.service.get_current_image()
-        print(f"Current image: {current_image}")
+        logger.debug(f"Current image: {current_image}")
         if current_image:
-            self.img_widget.source = current_image
+            self._show_image(current_image, animate=False)
         
         # 啟動自動播放
         self.service.start_auto_play()
@@ -160,6 +272,7 @@ class SlideshowScreen(Screen):
         """離開頁面時停止自動播放"""
         # 停止自動播放
         self.service.stop_auto_play()
+        self._release_uploaded()
         
         # 離開畫面時取消計時器
         if self._ui_timer:
@@ -169,37 +282,120 @@ class SlideshowScreen(Screen):
     def on_image_changed(self, image_path):
         """圖片改變時的回調函數 - 使用Clock確保在主線程中更新UI"""
         # 使用Clock.schedule_once確保UI更新在主線程中進行
-        Clock.schedule_once(lambda dt: self._update_image_safe(image_path), 0)
+        deadline = self.service.get_frame_deadline()
+        Clock.schedule_once(lambda dt: self._update_image_safe(image_path, deadline), 0)
+
+    def prepare_next_image(self, image_path):
+        """自動切換前的回調：優先解碼下一張圖片並在主線程上傳紋理，讓切換準時發生
+
+        在排程線程中執行。
+        """
+        if not self.prefetcher.is_ready(image_path):
+            self.prefetcher.prefetch(
+                [image_path] + self.service.get_upcoming_images(self.PREFETCH_AHEAD, self.PREFETCH_BEHIND)
+            )
+        Clock.schedule_once(lambda dt: self._upload_when_ready(image_path), 0)
+
+    def _upload_when_ready(self, image_path):
+        """解碼完成後上傳下一張圖片的紋理，尚未完成時下一幀再檢查
+
+        等待期間只檢查是否就緒（不計入命中統計），每張圖片只在真正取得紋理時計算一次命中或未命中。
+        """
+        if not self.service.is_auto_playing or self.service.peek_next_image() != image_path:
+            return
+        if self._uploaded == image_path:
+            return
+        if not (self.texture_cache.contains(image_path) or self.prefetcher.is_ready(image_path)):
+            Clock.schedule_once(lambda dt: self._upload_when_ready(image_path), 1 / 60)
+            return
+        if self._acquire_texture(image_path) is None:
+            # 就緒後到取得之間被淘汰，下一幀再檢查
+            Clock.schedule_once(lambda dt: self._upload_when_ready(image_path), 1 / 60)
+            return
+        self._release_uploaded()
+        self._uploaded = image_path
+
+    def _release_uploaded(self):
+        """釋放預先上傳的紋理的引用"""
+        if self._uploaded is not None:
+            self.texture_cache.release(self._uploaded)
+            self._uploaded = None
 
-    def _update_image_safe(self, image_path):
+    def _acquire_texture(self, image_path):
+        """從共用紋理快取取得圖片的紋理（持有一個引用），不在快取中時上傳已預解碼的像素
+
+        Returns:
+            紋理；圖片尚未預解碼時返回 None
+        """
+        texture = self.texture_cache.acquire(image_path)
+        if texture is not None:
+            return texture
+        decoded = self.prefetcher.get(image_path)
+        if decoded is None:
+            return None
+        with METRICS.span('photoframe_texture_upload_seconds', '在主線程中把預解碼的像素上傳為紋理的耗時'):
+            texture = Texture.create(size=decoded.size, colorfmt=decoded.colorfmt)
+            texture.blit_buffer(decoded.pixels, colorfmt=decoded.colorfmt, bufferfmt='ubyte')
+        return self.texture_cache.add(image_path, texture)
+
+    def _prepare_lead_time(self):
+        """提前準備的時間：預估解碼時間的兩倍，並保留紋理上傳的餘量"""
+        return max(self.MIN_PREPARE_LEAD_TIME, self.prefetcher.average_decode_time * 2)
+
+    def _update_image_safe(self, image_path, deadline=None):
         """在主線程中安全地更新圖片"""
         try:
             if image_path and os.path.exists(image_path):
-                self.img_widget.source = image_path
-                # 強制重新加載圖片
-                self.img_widget.reload()
+                ready = self._show_image(image_path)
+                self.service.record_frame_shown(deadline, ready)
+                self.service.set_prepare_lead_time(self._prepare_lead_time())
             else:
-                print(f"圖片路徑不存在或無效: {image_path}")
+                logger.warning(f"圖片路徑不存在或無效: {image_path}")
         except Exception as e:
-            print(f"更新圖片時發生錯誤: {e}")
+            logger.exception(f"更新圖片時發生錯誤: {e}")
+
+    def _show_image(self, image_path, animate=True):
+        """以交叉淡化顯示圖片
+
+        優先使用共用紋理快取中的紋理（包括預先上傳的），其次在主線程上傳已預解碼的像素，
+        都沒有時退回同步加載。
+
+        Returns:
+            圖片是否已預解碼
+        """
+        # 從取得紋理到開始淡化在主線程中的耗時（沒有預解碼時包括同步加載）
+        with METRICS.span('photoframe_image_switch_seconds', '切換圖片在主線程中的耗時'):
+            texture = self._acquire_texture(image_path)
+            self._release_uploaded()
+
+            # 淡化不超過切換間隔的一半，Ken Burns 持續整個間隔
+            interval = self.service.auto_play_interval
+            self.img_widget.transition_duration = min(self.TRANSITION_DURATION, interval / 2)
+            self.img_widget.ken_burns_duration = interval
+            self.img_widget.show(
+                texture=texture, source=image_path, animate=animate,
+                cache_key=image_path if texture is not None else None
+            )
+
+        # 在工作線程中預解碼接下來（及之前）的圖片
+        self.prefetcher.prefetch(
+            self.service.get_upcoming_images(self.PREFETCH_AHEAD, self.PREFETCH_BEHIND)
+        )
+        return texture is not None
 
     def next_image(self, instance):
         # 手動切換圖片時停止自動播放
         self.service.stop_auto_play()
-        next_img = self.service.next_image()
-        if next_img:
-            self.img_widget.source = next_img
-            self.img_widget.reload()
+        # 圖片由 on_image_changed 回調顯示（只開始一次淡化）
+        self.service.next_image()
         # 切換圖片時也重置UI計時器
         self.reset_ui_timer()
 
     def prev_image(self, instance):
         # 手動切換圖片時停止自動播放
         self.service.stop_auto_play()
-        prev_img = self.service.prev_image()
-        if prev_img:
-            self.img_widget.source = prev_img
-            self.img_widget.reload()
+        # 圖片由 on_image_changed 回調顯示（只開始一次淡化）
+        self.service.prev_image()
         # 切換圖片時也重置UI計時器
         self.reset_ui_timer()
 